@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List
 import os
 
 
@@ -14,12 +15,158 @@ class Settings(BaseModel):
     tripo_status_path: str = os.getenv("TRIPO_ITD_STATUS_PATH", "")  # may include {task_id}
     tripo_poll_interval: float = float(os.getenv("TRIPO_POLL_INTERVAL", "2.0"))
     tripo_poll_timeout: float = float(os.getenv("TRIPO_POLL_TIMEOUT", "120.0"))
+    # Shared poller: interval grows to this fraction of a job's age, capped at the max interval
+    tripo_poll_backoff: float = float(os.getenv("TRIPO_POLL_BACKOFF", "0.05"))
+    tripo_poll_max_interval: float = float(os.getenv("TRIPO_POLL_MAX_INTERVAL", "5.0"))
+    # Optional batched status endpoint (POST {"task_ids": [...]}); unset = one GET per task
+    tripo_batch_status_path: str = os.getenv("TRIPO_BATCH_STATUS_PATH", "")
+    # Shared connection pool (one app-lifetime httpx client, see services/http.py)
+    tripo_http2: bool = os.getenv("TRIPO_HTTP2", "1").lower() in ("1", "true")
+    tripo_max_connections: int = int(os.getenv("TRIPO_MAX_CONNECTIONS", "100"))
+    tripo_max_keepalive: int = int(os.getenv("TRIPO_MAX_KEEPALIVE", "50"))
+    tripo_keepalive_expiry: float = float(os.getenv("TRIPO_KEEPALIVE_EXPIRY", "30.0"))
+    # Per-phase timeouts (seconds): connect, upload+create, each status poll, waiting for a pooled connection
+    tripo_connect_timeout: float = float(os.getenv("TRIPO_CONNECT_TIMEOUT", "10.0"))
+    tripo_create_timeout: float = float(os.getenv("TRIPO_CREATE_TIMEOUT", "60.0"))
+    tripo_status_timeout: float = float(os.getenv("TRIPO_STATUS_TIMEOUT", "15.0"))
+    tripo_pool_timeout: float = float(os.getenv("TRIPO_POOL_TIMEOUT", "30.0"))
+    # Adaptive concurrency limit for Tripo task creation (uploads), same scheme as Gemini
+    tripo_max_concurrency: int = int(os.getenv("TRIPO_MAX_CONCURRENCY", "16"))
+    tripo_limit_initial: int = int(os.getenv("TRIPO_LIMIT_INITIAL", "8"))
+    tripo_queue_size: int = int(os.getenv("TRIPO_QUEUE_SIZE", "64"))
+    tripo_queue_timeout: float = float(os.getenv("TRIPO_QUEUE_TIMEOUT", "30.0"))
 
     gemini_api_key: str | None = os.getenv("GEMINI_API_KEY")
     # Prefer 2.x line if available; can be overridden via env.
     gemini_model: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
     # Whether to request structured JSON via response_schema (can be incompatible depending on SDK/version)
     gemini_use_schema: bool = os.getenv("GEMINI_USE_SCHEMA", "0").lower() in ("1", "true")
+    # How long a resolved model (list_models + fallback walk) is reused before a background refresh
+    gemini_model_ttl: float = float(os.getenv("GEMINI_MODEL_TTL", "3600"))
+    # Same, for a fallback chosen because list_models failed: retried soon rather than pinned for the TTL
+    gemini_model_error_ttl: float = float(os.getenv("GEMINI_MODEL_ERROR_TTL", "30"))
+    # Generation goes through the REST API with a shared async client (services/http.py)
+    gemini_api_endpoint: str = os.getenv("GEMINI_API_ENDPOINT", "https://generativelanguage.googleapis.com")
+    # Adaptive (AIMD) concurrency limit for generateContent: starts at GEMINI_LIMIT_INITIAL, never above
+    # GEMINI_MAX_CONCURRENCY; callers beyond it queue (bounded) and get 503 + Retry-After when shed
+    gemini_max_concurrency: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+    gemini_limit_initial: int = int(os.getenv("GEMINI_LIMIT_INITIAL", "8"))
+    gemini_queue_size: int = int(os.getenv("GEMINI_QUEUE_SIZE", "64"))
+    gemini_queue_timeout: float = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "10.0"))
+    gemini_max_connections: int = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+    gemini_keepalive_expiry: float = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "30.0"))
+    gemini_connect_timeout: float = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "10.0"))
+    # Deadline (seconds) for a single generateContent attempt
+    gemini_attempt_timeout: float = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", "60.0"))
+    # Retries of generateContent: attempts, backoff base/cap (full jitter), overall deadline across attempts (seconds)
+    gemini_retry_attempts: int = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3"))
+    gemini_retry_base_delay: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+    gemini_retry_max_delay: float = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8.0"))
+    gemini_retry_deadline: float = float(os.getenv("GEMINI_RETRY_DEADLINE", "90.0"))
+    # Hedging: when an attempt is slower than the recent GEMINI_HEDGE_QUANTILE latency, send a duplicate
+    # and keep whichever answers first; duplicates are capped at GEMINI_HEDGE_BUDGET of requests
+    gemini_hedge: bool = os.getenv("GEMINI_HEDGE", "0").lower() in ("1", "true")
+    gemini_hedge_quantile: float = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))
+    gemini_hedge_min_delay: float = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.5"))
+    gemini_hedge_budget: float = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.1"))
+    # /v1/generate/batch: descriptions packed per Gemini request, concurrency of the per-item fallback, item cap
+    gemini_batch_pack_size: int = int(os.getenv("GEMINI_BATCH_PACK_SIZE", "5"))
+    gemini_batch_fanout: int = int(os.getenv("GEMINI_BATCH_FANOUT", "4"))
+    gemini_batch_max_items: int = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "50"))
+    # Output limit per request is sized from recent answers of the same idea plan (services/budget.py);
+    # never above GEMINI_OUTPUT_TOKEN_CAP, and raised after truncations until they stay near the target rate
+    gemini_output_token_cap: int = int(os.getenv("GEMINI_OUTPUT_TOKEN_CAP", "8192"))
+    gemini_truncation_target: float = float(os.getenv("GEMINI_TRUNCATION_TARGET", "0.02"))
+    # Photos sent with image_ideas=true: "files" uploads each once through the Gemini File API and reuses
+    # the URI by digest for GEMINI_FILE_TTL seconds (files expire after 48h); "inline" embeds them per call
+    gemini_image_transport: str = os.getenv("GEMINI_IMAGE_TRANSPORT", "files")
+    gemini_file_ttl: float = float(os.getenv("GEMINI_FILE_TTL", str(46 * 3600)))
+
+    # Upload memory ceilings: per request (413 when exceeded) and across all in-flight uploads (503)
+    upload_max_request_bytes: int = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(40 * 1024 * 1024)))
+    upload_max_inflight_bytes: int = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES", str(256 * 1024 * 1024)))
+    # Uploads larger than this are spooled to a temp file instead of memory
+    upload_spool_bytes: int = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+    upload_tmp_dir: str = os.getenv("UPLOAD_TMP_DIR", "")
+
+    # Upload preprocessing before Tripo and Gemini (process pool): downscale, re-encode, strip EXIF, drop
+    # near-duplicates. The last IMAGE_DECODE_CACHE results are kept by upload digest, so both branches of a
+    # request (and repeat photos) decode an image once
+    image_preprocess: bool = os.getenv("IMAGE_PREPROCESS", "1").lower() in ("1", "true")
+    image_max_edge: int = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+    image_quality: int = int(os.getenv("IMAGE_QUALITY", "85"))
+    image_workers: int = int(os.getenv("IMAGE_WORKERS", "2"))
+    # Max Hamming distance between 64-bit dHashes for two shots to count as duplicates (0 = exact only)
+    image_dedupe_distance: int = int(os.getenv("IMAGE_DEDUPE_DISTANCE", "4"))
+    image_decode_cache: int = int(os.getenv("IMAGE_DECODE_CACHE", "32"))
+
+    # Admission scheduler (services/scheduler.py): idea-only requests ("ideas") and 3D requests ("model") get
+    # separate concurrency pools and wait queues; a request shed after waiting *_QUEUE_TIMEOUT gets 503 +
+    # Retry-After. Gemini calls made for idea-only requests are served ahead of those made for 3D requests.
+    sched_ideas_concurrency: int = int(os.getenv("SCHED_IDEAS_CONCURRENCY", "64"))
+    sched_ideas_queue: int = int(os.getenv("SCHED_IDEAS_QUEUE", "256"))
+    sched_ideas_queue_timeout: float = float(os.getenv("SCHED_IDEAS_QUEUE_TIMEOUT", "5.0"))
+    sched_model_concurrency: int = int(os.getenv("SCHED_MODEL_CONCURRENCY", "8"))
+    sched_model_queue: int = int(os.getenv("SCHED_MODEL_QUEUE", "64"))
+    sched_model_queue_timeout: float = float(os.getenv("SCHED_MODEL_QUEUE_TIMEOUT", "30.0"))
+    # Fair share between clients inside each queue: "" (FIFO), "ip", or "key" (X-API-Key / bearer token,
+    # falling back to the IP); no client may hold more than SCHED_CLIENT_MAX_QUEUED places in a queue
+    sched_fair_by: str = os.getenv("SCHED_FAIR_BY", "").lower()
+    sched_client_max_queued: int = int(os.getenv("SCHED_CLIENT_MAX_QUEUED", "16"))
+
+    # Serving: WORKERS > 1 runs that many uvicorn worker processes (production; no reload). Workers share
+    # state through SHARED_STORE_URL: "sqlite:///shared.sqlite3" (one host) or "redis://host:6379/0"
+    workers: int = int(os.getenv("WORKERS", "1"))
+    shared_store_url: str = os.getenv("SHARED_STORE_URL", "")
+
+    # Result cache for /v1/generate: "memory" (LRU), "sqlite" (on disk), "shared" (SHARED_STORE_URL) or "off"
+    result_cache_backend: str = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()
+    result_cache_path: str = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+    result_cache_max_entries: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+    result_cache_ttl: float = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+    # Tripo asset URLs are signed and expire, so keep them for a shorter time
+    result_cache_tripo_ttl: float = float(os.getenv("RESULT_CACHE_TRIPO_TTL", "3600"))
+
+    # Local mirror of finished Tripo model files (.glb/.obj), served from /v1/assets/{digest}; opt-in, as it
+    # writes to ASSET_STORE_DIR (relative to the working directory unless absolute)
+    asset_store: bool = os.getenv("ASSET_STORE", "0").lower() in ("1", "true")
+    asset_store_dir: str = os.getenv("ASSET_STORE_DIR", "assets")
+    asset_store_max_bytes: int = int(os.getenv("ASSET_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    asset_max_file_bytes: int = int(os.getenv("ASSET_MAX_FILE_BYTES", str(200 * 1024 * 1024)))
+    asset_download_timeout: float = float(os.getenv("ASSET_DOWNLOAD_TIMEOUT", "120.0"))
+    # Mobile variant of mirrored GLBs (worker pool): decimate to a triangle budget, shrink embedded textures
+    glb_optimize: bool = os.getenv("GLB_OPTIMIZE", "1").lower() in ("1", "true")
+    glb_target_triangles: int = int(os.getenv("GLB_TARGET_TRIANGLES", "50000"))
+    glb_texture_max_edge: int = int(os.getenv("GLB_TEXTURE_MAX_EDGE", "1024"))
+    glb_texture_quality: int = int(os.getenv("GLB_TEXTURE_QUALITY", "80"))
+    # Public origin for asset URLs (e.g. behind a proxy); defaults to the origin of the request
+    asset_public_base: str = os.getenv("ASSET_PUBLIC_BASE", "")
+
+    # Near-duplicate lookup before calling Gemini: reuse the ideas of a past description whose character
+    # n-gram Jaccard similarity is at least SIMILAR_THRESHOLD (index holds SIMILAR_INDEX_MAX_ENTRIES, in memory).
+    # Opt-in: a hit answers a description with ideas written for a different one
+    similar_lookup: bool = os.getenv("SIMILAR_LOOKUP", "0").lower() in ("1", "true")
+    similar_threshold: float = float(os.getenv("SIMILAR_THRESHOLD", "0.7"))
+    similar_index_max_entries: int = int(os.getenv("SIMILAR_INDEX_MAX_ENTRIES", "100000"))
+
+    # Precomputed ideas for common materials (built with ``python -m app.warmup``), loaded at startup and
+    # served before the result cache; in mock mode the closest entry replaces the built-in sample ideas.
+    # Opt-in: it opens IDEA_LIBRARY_PATH and serves entries for descriptions that are only similar
+    idea_library: bool = os.getenv("IDEA_LIBRARY", "0").lower() in ("1", "true")
+    idea_library_path: str = os.getenv("IDEA_LIBRARY_PATH", "idea_library.sqlite3")
+    idea_library_concurrency: int = int(os.getenv("IDEA_LIBRARY_CONCURRENCY", "4"))
+
+    # Asynchronous jobs (POST /v1/jobs): bounded in-process table, optionally persisted to SQLite,
+    # or "shared": persisted in SHARED_STORE_URL (for JOB_STORE_TTL seconds) so any worker can answer for a job
+    job_store_backend: str = os.getenv("JOB_STORE_BACKEND", "memory").lower()
+    job_store_ttl: float = float(os.getenv("JOB_STORE_TTL", "86400"))
+    job_store_path: str = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+    job_store_max_jobs: int = int(os.getenv("JOB_STORE_MAX_JOBS", "1000"))
+
+    # Startup: network warmup (SDK import, model resolution, first connections) runs after the worker starts
+    # listening; /ready answers 503 until it finishes or STARTUP_TIMEOUT passes
+    startup_warmup: bool = os.getenv("STARTUP_WARMUP", "1").lower() in ("1", "true")
+    startup_timeout: float = float(os.getenv("STARTUP_TIMEOUT", "30.0"))
 
     # Development helpers
     mock_external: bool = os.getenv("MOCK_EXTERNAL", "0") in ("1", "true", "True")
@@ -30,5 +177,50 @@ class Settings(BaseModel):
         os.getenv("MOCK_TRIPO") is None and (os.getenv("MOCK_EXTERNAL", "0").lower() in ("1", "true"))
     )
 
+    def problems(self) -> List[str]:
+        """Values that cannot work together; the app refuses to start when there are any."""
+        out = []
+        if self.sched_fair_by not in ("", "ip", "key"):
+            out.append(f"SCHED_FAIR_BY={self.sched_fair_by!r} is not empty, ip or key")
+        if self.gemini_image_transport not in ("files", "inline"):
+            out.append(f"GEMINI_IMAGE_TRANSPORT={self.gemini_image_transport!r} is not files or inline")
+        if self.result_cache_backend not in ("memory", "sqlite", "shared", "off"):
+            out.append(f"RESULT_CACHE_BACKEND={self.result_cache_backend!r} is not memory, sqlite, shared or off")
+        if self.job_store_backend not in ("memory", "sqlite", "shared"):
+            out.append(f"JOB_STORE_BACKEND={self.job_store_backend!r} is not memory, sqlite or shared")
+        if "shared" in (self.result_cache_backend, self.job_store_backend) and not self.shared_store_url:
+            out.append("RESULT_CACHE_BACKEND/JOB_STORE_BACKEND=shared needs SHARED_STORE_URL")
+        if self.workers > 1 and self.job_store_backend != "shared":
+            # A job polled on another worker than the one running it would be missing or look interrupted.
+            out.append("WORKERS > 1 needs JOB_STORE_BACKEND=shared")
+        for name in (
+            "gemini_max_concurrency", "gemini_limit_initial", "gemini_max_connections", "gemini_retry_attempts",
+            "tripo_max_concurrency", "tripo_limit_initial", "tripo_max_connections", "gemini_batch_pack_size",
+            "gemini_batch_fanout", "gemini_output_token_cap", "image_workers", "result_cache_max_entries", "job_store_max_jobs", "workers",
+            "sched_ideas_concurrency", "sched_model_concurrency", "sched_client_max_queued",
+        ):
+            if getattr(self, name) < 1:
+                out.append(f"{name.upper()} must be at least 1")
+        for name in (
+            "gemini_attempt_timeout", "gemini_connect_timeout", "gemini_retry_deadline", "gemini_queue_timeout",
+            "tripo_poll_timeout", "tripo_connect_timeout", "tripo_create_timeout", "tripo_status_timeout", "startup_timeout",
+            "gemini_file_ttl", "sched_ideas_queue_timeout", "sched_model_queue_timeout",
+        ):
+            if getattr(self, name) <= 0:
+                out.append(f"{name.upper()} must be positive")
+        for low, high in (("gemini_limit_initial", "gemini_max_concurrency"), ("tripo_limit_initial", "tripo_max_concurrency")):
+            if getattr(self, low) > getattr(self, high):
+                out.append(f"{low.upper()} is above {high.upper()}")
+        for name in ("similar_threshold", "gemini_hedge_quantile", "gemini_hedge_budget", "gemini_truncation_target"):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                out.append(f"{name.upper()} must be between 0 and 1")
+        if not 1 <= self.image_quality <= 100 or not 1 <= self.glb_texture_quality <= 100:
+            out.append("IMAGE_QUALITY and GLB_TEXTURE_QUALITY must be between 1 and 100")
+        if not self.gemini_api_endpoint.startswith(("http://", "https://")):
+            out.append("GEMINI_API_ENDPOINT must be an http(s) URL")
+        if self.tripo_api_base and not self.tripo_api_base.startswith(("http://", "https://")):
+            out.append("TRIPO_API_BASE must be an http(s) URL")
+        return out
+
 
 settings = Settings()
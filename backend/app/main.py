@@ -1,20 +1,94 @@
 from __future__ import annotations
 
 import asyncio
-from typing import List
+import json
+from contextlib import asynccontextmanager
+from typing import List, Sequence
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 
 from .config import settings
-from .models.schemas import GenerateResponse, ModelAsset, DIYIdea
-from .services.tripo import TripoClient
-from .services.gemini import generate_diy_ideas
+from .models.schemas import (
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
+    DIYIdea,
+    GenerateResponse,
+    Job,
+    ModelAsset,
+)
+from .services.tripo import TripoClient, poller as tripo_poller
+from .services.assets import AssetResponse, asset_store
+from .services.budget import STANDARD, Budget, IdeaPlan, parse_budget, token_usage
+from .services.cache import ideas_cache_key, image_ideas_cache_key, images_cache_key, result_cache
+from .services.coalesce import ideas_flight, model_flight
+from .services.gemini import PROMPT_VERSION, generate_diy_ideas_async, generate_diy_ideas_batch, stream_diy_ideas
+from .services.gemini_files import ImageInput, gemini_files
+from .services.gemini_registry import registry as gemini_registry
+from .services.http import close_clients, open_clients
+from .services.images import gemini_images, preprocess_images, shutdown_pool as shutdown_image_pool
+from .services.uploads import SpooledImage, UploadLimitMiddleware, close_all, spool_uploads, upload_budget
+from .services.jobs import job_store
+from .services.library import idea_library
+from .services.limiter import Saturated, gemini_limiter, tripo_limiter
+from .services import scheduler
+from .services.scheduler import client_key, ideas_queue, queue_for
+from .services.shared import WORKER_ID, heartbeat, shared_store
+from .services.similar import similar_index
+from .services.startup import startup
+from .services.telemetry import TracingMiddleware, metrics, span
+
+
+# Background runners for /v1/jobs; referenced here so they aren't garbage-collected mid-flight.
+_job_tasks: set[asyncio.Task] = set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Local steps first; a broken configuration stops the worker here rather than on the first request.
+    with startup.step("config", required=True) as check:
+        problems = settings.problems()
+        if problems:
+            raise RuntimeError("invalid configuration: " + "; ".join(problems))
+        check.detail = "ok"
+    with startup.step("clients", required=True):
+        await open_clients()
+    if settings.idea_library:
+        with startup.step("idea_library", required=True) as check:
+            check.detail = f"{await asyncio.to_thread(idea_library.load, PROMPT_VERSION)} entries"
+    if settings.asset_store:
+        with startup.step("asset_store", required=True):
+            await asyncio.to_thread(asset_store.load)
+    beat = asyncio.create_task(heartbeat(), name="worker-heartbeat") if shared_store is not None else None
+    # Gemini SDK import, model resolution and first connections run while the worker already
+    # answers /health; /ready turns 200 once they are done so the first real request doesn't pay for them.
+    startup.start_warmup()
+    startup.listening()
+    try:
+        yield
+    finally:
+        await startup.stop()
+        if beat is not None:
+            beat.cancel()
+            await asyncio.gather(beat, return_exceptions=True)
+        for task in list(_job_tasks):
+            task.cancel()
+        await tripo_poller.stop()
+        await asset_store.drain()
+        await close_clients()
+        shutdown_image_pool()
+        if shared_store is not None:
+            await shared_store.aclose()
 
 
-app = FastAPI(title="DIY Upcycler Backend", version="0.1.0")
+app = FastAPI(title="DIY Upcycler Backend", version="0.1.0", lifespan=lifespan)
 
+app.add_middleware(UploadLimitMiddleware, paths=["/v1/generate", "/v1/jobs"])
+# Outside the upload limiter, so its early 413/503 replies carry CORS headers the browser can read.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,85 +96,534 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so rejected uploads are timed too.
+app.add_middleware(TracingMiddleware)
 
 
 @app.get("/health")
 async def health():
     return {
         "status": "ok",
+        "ready": startup.ready,
         "env": settings.env,
+        "worker": {"id": WORKER_ID, "workers": settings.workers, "shared_store": shared_store and shared_store.backend},
         "gemini_model_config": settings.gemini_model,
         "mock": {
             "external": settings.mock_external,
             "gemini": settings.mock_gemini,
             "tripo": settings.mock_tripo,
         },
+        "cache": result_cache.stats(),
+        "jobs": job_store.stats(),
+        "tripo_poller": tripo_poller.stats(),
+        "coalescing": {"ideas": ideas_flight.stats(), "tripo": model_flight.stats()},
+        "limits": {"gemini": gemini_limiter.stats(), "tripo": tripo_limiter.stats()},
+        "assets": asset_store.stats(),
+        "similar": similar_index.stats(),
+        "library": idea_library.stats(),
+        "uploads": upload_budget.stats(),
+        "tokens": token_usage.stats(),
+        "gemini_files": gemini_files.stats(),
+        "scheduler": scheduler.stats(),
     }
 
 
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 503 until the startup warmup has finished and every required check passed.
+
+    /health stays a liveness probe and answers as soon as the worker listens.
+    """
+    stats = startup.stats()
+    if not stats["ready"]:
+        response.status_code = 503
+    return stats
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-phase latency histograms and pipeline counters in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/v1/gemini/models")
-async def list_gemini_models():
+async def list_gemini_models(refresh: bool = False):
+    """List models from the process-wide registry cache; ``refresh=true`` forces a cold resolution."""
+    if not settings.gemini_api_key:
+        return {"error": "GEMINI_API_KEY not configured"}
     try:
-        import google.generativeai as genai
-        if not settings.gemini_api_key:
-            return {"error": "GEMINI_API_KEY not configured"}
-        genai.configure(api_key=settings.gemini_api_key)
-        items = []
-        for m in genai.list_models():
-            items.append({
-                "name": getattr(m, "name", None),
-                "supported_generation_methods": getattr(m, "supported_generation_methods", None),
-            })
-        return {"models": items}
+        if refresh:
+            resolved = await asyncio.to_thread(gemini_registry.refresh)
+        elif gemini_registry.peek() is not None:
+            resolved = gemini_registry.get()
+        else:
+            resolved = await asyncio.to_thread(gemini_registry.get)
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(getattr(e, "detail", e))}
+    if resolved.listing_error:
+        return {"error": resolved.listing_error, "chosen": resolved.full_name}
+    return {
+        "models": resolved.listing,
+        "chosen": resolved.full_name,
+        "cache": {
+            "age_seconds": round(resolved.age, 3),
+            "ttl_seconds": gemini_registry.ttl,
+            "resolve_seconds": round(resolved.resolve_seconds, 3),
+        },
+    }
+
+
+async def _ideas_for(
+    description: str,
+    budget: Budget | None = None,
+    images: List[SpooledImage] | None = None,
+    found: tuple[str, IdeaPlan, dict | None] | None = None,
+    inputs: List[ImageInput] | None = None,
+) -> tuple[dict, IdeaPlan]:
+    """Gemini ideas for a description, served from the result cache when possible, and the plan used.
+
+    Concurrent identical descriptions share one Gemini call. With ``images``
+    Gemini sees the photos too, and the answer is cached per image set.
+    ``found`` is the caller's own ``_lookup_ideas`` result, so it isn't looked up twice;
+    ``inputs`` are the photos already read for Gemini, when the caller had to read them early.
+    """
+    if found is None:
+        digests = [img.digest for img in images] if images else None
+        found = await _lookup_ideas(description, budget, digests)
+    key, plan, cached = found
+    if cached is not None:
+        return cached, plan
+    if inputs is None and images and not settings.mock_gemini:
+        # Read now, while the request still owns the uploads; the shared flight may outlive it.
+        with span("ideas.images"):
+            inputs = await gemini_images(images)
+    result = await ideas_flight.do(
+        key, lambda: _generate_ideas(key, description, plan, inputs or ()), lookup=lambda: result_cache.peek(key)
+    )
+    return result, plan
+
+
+async def _lookup_ideas(
+    description: str, budget: Budget | None, digests: List[bytes] | None = None
+) -> tuple[str, IdeaPlan, dict | None]:
+    """Cache key, idea plan and cached ideas (if any) for a request.
+
+    A cached answer costs nothing, so it is served whatever the budget (cut
+    down only when a plan was named); on a miss the budget picks the plan.
+    Ideas written from photos (``digests``) are only ever served for the same photos.
+    """
+
+    def key_for(version: str) -> str:
+        if digests is None:
+            return ideas_cache_key(description, version)
+        return image_ideas_cache_key(description, version, digests)
+
+    key = key_for(PROMPT_VERSION)
+    with span("ideas.cache"):
+        cached = await _cached_ideas(key, description) if digests is None else await result_cache.get(key)
+    if cached is not None:
+        plan = budget.plan if budget is not None and budget.plan is not None else STANDARD
+        return key, plan, plan.trim(cached)
+    plan = token_usage.choose(budget)
+    if plan is STANDARD:
+        return key, plan, None
+    key = key_for(plan.version(PROMPT_VERSION))
+    return key, plan, await result_cache.get(key)
+
+
+async def _cached_ideas(key: str, description: str) -> dict | None:
+    """Idea library entry, else exact cache hit, else cached ideas of a near-duplicate description."""
+    if settings.idea_library:
+        cached = idea_library.get(key, description)
+        if cached is not None:
+            return cached
+    cached = await result_cache.get(key)
+    if cached is not None or not settings.similar_lookup:
+        return cached
+    match = similar_index.lookup(description)
+    if match is None:
+        return None
+    cached = await result_cache.get(match[1])
+    if cached is None:
+        # The result behind that entry was evicted; stop proposing it.
+        similar_index.discard(match[1])
+    return cached
+
+
+async def _store_ideas(
+    key: str, description: str, result: dict, plan: IdeaPlan = STANDARD, photos: bool = False
+) -> None:
+    if result.get("degraded") or len(result.get("ideas") or []) < plan.ideas:
+        # Cut short (a truncated or interrupted stream, ideas dropped as invalid) or rebuilt by the local
+        # JSON recovery: serve it, but let the next request generate a full answer rather than get
+        # this one for the whole TTL.
+        return
+    await result_cache.set(key, result)
+    # Near-duplicate lookups only ever serve standard, text-only answers.
+    if settings.similar_lookup and plan is STANDARD and not photos:
+        similar_index.add(description, key)
+
+
+async def _generate_ideas(
+    key: str, description: str, plan: IdeaPlan = STANDARD, images: Sequence[ImageInput] = ()
+) -> dict:
+    with span("ideas"):
+        result = await generate_diy_ideas_async(description, plan=plan, images=images)
+    await _store_ideas(key, description, result, plan, photos=bool(images))
+    return result
+
+
+async def _model_for(img_payload: List[SpooledImage], upload_stats: dict | None = None) -> dict:
+    """Tripo asset for an image set, keyed on the SHA-256 of the uploaded bytes.
+
+    On a miss the images are preprocessed (resize, re-encode, dedupe) before
+    upload; ``upload_stats`` receives the preprocessing report. Concurrent
+    uploads of the same image set share one Tripo job: the first request's
+    images are handed over to the shared job, which outlives that request
+    if its client disconnects while others still wait.
+    """
+    key = images_cache_key(img.digest for img in img_payload)
+    with span("model.cache"):
+        cached = await result_cache.get(key)
+    if cached is not None:
+        return cached
+    owned: List[SpooledImage] = []
+
+    def start():
+        # Only the leader gets here; followers keep (and close) their own uploads.
+        owned.extend(img.detach() for img in img_payload)
+        return _generate_model(key, owned, upload_stats)
+
+    return await model_flight.do(key, start, on_done=lambda: close_all(owned), lookup=lambda: result_cache.peek(key))
+
+
+async def _generate_model(key: str, images: List[SpooledImage], upload_stats: dict | None) -> dict:
+    with span("model.preprocess"):
+        prepared, report = await preprocess_images(images)
+    if upload_stats is not None:
+        upload_stats.update(report.as_dict())
+    tripo = TripoClient()
+    with span("model"):
+        result = await tripo.generate_from_images([(p.filename, p.content, p.content_type) for p in prepared])
+    if result.get("model_url"):
+        await result_cache.set(key, result, ttl=settings.result_cache_tripo_ttl)
+    return result
+
+
+_BUDGET_HELP = (
+    "Optional idea budget: a plan (brief, compact, standard), a latency (2500ms, 3s) or a token cost (1200tok);"
+    " the richest plan expected to fit is used"
+)
 
 
 @app.post("/v1/generate", response_model=GenerateResponse)
 async def generate(
+    request: Request,
+    response: Response,
     description: str = Form(..., description="Additional useful info such as materials, condition, etc."),
     images: List[UploadFile] | None = File(
         None, description="Zero or more images; required only when generate_model=true"
     ),
     generate_model: bool = Form(False, description="Whether to generate 3D model via Tripo (token cost)"),
+    budget: str | None = Form(None, description=_BUDGET_HELP),
+    image_ideas: bool = Form(False, description="Whether Gemini should also look at the images when writing ideas"),
 ):
-    if generate_model and not images:
-        raise HTTPException(status_code=400, detail="At least one image is required when generate_model=true")
+    if (generate_model or image_ideas) and not images:
+        raise HTTPException(
+            status_code=400, detail="At least one image is required when generate_model=true or image_ideas=true"
+        )
+    idea_budget = parse_budget(budget)
 
-    ideas_task = asyncio.create_task(asyncio.to_thread(generate_diy_ideas, description))
-
-    if generate_model:
-        # Read image bytes only if we actually generate 3D
-        img_payload = []
-        for uf in (images or []):
-            content = await uf.read()
-            if not content:
-                raise HTTPException(status_code=400, detail=f"Empty upload: {uf.filename}")
-            img_payload.append((uf.filename, content))
-
-        tripo = TripoClient()
-        model_task = asyncio.create_task(tripo.generate_from_images(img_payload))
-        model_result, ideas_result = await asyncio.gather(model_task, ideas_task)
-    else:
-        # Skip Tripo call to save tokens
-        ideas_result = await ideas_task
-        model_result = {"model_url": None, "preview_image_url": None, "format": None}
+    # Spool uploads only if a branch actually uses them; both read the same spooled (and decoded) images
+    with span("upload.spool"):
+        img_payload = await spool_uploads(images or []) if generate_model or image_ideas else []
+
+    try:
+        found = None
+        if not generate_model:
+            # Answered from the cache, the library or a near-duplicate, an idea-only request never reaches
+            # Gemini, so it doesn't queue for (or get shed by) the scheduler either; the stream does the same.
+            digests = [img.digest for img in img_payload] if image_ideas else None
+            found = await _lookup_ideas(description, idea_budget, digests)
+        if found is not None and found[2] is not None:
+            _, plan, ideas_result = found
+            model_result = {"model_url": None, "preview_image_url": None, "format": None}
+        else:
+            async with queue_for(generate_model).admit(client_key(request)):
+                inputs = None
+                if generate_model and image_ideas and not settings.mock_gemini:
+                    # The Tripo flight takes the uploads over (detach) as soon as it starts, possibly
+                    # before the idea lookups finish: read the photos for Gemini first.
+                    with span("ideas.images"):
+                        inputs = await gemini_images(img_payload)
+                ideas_task = asyncio.create_task(
+                    _ideas_for(description, idea_budget, img_payload if image_ideas else None, found, inputs)
+                )
+                if generate_model:
+                    upload_stats: dict = {}
+                    model_task = asyncio.create_task(_model_for(img_payload, upload_stats))
+                    model_result, (ideas_result, plan) = await asyncio.gather(model_task, ideas_task)
+                    if upload_stats:
+                        response.headers["X-Image-Bytes-Saved"] = str(upload_stats["bytes_saved"])
+                else:
+                    # Skip Tripo call to save tokens
+                    ideas_result, plan = await ideas_task
+                    model_result = {"model_url": None, "preview_image_url": None, "format": None}
+    finally:
+        close_all(img_payload)
+    response.headers["X-Idea-Plan"] = plan.name
 
     ideas: List[DIYIdea] = [DIYIdea(**i) for i in ideas_result.get("ideas", [])]
 
     return GenerateResponse(
-        model=ModelAsset(**model_result),
+        model=ModelAsset(**asset_store.localize(model_result, str(request.base_url))),
         ideas=ideas,
     )
 
 
-# Uvicorn entrypoint for Docker
+@app.post("/v1/generate/stream")
+async def generate_stream(
+    request: Request,
+    description: str = Form(..., description="Additional useful info such as materials, condition, etc."),
+    budget: str | None = Form(None, description=_BUDGET_HELP),
+):
+    """Stream ideas as NDJSON, one ``{"type": "idea"}`` line per idea as soon as Gemini finishes it.
+
+    The stream ends with ``{"type": "done"}`` or, on failure, ``{"type": "error"}``.
+    """
+    key, plan, cached = await _lookup_ideas(description, parse_budget(budget))
+    # Admitted before the response starts, so a shed request still gets a plain 503 + Retry-After.
+    ticket = await ideas_queue.acquire(client_key(request)) if cached is None else None
+
+    async def lines():
+        ideas: List[dict] = []
+        try:
+            if cached is not None:
+                ideas = list(cached.get("ideas", []))
+                for index, idea in enumerate(ideas):
+                    yield json.dumps({"type": "idea", "index": index, "idea": idea}, ensure_ascii=False) + "\n"
+            else:
+                async for idea in stream_diy_ideas(description, plan=plan):
+                    data = idea.model_dump()
+                    yield json.dumps({"type": "idea", "index": len(ideas), "idea": data}, ensure_ascii=False) + "\n"
+                    ideas.append(data)
+                await _store_ideas(key, description, {"ideas": ideas}, plan)
+            yield json.dumps({"type": "done", "count": len(ideas)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": _error_detail(e)}, ensure_ascii=False) + "\n"
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no", "X-Idea-Plan": plan.name},
+        # Also when the client is gone before the body starts (the generator never runs then).
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+
+@app.post("/v1/generate/batch", response_model=BatchGenerateResponse)
+async def generate_batch(request: Request, req: BatchGenerateRequest):
+    """Ideas for many descriptions at once (no 3D models).
+
+    Cached and duplicate descriptions are answered without Gemini; the rest go
+    through generate_diy_ideas_batch. Failures are reported per item, so one
+    bad item doesn't fail the whole batch.
+    """
+    if len(req.descriptions) > settings.gemini_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.gemini_batch_max_items} descriptions per batch")
+
+    keys = [ideas_cache_key(d, PROMPT_VERSION) for d in req.descriptions]
+    answers: dict = {}
+    pending: dict = {}  # cache key -> description, first occurrence wins
+    for key, description in zip(keys, req.descriptions):
+        if key in answers or key in pending:
+            continue
+        cached = await _cached_ideas(key, description)
+        if cached is not None:
+            answers[key] = cached
+        else:
+            pending[key] = description
+
+    if pending:
+        async with ideas_queue.admit(client_key(request)):
+            generated = await generate_diy_ideas_batch(list(pending.values()))
+        for (key, description), outcome in zip(pending.items(), generated):
+            answers[key] = outcome
+            if not isinstance(outcome, Exception):
+                await _store_ideas(key, description, outcome)
+
+    results: List[BatchItemResult] = []
+    for index, key in enumerate(keys):
+        outcome = answers[key]
+        if isinstance(outcome, Exception):
+            results.append(
+                BatchItemResult(
+                    index=index,
+                    status="error",
+                    error=_error_detail(outcome),
+                    status_code=getattr(outcome, "status_code", 500),
+                )
+            )
+            continue
+        results.append(
+            BatchItemResult(
+                index=index,
+                status="ok",
+                result=GenerateResponse(
+                    model=ModelAsset(), ideas=[DIYIdea(**i) for i in outcome.get("ideas", [])]
+                ),
+            )
+        )
+    failed = sum(1 for r in results if r.status == "error")
+    return BatchGenerateResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+
+def _error_detail(e: Exception) -> str:
+    return str(getattr(e, "detail", None) or e)
+
+
+async def _run_job(
+    job_id: str,
+    description: str,
+    img_payload: List[SpooledImage],
+    base_url: str,
+    budget: Budget | None = None,
+    client: str = "",
+) -> None:
+    # The job stays "queued" until the scheduler admits it; shed, it fails like a synchronous request would.
+    try:
+        async with queue_for(bool(img_payload)).admit(client):
+            await _run_job_phases(job_id, description, img_payload, base_url, budget)
+    except Saturated as e:
+        close_all(img_payload)
+        changes = {"ideas_status": "failed", "ideas_error": _error_detail(e)}
+        if img_payload:
+            changes.update(model_status="failed", model_error=_error_detail(e))
+        job_store.update(job_id, **changes)
+
+
+async def _run_job_phases(
+    job_id: str, description: str, img_payload: List[SpooledImage], base_url: str, budget: Budget | None
+) -> None:
+    job_store.update(job_id, status="running")
+
+    async def ideas_phase():
+        try:
+            result, _ = await _ideas_for(description, budget)
+            ideas = [DIYIdea(**i) for i in result.get("ideas", [])]
+            job_store.update(job_id, ideas=ideas, ideas_status="done")
+        except Exception as e:
+            job_store.update(job_id, ideas_status="failed", ideas_error=_error_detail(e))
+
+    async def model_phase():
+        try:
+            result = asset_store.localize(await _model_for(img_payload), base_url)
+            job_store.update(job_id, model=ModelAsset(**result), model_status="done")
+        except Exception as e:
+            job_store.update(job_id, model_status="failed", model_error=_error_detail(e))
+        finally:
+            close_all(img_payload)
+
+    phases = [ideas_phase()]
+    if img_payload:
+        phases.append(model_phase())
+    await asyncio.gather(*phases)
+
+
+@app.post("/v1/jobs", response_model=Job, status_code=202)
+async def submit_job(
+    request: Request,
+    description: str = Form(..., description="Additional useful info such as materials, condition, etc."),
+    images: List[UploadFile] | None = File(
+        None, description="Zero or more images; required only when generate_model=true"
+    ),
+    generate_model: bool = Form(False, description="Whether to generate 3D model via Tripo (token cost)"),
+    budget: str | None = Form(None, description=_BUDGET_HELP),
+):
+    """Start generation in the background and return the job id immediately."""
+    if generate_model and not images:
+        raise HTTPException(status_code=400, detail="At least one image is required when generate_model=true")
+    idea_budget = parse_budget(budget)
+
+    img_payload = await spool_uploads(images or []) if generate_model else []
+    try:
+        job = job_store.create(generate_model=generate_model)
+    except HTTPException:
+        close_all(img_payload)
+        raise
+    task = asyncio.create_task(
+        _run_job(job.id, description, img_payload, str(request.base_url), idea_budget, client_key(request))
+    )
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return job
+
+
+@app.api_route("/v1/assets/{digest}", methods=["GET", "HEAD"])
+async def get_asset(digest: str):
+    """A mirrored Tripo model file by SHA-256, with ETag and byte-range support."""
+    found = asset_store.get(digest)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return AssetResponse(found)
+
+
+@app.api_route("/v1/assets/{digest}/{variant}", methods=["GET", "HEAD"])
+async def get_asset_variant(digest: str, variant: str):
+    """An optimized variant of a mirrored model (e.g. ``mobile``), listed in ModelAsset.variants."""
+    found = asset_store.get(digest, variant)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return AssetResponse(found)
+
+
+@app.get("/v1/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/v1/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: one ``job`` event per state change, ending when the job finishes."""
+    if await job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for job in job_store.watch(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: job\ndata: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Uvicorn entrypoint for Docker: auto-reload in development, WORKERS processes otherwise
 def run():  # pragma: no cover
     import uvicorn
 
+    reload = settings.env == "development" and settings.workers == 1
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.env == "development",
+        reload=reload,
+        workers=None if reload else settings.workers,
     )
+
+
+# Offline idea library builder: ``python -m app.warmup [seeds.txt]``
+def warmup():  # pragma: no cover
+    from .warmup import main
+
+    main()
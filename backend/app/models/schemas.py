@@ -18,14 +18,65 @@ class DIYIdea(BaseModel):
     estimated_time_minutes: Optional[int] = None
 
 
+class ModelVariant(BaseModel):
+    name: str  # original | mobile
+    url: str
+    size: int  # bytes
+    triangles: Optional[int] = None
+
+
 class ModelAsset(BaseModel):
     # Avoid Pydantic warning about protected namespace "model_"
     model_config = {"protected_namespaces": ()}
     model_url: Optional[str] = None
     preview_image_url: Optional[str] = None
     format: Optional[str] = None  # e.g., glb, obj, fbx
+    # Locally served copies once the model is mirrored; pick one by size
+    variants: Optional[List[ModelVariant]] = None
 
 
 class GenerateResponse(BaseModel):
     model: ModelAsset
     ideas: List[DIYIdea]
+
+
+class BatchGenerateRequest(BaseModel):
+    descriptions: List[str] = Field(..., min_length=1)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str  # ok | error
+    result: Optional[GenerateResponse] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None  # HTTP status the item would have failed with on its own
+
+
+class BatchGenerateResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+class Job(BaseModel):
+    """State of an asynchronous generation job (POST /v1/jobs).
+
+    Ideas and the 3D model are tracked separately so ideas can be shown
+    as soon as Gemini answers while Tripo is still working.
+    """
+
+    model_config = {"protected_namespaces": ()}
+    id: str
+    status: str = "queued"  # queued | running | succeeded | failed
+    ideas_status: str = "pending"  # pending | done | failed
+    model_status: str = "pending"  # pending | done | failed | skipped
+    ideas: Optional[List[DIYIdea]] = None
+    model: Optional[ModelAsset] = None
+    ideas_error: Optional[str] = None
+    model_error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
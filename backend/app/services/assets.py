@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.responses import Response
+
+from ..config import settings
+from .glb import optimize_glb_file
+from .http import get_client
+from .images import run_in_pool
+from .telemetry import metrics, span
+
+_CHUNK = 256 * 1024
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+# Formats worth mirroring: what the viewer loads directly.
+CONTENT_TYPES = {"glb": "model/gltf-binary", "obj": "model/obj"}
+
+MIRROR_TOTAL = metrics.counter("diy_asset_mirror_total", "Tripo model files mirrored into the asset store, by outcome")
+VARIANTS_TOTAL = metrics.counter("diy_asset_variants_total", "Optimized model variants built, by outcome")
+SERVED_BYTES = metrics.counter("diy_asset_served_bytes_total", "Asset bytes sent from the local store")
+
+
+@dataclass
+class StoredAsset:
+    digest: str
+    format: str
+    size: int
+    sources: List[str] = field(default_factory=list)
+    # Derived files next to the original, by name ("mobile"): {"digest", "size", "triangles"}
+    variants: Dict[str, dict] = field(default_factory=dict)
+
+    @property
+    def total_size(self) -> int:
+        return self.size + sum(v["size"] for v in self.variants.values())
+
+
+@dataclass
+class AssetFile:
+    """One servable file: the original or a variant."""
+
+    digest: str  # SHA-256 of the file's own bytes (the ETag)
+    size: int
+    content_type: str
+    path: str
+
+
+def _source_key(url: str) -> str:
+    # Signed URLs get a fresh query string on every status poll; the path identifies the file.
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def asset_format(url: Optional[str], declared: Optional[str]) -> Optional[str]:
+    """Format of a Tripo asset from its declared format or URL suffix, if it is one we mirror."""
+    fmt = (declared or "").lower().lstrip(".")
+    if fmt not in CONTENT_TYPES and url:
+        fmt = os.path.splitext(urlsplit(url).path)[1].lower().lstrip(".")
+    return fmt if fmt in CONTENT_TYPES else None
+
+
+class AssetStore:
+    """Content-addressed local copies of finished Tripo model files.
+
+    Files live at ``<root>/<digest[:2]>/<digest>.<format>`` (SHA-256 of the
+    bytes) with a ``.json`` sidecar recording the URLs they were fetched from,
+    so the index survives restarts. Total size is bounded by ``max_bytes``;
+    least recently served files are evicted first. Downloads run in the
+    background, one per source URL, and never block a generate response.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_file_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._assets: "OrderedDict[str, StoredAsset]" = OrderedDict()  # LRU: least recently served first
+        self._sources: Dict[str, str] = {}  # source key -> digest
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # -- index ---------------------------------------------------------------
+
+    def load(self) -> None:
+        """Rebuild the index from the sidecars on disk, oldest access first."""
+        found: List[Tuple[float, StoredAsset]] = []
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        with open(entry.path, encoding="utf-8") as f:
+                            meta = json.load(f)
+                        asset = StoredAsset(
+                            meta["digest"], meta["format"], int(meta["size"]), list(meta["sources"]), meta.get("variants", {})
+                        )
+                        found.append((os.stat(self._path(asset)).st_mtime, asset))
+                    except (OSError, ValueError, KeyError, TypeError):
+                        continue
+        with self._lock:
+            self._assets.clear()
+            self._sources.clear()
+            self.total_bytes = 0
+            for _, asset in sorted(found, key=lambda pair: pair[0]):
+                self._index_locked(asset)
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _index_locked(self, asset: StoredAsset) -> None:
+        self._assets[asset.digest] = asset
+        self.total_bytes += asset.total_size
+        for source in asset.sources:
+            self._sources[source] = asset.digest
+
+    def _path(self, asset: StoredAsset, variant: Optional[str] = None) -> str:
+        name = f"{asset.digest}.{variant}.{asset.format}" if variant else f"{asset.digest}.{asset.format}"
+        return os.path.join(self.root, asset.digest[:2], name)
+
+    def _files(self, asset: StoredAsset) -> List[str]:
+        return [self._path(asset) + ".json", self._path(asset)] + [self._path(asset, v) for v in asset.variants]
+
+    def get(self, digest: str, variant: Optional[str] = None) -> Optional[AssetFile]:
+        """A stored file, marking the asset recently used; None when unknown or evicted."""
+        if not _DIGEST.match(digest):
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            asset = self._assets.get(digest)
+            if asset is None or (variant is not None and variant not in asset.variants):
+                return None
+            self._assets.move_to_end(digest)
+        path = self._path(asset)
+        try:
+            # mtime doubles as the access time that orders eviction after a restart.
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._forget_locked(digest)
+            return None
+        content_type = CONTENT_TYPES.get(asset.format, "application/octet-stream")
+        if variant is None:
+            return AssetFile(asset.digest, asset.size, content_type, path)
+        info = asset.variants[variant]
+        return AssetFile(info["digest"], info["size"], content_type, self._path(asset, variant))
+
+    def lookup(self, url: str) -> Optional[StoredAsset]:
+        self._ensure_loaded()
+        with self._lock:
+            digest = self._sources.get(_source_key(url))
+            return self._assets.get(digest) if digest else None
+
+    def _forget_locked(self, digest: str) -> Optional[StoredAsset]:
+        asset = self._assets.pop(digest, None)
+        if asset is None:
+            return None
+        self.total_bytes -= asset.total_size
+        for source in asset.sources:
+            if self._sources.get(source) == digest:
+                del self._sources[source]
+        return asset
+
+    def _evict(self) -> None:
+        doomed: List[StoredAsset] = []
+        with self._lock:
+            while self.total_bytes > self.max_bytes and len(self._assets) > 1:
+                digest = next(iter(self._assets))
+                doomed.append(self._forget_locked(digest))
+                self.evictions += 1
+        for asset in doomed:
+            for path in self._files(asset):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    # -- mirroring -----------------------------------------------------------
+
+    def localize(self, result: dict, base_url: str = "") -> dict:
+        """Copy of a Tripo result whose ``model_url`` points at the local store when the file is mirrored.
+
+        Otherwise the provider URL is kept and a background download is
+        started, so later responses for the same model are served locally.
+        """
+        url = result.get("model_url")
+        fmt = asset_format(url, result.get("format"))
+        if not url or fmt is None or settings.mock_tripo or not settings.asset_store:
+            return result
+        asset = self.lookup(url)
+        if asset is None:
+            self.schedule(url, fmt)
+            return result
+        base = (settings.asset_public_base or base_url).rstrip("/")
+        url = f"{base}/v1/assets/{asset.digest}"
+        variants = [{"name": "original", "url": url, "size": asset.size}]
+        variants += [
+            {"name": name, "url": f"{url}/{name}", "size": info["size"], "triangles": info.get("triangles")}
+            for name, info in asset.variants.items()
+        ]
+        return {**result, "model_url": url, "format": asset.format, "variants": variants}
+
+    def schedule(self, url: str, fmt: str) -> Optional[asyncio.Task]:
+        """Start mirroring ``url`` in the background unless it is stored or already downloading."""
+        key = _source_key(url)
+        task = self._pending.get(key)
+        if task is not None and not task.done():
+            return task
+        loop = asyncio.get_running_loop()
+        # A fresh context so the download isn't attributed to the request that triggered it.
+        task = loop.create_task(self._mirror_quietly(url, fmt), name=f"asset:{key[-48:]}", context=contextvars.Context())
+        self._pending[key] = task
+        task.add_done_callback(lambda t, key=key: self._pending.pop(key, None) if self._pending.get(key) is t else None)
+        return task
+
+    async def _mirror_quietly(self, url: str, fmt: str) -> Optional[StoredAsset]:
+        try:
+            return await self.mirror(url, fmt)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The provider URL still works; the next view retries the download.
+            MIRROR_TOTAL.inc(outcome="failed")
+            return None
+
+    async def mirror(self, url: str, fmt: str) -> StoredAsset:
+        """Download ``url`` into the store (streamed to disk, hashed on the way) and index it."""
+        existing = self.lookup(url)
+        if existing is not None:
+            return existing
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".download-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        client = get_client("tripo")
+        owned = client is None
+        if owned:
+            client = httpx.AsyncClient()
+        try:
+            with span("asset.mirror"):
+                async with client.stream("GET", url, timeout=settings.asset_download_timeout) as r:
+                    r.raise_for_status()
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in r.aiter_bytes(_CHUNK):
+                            size += len(chunk)
+                            if size > self.max_file_bytes:
+                                raise ValueError(f"asset exceeds {self.max_file_bytes} bytes")
+                            digest.update(chunk)
+                            await asyncio.to_thread(f.write, chunk)
+            asset = self._commit(tmp_path, digest.hexdigest(), fmt, size, _source_key(url))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            if owned:
+                await client.aclose()
+        MIRROR_TOTAL.inc(outcome="stored")
+        if asset.format == "glb" and settings.glb_optimize and not asset.variants:
+            await self._build_mobile_variant(asset)
+        self._evict()
+        return asset
+
+    async def _build_mobile_variant(self, asset: StoredAsset) -> None:
+        """Decimated, texture-compressed copy for phones, built in the worker pool next to the original."""
+        path = self._path(asset, "mobile")
+        tmp = f"{path}.tmp"
+        try:
+            with span("asset.optimize"):
+                report = await run_in_pool(
+                    optimize_glb_file,
+                    self._path(asset),
+                    tmp,
+                    settings.glb_target_triangles,
+                    settings.glb_texture_max_edge,
+                    settings.glb_texture_quality,
+                )
+        except Exception:
+            VARIANTS_TOTAL.inc(outcome="failed")
+            return
+        if report["skipped"] is not None:
+            VARIANTS_TOTAL.inc(outcome="skipped")
+            return
+        digest = await asyncio.to_thread(_file_digest, tmp)
+        with self._lock:
+            if self._assets.get(asset.digest) is not asset:
+                # Evicted while we were working.
+                os.unlink(tmp)
+                return
+            os.replace(tmp, path)
+            asset.variants["mobile"] = {"digest": digest, "size": report["bytes_out"], "triangles": report["triangles_out"]}
+            self.total_bytes += report["bytes_out"]
+            self._write_meta(asset)
+        VARIANTS_TOTAL.inc(outcome="built")
+
+    def _commit(self, tmp_path: str, digest: str, fmt: str, size: int, source: str) -> StoredAsset:
+        with self._lock:
+            asset = self._assets.get(digest)
+            if asset is not None:
+                # Same bytes behind another URL (e.g. a regenerated task): just remember the new source.
+                os.unlink(tmp_path)
+                if source not in asset.sources:
+                    asset.sources.append(source)
+                    self._sources[source] = digest
+                    self._write_meta(asset)
+                return asset
+            asset = StoredAsset(digest, fmt, size, [source])
+            path = self._path(asset)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._write_meta(asset)
+            self._index_locked(asset)
+            return asset
+
+    def _write_meta(self, asset: StoredAsset) -> None:
+        meta = {
+            "digest": asset.digest,
+            "format": asset.format,
+            "size": asset.size,
+            "sources": asset.sources,
+            "variants": asset.variants,
+        }
+        tmp = f"{self._path(asset)}.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(asset) + ".json")
+
+    async def drain(self) -> None:
+        """Cancel background downloads (app shutdown)."""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": settings.asset_store,
+                "assets": len(self._assets),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "downloading": len(self._pending),
+                "evictions": self.evictions,
+            }
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single ``bytes=`` range; None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied (416). Multi-range
+    requests are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None  # malformed: ignore the header
+    if not first:
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class AssetResponse(Response):
+    """Response for a stored asset: strong ETag, conditional GET, single byte ranges.
+
+    The body goes out through the server's ``http.response.zerocopysend``
+    extension (sendfile) when it offers one, otherwise in chunks read off the
+    event loop. Starlette's FileResponse does neither ranges nor ETags here.
+    """
+
+    def __init__(self, file: AssetFile):
+        self.file = file
+        self.status_code = 200
+        self.background = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or []}
+        etag = f'"{self.file.digest}"'
+        base = [
+            (b"etag", etag.encode()),
+            (b"accept-ranges", b"bytes"),
+            # Content-addressed: the bytes behind this URL never change.
+            (b"cache-control", b"public, max-age=31536000, immutable"),
+        ]
+        tags = {t.strip().removeprefix("W/") for t in headers.get("if-none-match", "").split(",")}
+        if etag in tags or "*" in tags:
+            await send({"type": "http.response.start", "status": 304, "headers": base})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        size = self.file.size
+        status, start, end = 200, 0, size - 1
+        if_range = headers.get("if-range")
+        if if_range is None or if_range.strip() == etag:
+            try:
+                rng = parse_range(headers.get("range"), size)
+            except ValueError:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 416,
+                        "headers": base + [(b"content-range", f"bytes */{size}".encode()), (b"content-length", b"0")],
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if rng is not None:
+                status, (start, end) = 206, rng
+        count = end - start + 1
+        out = base + [
+            (b"content-type", self.file.content_type.encode()),
+            (b"content-length", str(count).encode()),
+        ]
+        if status == 206:
+            out.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+        await send({"type": "http.response.start", "status": status, "headers": out})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.file.path, "rb") as f:
+            if "http.response.zerocopysend" in (scope.get("extensions") or {}):
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(), "offset": start, "count": count})
+            else:
+                offset, remaining = start, count
+                while remaining > 0:
+                    chunk = await asyncio.to_thread(os.pread, f.fileno(), min(_CHUNK, remaining), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b""})
+        SERVED_BYTES.inc(count)
+
+
+asset_store = AssetStore(settings.asset_store_dir, settings.asset_store_max_bytes, settings.asset_max_file_bytes)
+
+metrics.gauge(
+    "diy_asset_store_bytes", "Bytes held in the local asset store", lambda: {(): float(asset_store.total_bytes)}
+)
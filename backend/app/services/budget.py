@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from ..config import settings
+from .telemetry import metrics
+
+# Token accounting and per-request idea budgets. Every generateContent answer
+# is recorded with the token counts Gemini reports (usageMetadata) and whether
+# it stopped at maxOutputTokens. A request may name a plan or give a latency or
+# token budget; it then gets the richest plan expected to fit, with an output
+# limit sized from what that plan actually produced rather than a fixed 1536.
+
+
+@dataclass(frozen=True)
+class IdeaPlan:
+    """How many ideas, with how many steps each, one request asks Gemini for."""
+
+    name: str
+    ideas: int
+    min_steps: int
+    max_steps: int
+
+    @property
+    def prior_output_tokens(self) -> int:
+        # Size of the answer before anything was measured: roughly 100 tokens of title,
+        # description, materials and tools per idea, and 40 per (Japanese) step.
+        return self.ideas * (100 + 40 * (self.min_steps + self.max_steps) // 2)
+
+    def version(self, prompt_version: str) -> str:
+        """Cache key version: the standard plan keeps the plain prompt version (and its cached entries)."""
+        return prompt_version if self is STANDARD else f"{prompt_version}.{self.name}"
+
+    def trim(self, result: dict) -> dict:
+        """A richer cached answer cut down to this plan's idea count."""
+        ideas = result.get("ideas") or []
+        return result if len(ideas) <= self.ideas else {**result, "ideas": ideas[: self.ideas]}
+
+
+BRIEF = IdeaPlan("brief", ideas=1, min_steps=4, max_steps=6)
+COMPACT = IdeaPlan("compact", ideas=2, min_steps=5, max_steps=7)
+STANDARD = IdeaPlan("standard", ideas=3, min_steps=6, max_steps=10)
+
+# Poorest first.
+PLANS: Tuple[IdeaPlan, ...] = (BRIEF, COMPACT, STANDARD)
+PLANS_BY_NAME = {plan.name: plan for plan in PLANS}
+
+
+@dataclass(frozen=True)
+class Budget:
+    """What the caller is willing to spend on one request: a fixed plan, seconds or tokens."""
+
+    plan: Optional[IdeaPlan] = None
+    seconds: Optional[float] = None
+    tokens: Optional[int] = None
+
+    @property
+    def kind(self) -> str:
+        return "plan" if self.plan else "latency" if self.seconds is not None else "tokens"
+
+
+_BUDGET = re.compile(r"^(\d+(?:\.\d+)?)\s*(ms|s|tok|tokens)$")
+
+
+def parse_budget(text: Optional[str]) -> Optional[Budget]:
+    """``brief``/``compact``/``standard``, a latency (``2500ms``, ``3s``) or a token cost (``1200tok``)."""
+    if text is None or not text.strip():
+        return None
+    text = text.strip().lower()
+    if text in PLANS_BY_NAME:
+        return Budget(plan=PLANS_BY_NAME[text])
+    match = _BUDGET.match(text)
+    value = float(match.group(1)) if match else 0.0
+    if value <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"budget {text!r}: expected {', '.join(PLANS_BY_NAME)}, a latency like 2500ms or 3s,"
+            " or a token cost like 1200tok",
+        )
+    unit = match.group(2)
+    if unit == "ms":
+        return Budget(seconds=value / 1000)
+    if unit == "s":
+        return Budget(seconds=value)
+    return Budget(tokens=int(value))
+
+
+# Label the current generateContent calls are accounted under (a plan name, "repair", "batch").
+_label: ContextVar[str] = ContextVar("diy_token_label", default="other")
+
+
+@contextmanager
+def accounted_as(label: str) -> Iterator[None]:
+    token = _label.set(label)
+    try:
+        yield
+    finally:
+        _label.reset(token)
+
+
+def _quantile(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Usage:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.truncated = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.prompts: Deque[int] = deque(maxlen=window)
+        # Output sizes and latencies of complete answers only: a truncated one says nothing about
+        # how long the answer wanted to be.
+        self.outputs: Deque[int] = deque(maxlen=window)
+        self.latencies: Deque[float] = deque(maxlen=window)
+        # Multiplier on the output limit: raised on every truncation, decays back on complete answers.
+        self.boost = 1.0
+
+
+class TokenAccounting:
+    """Per-label token usage and truncation, and the estimates budgets are checked against."""
+
+    # Output limit headroom over the recent p99 answer, and the boost applied per truncation.
+    HEADROOM = 1.25
+    GROWTH = 1.25
+    MAX_BOOST = 4.0
+    # Complete answers of a plan before its own latency quantile replaces the token-rate estimate.
+    MIN_SAMPLES = 20
+    # Before any call was seen: prompt size, fixed overhead per call and generation speed.
+    PRIOR_PROMPT_TOKENS = 600
+    PRIOR_OVERHEAD = 0.6
+    PRIOR_SECONDS_PER_TOKEN = 0.008
+
+    def __init__(self, window: int = 256, cap: int = 8192, truncation_target: float = 0.02):
+        self.window = window
+        self.cap = cap
+        self.truncation_target = truncation_target
+        # Chosen so the boost is stable when truncations happen at the target rate:
+        # target * log(GROWTH) == (1 - target) * -log(decay).
+        target = min(max(truncation_target, 1e-4), 0.5)
+        self._decay = math.exp(-target * math.log(self.GROWTH) / (1 - target))
+        self._usage: Dict[str, _Usage] = {}
+        # (output tokens, seconds) of recent complete answers of every label, for the latency model.
+        self._speed: Deque[Tuple[int, float]] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, payload: Dict[str, Any], seconds: float, label: Optional[str] = None) -> None:
+        """Record one answer (for a stream, the last chunk: it carries the totals)."""
+        label = label or _label.get()
+        meta = payload.get("usageMetadata") or {}
+        prompt = int(meta.get("promptTokenCount") or 0)
+        output = int(meta.get("candidatesTokenCount") or 0)
+        finish = next((c.get("finishReason") for c in payload.get("candidates") or [] if c.get("finishReason")), None)
+        truncated = finish == "MAX_TOKENS"
+        TOKENS_TOTAL.inc(prompt, kind="prompt", plan=label)
+        TOKENS_TOTAL.inc(output, kind="output", plan=label)
+        ANSWERS_TOTAL.inc(plan=label, finish=(finish or "unknown").lower())
+        with self._lock:
+            usage = self._usage.get(label)
+            if usage is None:
+                usage = self._usage[label] = _Usage(self.window)
+            usage.calls += 1
+            usage.prompt_tokens += prompt
+            usage.output_tokens += output
+            if prompt:
+                usage.prompts.append(prompt)
+            if truncated:
+                usage.truncated += 1
+                usage.boost = min(usage.boost * self.GROWTH, self.MAX_BOOST)
+                return
+            usage.boost = max(1.0, usage.boost * self._decay)
+            if output:
+                usage.outputs.append(output)
+                usage.latencies.append(seconds)
+                self._speed.append((output, seconds))
+
+    def output_limit(self, plan: IdeaPlan) -> int:
+        """maxOutputTokens for a plan: headroom over the larger of its prior and its recent p99 answer."""
+        with self._lock:
+            usage = self._usage.get(plan.name)
+            observed = _quantile(usage.outputs, 0.99) if usage else None
+            boost = usage.boost if usage else 1.0
+        base = max(plan.prior_output_tokens, observed or 0)
+        return int(min(self.cap, base * self.HEADROOM * boost))
+
+    def expected_tokens(self, plan: IdeaPlan) -> float:
+        """Prompt plus output tokens of a typical answer under this plan."""
+        with self._lock:
+            usage = self._usage.get(plan.name)
+            prompt = _quantile(usage.prompts, 0.5) if usage else None
+            output = _quantile(usage.outputs, 0.5) if usage else None
+        return (prompt or self.PRIOR_PROMPT_TOKENS) + (output or plan.prior_output_tokens)
+
+    def expected_seconds(self, plan: IdeaPlan) -> float:
+        """p90 latency of a call under this plan: measured once there are enough answers, else modelled."""
+        with self._lock:
+            usage = self._usage.get(plan.name)
+            if usage is not None and len(usage.latencies) >= self.MIN_SAMPLES:
+                return _quantile(usage.latencies, 0.9)
+            output = _quantile(usage.outputs, 0.9) if usage else None
+            speed = list(self._speed)
+        overhead, per_token = _fit(speed) or (self.PRIOR_OVERHEAD, self.PRIOR_SECONDS_PER_TOKEN)
+        return overhead + per_token * (output or plan.prior_output_tokens)
+
+    def choose(self, budget: Optional[Budget]) -> IdeaPlan:
+        """The richest plan expected to fit the budget (the poorest one when none does)."""
+        if budget is None:
+            plan = STANDARD
+        elif budget.plan is not None:
+            plan = budget.plan
+        else:
+            fits = (
+                (lambda p: self.expected_seconds(p) <= budget.seconds)
+                if budget.seconds is not None
+                else (lambda p: self.expected_tokens(p) <= budget.tokens)
+            )
+            plan = next((p for p in reversed(PLANS) if fits(p)), PLANS[0])
+        PLANS_TOTAL.inc(plan=plan.name, budget=budget.kind if budget else "none")
+        return plan
+
+    def stats(self) -> dict:
+        with self._lock:
+            usage = dict(self._usage)
+        out = {}
+        for label, u in sorted(usage.items()):
+            row = {
+                "calls": u.calls,
+                "prompt_tokens": u.prompt_tokens,
+                "output_tokens": u.output_tokens,
+                "truncation_rate": round(u.truncated / u.calls, 4) if u.calls else 0.0,
+                "boost": round(u.boost, 3),
+            }
+            plan = PLANS_BY_NAME.get(label)
+            if plan is not None:
+                row["output_limit"] = self.output_limit(plan)
+                row["expected_seconds"] = round(self.expected_seconds(plan), 3)
+            out[label] = row
+        return out
+
+
+def _fit(points: List[Tuple[int, float]]) -> Optional[Tuple[float, float]]:
+    """Least-squares ``seconds = overhead + per_token * tokens``; None without enough spread."""
+    if len(points) < 10:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var <= 0:
+        return None
+    per_token = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var)
+    return max(0.0, mean_y - per_token * mean_x), per_token
+
+
+token_usage = TokenAccounting(cap=settings.gemini_output_token_cap, truncation_target=settings.gemini_truncation_target)
+
+TOKENS_TOTAL = metrics.counter("diy_gemini_tokens_total", "Gemini tokens reported in usageMetadata, by kind and plan")
+ANSWERS_TOTAL = metrics.counter(
+    "diy_gemini_answers_total", "Gemini answers by plan and finish reason (max_tokens means truncated)"
+)
+PLANS_TOTAL = metrics.counter("diy_idea_plans_total", "Idea plans chosen, by plan and kind of budget")
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..config import settings
+from .shared import SharedStore, shared_store
+
+
+def normalize_description(description: str) -> str:
+    """Canonical form used for cache keys: NFKC, lower-case, collapsed whitespace."""
+    text = unicodedata.normalize("NFKC", description or "").lower()
+    return " ".join(text.split())
+
+
+def ideas_cache_key(description: str, prompt_version: str) -> str:
+    digest = hashlib.sha256(normalize_description(description).encode("utf-8")).hexdigest()
+    return f"ideas:{prompt_version}:{digest}"
+
+
+def image_ideas_cache_key(description: str, prompt_version: str, digests: Iterable[bytes]) -> str:
+    """Key for ideas written with photos in view: the description plus the ordered upload digests."""
+    h = hashlib.sha256(normalize_description(description).encode("utf-8"))
+    for digest in digests:
+        h.update(digest)
+    return f"ideas:{prompt_version}:photos:{h.hexdigest()}"
+
+
+def images_cache_key(digests: Iterable[bytes]) -> str:
+    """Key for an image set from the per-image SHA-256 digests of the uploaded bytes."""
+    # Order matters for multi-view uploads, so hash the ordered list of digests.
+    h = hashlib.sha256()
+    for digest in digests:
+        h.update(digest)
+    return f"tripo:{h.hexdigest()}"
+
+
+class ResultCache(ABC):
+    """Key/value store for JSON-serializable generation results.
+
+    Keys are namespaced ("ideas:...", "tripo:...") and hit/miss counters are
+    tracked per namespace so /health can show where the cache pays off.
+    Local backends answer ``_get``/``_set`` in place; a backend behind a
+    network or a shared lock overrides ``_aget``/``_aset`` so callers on the
+    event loop never block on it.
+    """
+
+    backend = "none"
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._counter_lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._aget(key)
+        self._count(key, "hits" if value is not None else "misses")
+        return value
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """Like ``get`` but not counted as a hit or miss (for polling)."""
+        return await self._aget(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._aset(key, value, self.ttl if ttl is None else ttl)
+
+    async def _aget(self, key: str) -> Optional[Any]:
+        return self._get(key)
+
+    async def _aset(self, key: str, value: Any, ttl: float) -> None:
+        self._set(key, value, ttl)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    def _set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    def _count(self, key: str, field: str, n: int = 1) -> None:
+        ns = key.split(":", 1)[0]
+        with self._counter_lock:
+            c = self._counters.setdefault(ns, {"hits": 0, "misses": 0, "evictions": 0})
+            c[field] += n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            namespaces = {k: dict(v) for k, v in self._counters.items()}
+        hits = sum(v["hits"] for v in namespaces.values())
+        misses = sum(v["misses"] for v in namespaces.values())
+        return {
+            "backend": self.backend,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "namespaces": namespaces,
+        }
+
+
+class NullCache(ResultCache):
+    backend = "off"
+
+    def _get(self, key: str) -> Optional[Any]:
+        return None
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryLRUCache(ResultCache):
+    backend = "memory"
+
+    def __init__(self, max_entries: int, ttl: float):
+        super().__init__(max_entries, ttl)
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                self._count(key, "evictions")
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                old_key, _ = self._data.popitem(last=False)
+                self._count(old_key, "evictions")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache(ResultCache):
+    """On-disk cache that survives restarts. Values are stored as JSON text."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed_at)")
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._count(key, "evictions")
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    # The file may be shared by every worker on the host: waits for its write lock happen off the event loop.
+    async def _aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def _aset(self, key: str, value: Any, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute("DELETE FROM results WHERE expires_at < ? RETURNING key", (now,)).fetchall()
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        overflow = count - self.max_entries
+        lru = []
+        if overflow > 0:
+            lru = self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at LIMIT ?) RETURNING key",
+                (overflow,),
+            ).fetchall()
+        for (k,) in expired + lru:
+            self._count(k, "evictions")
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        return count
+
+
+class SharedStoreCache(ResultCache):
+    """Cache in the deployment's shared store (SHARED_STORE_URL), seen by every worker.
+
+    Entries expire by TTL; the size bound is the store's own (Redis maxmemory,
+    or the SQLite store's expiry purge), so ``max_entries`` is not enforced.
+    """
+
+    backend = "shared"
+
+    def __init__(self, store: SharedStore, ttl: float):
+        super().__init__(0, ttl)
+        self.store = store
+
+    def _get(self, key: str) -> Optional[Any]:
+        raw = self.store.get(f"cache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        self.store.set(f"cache:{key}", json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    async def _aget(self, key: str) -> Optional[Any]:
+        raw = await self.store.aget(f"cache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def _aset(self, key: str, value: Any, ttl: float) -> None:
+        await self.store.aset(f"cache:{key}", json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    def __len__(self) -> int:
+        # Not countable cheaply across a shared store.
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "entries": None, "store": self.store.backend}
+
+
+def build_result_cache() -> ResultCache:
+    backend = settings.result_cache_backend
+    if backend == "shared":
+        if shared_store is None:
+            raise RuntimeError("RESULT_CACHE_BACKEND=shared needs SHARED_STORE_URL")
+        return SharedStoreCache(shared_store, settings.result_cache_ttl)
+    if backend == "sqlite":
+        return SQLiteCache(settings.result_cache_path, settings.result_cache_max_entries, settings.result_cache_ttl)
+    if backend == "memory":
+        return MemoryLRUCache(settings.result_cache_max_entries, settings.result_cache_ttl)
+    return NullCache(0, 0)
+
+
+result_cache = build_result_cache()
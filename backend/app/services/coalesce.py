@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Optional, TypeVar
+
+from ..config import settings
+from .shared import WORKER_ID, SharedStore, shared_store
+from .telemetry import metrics
+
+T = TypeVar("T")
+
+FLIGHTS_TOTAL = metrics.counter("diy_singleflight_total", "Coalesced calls by flight and role (leader starts the upstream call)")
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key.
+
+    The first caller (leader) starts ``fn()`` as a task of its own; callers
+    arriving while it runs await the same task. Each caller awaits through
+    ``asyncio.shield`` so a disconnecting client only drops its own wait; the
+    shared task is cancelled only once no caller is left waiting for it.
+
+    With a shared ``store`` the call is also coalesced across workers: the
+    process leader takes a lease on the key, and a worker that finds the
+    lease taken waits for the result to appear through ``lookup`` instead
+    (taking over if the lease is released or expires without one).
+    """
+
+    def __init__(self, name: str, store: Optional[SharedStore] = None, lease: float = 60.0):
+        self.name = name
+        self.store = store
+        self.lease = lease
+        self._inflight: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.remote_followers = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        on_done: Optional[Callable[[], None]] = None,
+        lookup: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+    ) -> T:
+        """Await the shared call for ``key``, starting ``fn()`` if none is in flight.
+
+        ``on_done`` runs when a call this caller started finishes, however it
+        ends (including cancellation before it ever ran). ``lookup`` reads
+        (awaitably) the stored result of ``fn()``; without it the call is coalesced within
+        this process only.
+        """
+        loop = asyncio.get_running_loop()
+        call = self._inflight.get(key)
+        if call is None or call.task.done() or call.task.get_loop() is not loop:
+            work = fn()
+            if self.store is not None and lookup is not None:
+                work = self._across_workers(key, work, lookup)
+            call = _Call(loop.create_task(work, name=f"{self.name}:{key[:48]}"))
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda _t, key=key, call=call: self._forget(key, call))
+            if on_done is not None:
+                call.task.add_done_callback(lambda _t: on_done())
+            self.leaders += 1
+            FLIGHTS_TOTAL.inc(flight=self.name, role="leader")
+        else:
+            self.followers += 1
+            FLIGHTS_TOTAL.inc(flight=self.name, role="follower")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller went away: stop the upstream work and let the next caller start afresh.
+                self._forget(key, call)
+                call.task.cancel()
+
+    async def _across_workers(
+        self, key: str, work: Coroutine[Any, Any, T], lookup: Callable[[], Awaitable[Optional[T]]]
+    ) -> T:
+        lease_key = f"flight:{self.name}:{key}"
+        try:
+            return await self._lead_or_wait(lease_key, work, lookup)
+        finally:
+            # Never started (another worker's result was used, or we were cancelled while waiting).
+            work.close()
+
+    async def _lead_or_wait(
+        self, lease_key: str, work: Coroutine[Any, Any, T], lookup: Callable[[], Awaitable[Optional[T]]]
+    ) -> T:
+        counted = False
+        while True:
+            if await self.store.aset(lease_key, WORKER_ID, ex=self.lease, nx=True):
+                try:
+                    return await work
+                finally:
+                    # Not awaited: a cancelled leader must still release the lease.
+                    self.store.submit(self.store.delete, lease_key)
+            if not counted:
+                counted = True
+                self.remote_followers += 1
+                FLIGHTS_TOTAL.inc(flight=self.name, role="remote_follower")
+            delay = 0.02
+            while True:
+                await asyncio.sleep(delay)
+                delay = min(0.5, delay * 2)
+                value = await lookup()
+                if value is not None:
+                    return value
+                if await self.store.aget(lease_key) is None:
+                    # The other worker gave up (failed, cancelled or died): try to lead.
+                    break
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        if call.task.done() and not call.task.cancelled():
+            call.task.exception()  # retrieved by the waiters; silence "never retrieved" if there were none
+
+    def inflight(self, key: Optional[str] = None) -> int:
+        return len(self._inflight) if key is None else int(key in self._inflight)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "remote_followers": self.remote_followers,
+        }
+
+
+# Workers waiting on another worker's call read its result from the result cache, so that has to be shared too.
+_store = shared_store if settings.result_cache_backend in ("shared", "sqlite") else None
+ideas_flight = SingleFlight("ideas", _store, lease=settings.gemini_retry_deadline + 30)
+model_flight = SingleFlight("tripo", _store, lease=settings.tripo_create_timeout + settings.tripo_poll_timeout + 60)
@@ -1,26 +1,96 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
+import httpx
 from fastapi import HTTPException
 
 from ..config import settings
+from .budget import STANDARD, IdeaPlan, accounted_as, token_usage
+from .gemini_files import ImageInput, gemini_files, is_stale_file
+from .gemini_registry import ResolvedModel, is_model_unavailable, registry
+from .http import build_gemini_client, get_client
+from .json_repair import recover_json, repair_json, validate_ideas
+from .json_stream import IdeaStreamParser
+from .library import idea_library
+from .limiter import Saturated, UpstreamBusy, gemini_limiter, upstream_busy
+from .retry import HedgeBudget, LatencyTracker, RetryPolicy
+from .telemetry import count_sent, metrics, record, span
+from ..models.schemas import DIYIdea
 import json
 import re
 
+# Recent successful generateContent latencies; the hedge delay is taken from them.
+_latency = LatencyTracker()
+_hedge_budget = HedgeBudget(settings.gemini_hedge_budget)
 
-def _format_prompt(description: str) -> str:
+# Output budget ceiling for a packed batch request (per-item budget x items, capped)
+_BATCH_MAX_OUTPUT_TOKENS = 8192
+
+# Bump whenever _format_prompt changes so cached ideas from the old prompt are not served.
+PROMPT_VERSION = "1"
+
+PARSE_TOTAL = metrics.counter("diy_gemini_parse_total", "Gemini responses parsed, by the tier that succeeded")
+BATCH_ITEMS = metrics.counter("diy_gemini_batch_items_total", "Batch items answered, by packed request or per-item fallback")
+RETRIES_TOTAL = metrics.counter("diy_gemini_retries_total", "generateContent retries, by failure reason")
+HEDGES_TOTAL = metrics.counter(
+    "diy_gemini_hedges_total", "Hedged generateContent requests: fired, won (duplicate answered first), skipped"
+)
+IDEAS_DROPPED = metrics.counter("diy_gemini_ideas_dropped_total", "Ideas discarded for failing schema validation")
+
+
+def _prompt_task(plan: IdeaPlan = STANDARD) -> str:
+    # The standard plan must keep producing the exact text PROMPT_VERSION "1" was cached under.
     return (
         "あなたは創造的なDIYアシスタントです。以下の廃材・素材の説明を読み、"
-        "アップサイクルのDIYアイデアを日本語で3案提案してください。各アイデアについて、"
+        f"アップサイクルのDIYアイデアを日本語で{plan.ideas}案提案してください。各アイデアについて、"
         "短い日本語タイトル、1段落の日本語説明、材料（できるだけ提示された素材を再利用）、工具、"
-        "6〜10個の手順を返してください。手順は配列で、各ステップは{text, operation}のオブジェクトです。"
+        f"{plan.min_steps}〜{plan.max_steps}個の手順を返してください。手順は配列で、各ステップは{{text, operation}}のオブジェクトです。"
         "operation は必ず次のいずれか: 『貼り付ける』『のりを塗る』『切る』『色を塗る』『削る』『その他』。"
         "text は小学生でも分かる短い命令文で、材料名・工具名を具体的に書いてください。"
         "難易度（Easy/Medium/Hard）と、およその所要時間（分）も含めてください。"
-        "応答は次の形式のJSONのみを返してください（文章やコードフェンスは禁止）。\n"
-        "{\n  \"ideas\": [\n    {\n      \"title\": string,\n      \"description\": string,\n      \"materials\": string[],\n      \"tools\": string[],\n      \"steps\": [{\n        \"text\": string,\n        \"operation\": \"貼り付ける\" | \"のりを塗る\" | \"切る\" | \"色を塗る\" | \"削る\" | \"その他\"\n      }],\n      \"difficulty\": string,\n      \"estimated_time_minutes\": number\n    }\n  ]\n}\n"
-        f"\n素材の説明: {description}\n"
+    )
+
+
+_PROMPT_TASK = _prompt_task()
+_IDEAS_SHAPE = (
+    "{\n  \"ideas\": [\n    {\n      \"title\": string,\n      \"description\": string,\n      \"materials\": string[],\n      \"tools\": string[],\n      \"steps\": [{\n        \"text\": string,\n        \"operation\": \"貼り付ける\" | \"のりを塗る\" | \"切る\" | \"色を塗る\" | \"削る\" | \"その他\"\n      }],\n      \"difficulty\": string,\n      \"estimated_time_minutes\": number\n    }\n  ]\n}\n"
+)
+
+
+def _format_prompt(description: str, plan: IdeaPlan = STANDARD, with_images: bool = False) -> str:
+    photos = "添付の写真に写っている素材の形・大きさ・状態も踏まえてください。" if with_images else ""
+    return (
+        _prompt_task(plan)
+        + photos
+        + "応答は次の形式のJSONのみを返してください（文章やコードフェンスは禁止）。\n"
+        + _IDEAS_SHAPE
+        + f"\n素材の説明: {description}\n"
+    )
+
+
+# A prompt is its text, or the full list of parts (photos first) for image-aware generation.
+Prompt = Union[str, List[Dict[str, Any]]]
+
+
+def _parts(prompt: Prompt) -> List[Dict[str, Any]]:
+    return [{"text": prompt}] if isinstance(prompt, str) else prompt
+
+
+def _format_batch_prompt(items: List[Tuple[str, str]]) -> str:
+    """One prompt for several descriptions; ``items`` are (key, description) pairs."""
+    listing = "".join(f"{key}: {description}\n" for key, description in items)
+    return (
+        _PROMPT_TASK
+        + "これを次の複数の素材の説明それぞれについて行ってください。"
+        "応答は、各説明のキーを \"results\" のキーとし、その値が次の形式になっているJSONのみを返してください"
+        "（文章やコードフェンスは禁止）。\n"
+        + _IDEAS_SHAPE
+        + "全体の形式: {\"results\": {\"<キー>\": {\"ideas\": [...]}, ...}}\n"
+        + f"\n素材の説明:\n{listing}"
     )
 
 
@@ -76,7 +146,229 @@ def _sanitize_json_like(text: str) -> str:
     return t
 
 
-def _repair_json_with_gemini(raw_text: str, model) -> dict:
+class GeminiAPIError(Exception):
+    """Non-2xx answer from the Gemini REST API; ``code`` is the HTTP status."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+class StaleFileError(Exception):
+    """generateContent rejected a File API URI from the upload cache; upload again and retry."""
+
+
+@asynccontextmanager
+async def _gemini_http(client: Optional[httpx.AsyncClient]) -> AsyncIterator[httpx.AsyncClient]:
+    client = client or get_client("gemini")
+    if client is not None:
+        yield client
+        return
+    async with build_gemini_client() as own:
+        yield own
+
+
+async def _resolved_model() -> ResolvedModel:
+    # Only the very first resolution blocks (list_models); run it off the event loop.
+    if registry.peek() is not None:
+        return registry.get()
+    with span("gemini.resolve"):
+        return await asyncio.to_thread(registry.get)
+
+
+def _response_text(payload: Dict[str, Any]) -> str:
+    parts = []
+    for cand in payload.get("candidates") or []:
+        for part in (cand.get("content") or {}).get("parts") or []:
+            if "text" in part:
+                parts.append(part["text"])
+        if parts:
+            break
+    return "".join(parts)
+
+
+async def _generate_text(
+    http: httpx.AsyncClient,
+    resolved: ResolvedModel,
+    prompt: Prompt,
+    generation_config: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """One generateContent attempt, admitted by the adaptive limiter and bounded by GEMINI_ATTEMPT_TIMEOUT.
+
+    The deadline covers the wait for a slot too and is capped by ``deadline``
+    (an overall ``time.monotonic()`` deadline) when given. A 429 from Gemini
+    becomes a 503 with Retry-After instead of a generic 502.
+    """
+    url = f"{settings.gemini_api_endpoint.rstrip('/')}/v1beta/{resolved.full_name}:generateContent"
+    body = {
+        "contents": [{"role": "user", "parts": _parts(prompt)}],
+        "generationConfig": generation_config or resolved.generation_config,
+    }
+    headers = {"x-goog-api-key": settings.gemini_api_key or ""}
+    attempt_deadline = time.monotonic() + settings.gemini_attempt_timeout
+    deadline = attempt_deadline if deadline is None else min(deadline, attempt_deadline)
+    async with gemini_limiter.slot(deadline) as slot:
+        started = time.monotonic()
+        try:
+            with span("gemini.generate"):
+                resp = await asyncio.wait_for(
+                    http.post(url, json=body, headers=headers), timeout=max(0.0, deadline - time.monotonic())
+                )
+        except asyncio.TimeoutError:
+            slot.overloaded("timeout")
+            raise HTTPException(status_code=504, detail="Gemini request timed out")
+        slot.observe_status(resp.status_code)
+        if resp.status_code < 400:
+            _latency.observe(time.monotonic() - started)
+    count_sent("gemini", "generate", int(resp.request.headers.get("content-length") or 0))
+    if resp.status_code == 429:
+        raise upstream_busy("Gemini", resp.headers.get("retry-after"))
+    if resp.status_code >= 400:
+        raise GeminiAPIError(resp.status_code, resp.text)
+    payload = resp.json()
+    token_usage.observe(payload, time.monotonic() - started)
+    return _response_text(payload)
+
+
+def _retry_reason(exc: BaseException) -> Optional[str]:
+    """Label for a retryable failure, or None when retrying can't help."""
+    if isinstance(exc, Saturated):
+        return None  # shed locally: another attempt would only add load
+    if isinstance(exc, UpstreamBusy):
+        return "429"
+    if isinstance(exc, GeminiAPIError):
+        return "5xx" if exc.code in (500, 502, 503, 504) else None
+    if isinstance(exc, HTTPException):
+        return "timeout" if exc.status_code == 504 else None
+    if isinstance(exc, httpx.TransportError):
+        return "transport"
+    return None
+
+
+def _hedge_delay() -> Optional[float]:
+    if not settings.gemini_hedge or len(_latency) < 20:
+        return None
+    return max(settings.gemini_hedge_min_delay, _latency.quantile(settings.gemini_hedge_quantile) or 0.0)
+
+
+async def _hedged_attempt(
+    http: httpx.AsyncClient, resolved: ResolvedModel, prompt: Prompt, config: Optional[Dict[str, Any]], deadline: float
+) -> str:
+    """One logical attempt: a duplicate request is sent if the first is slower than the hedge delay."""
+    delay = _hedge_delay()
+    if delay is None:
+        return await _generate_text(http, resolved, prompt, config, deadline)
+
+    _hedge_budget.primary()
+    tasks = [asyncio.create_task(_generate_text(http, resolved, prompt, config, deadline))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        while not done:
+            # Only hedge with spare capacity; duplicates must not push the provider into throttling.
+            # Without headroom, look again shortly: the primary may still be stuck in the tail.
+            if gemini_limiter.inflight < int(gemini_limiter.limit):
+                if _hedge_budget.try_spend():
+                    HEDGES_TOTAL.inc(outcome="fired")
+                    tasks.append(asyncio.create_task(_generate_text(http, resolved, prompt, config, deadline)))
+                else:
+                    HEDGES_TOTAL.inc(outcome="skipped")
+                break
+            done, _ = await asyncio.wait(tasks, timeout=delay / 4)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        HEDGES_TOTAL.inc(outcome="won")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _generate_reliably(
+    http: httpx.AsyncClient, resolved: ResolvedModel, prompt: Prompt, generation_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """generateContent with retries on transient failures (backoff + jitter, GEMINI_RETRY_DEADLINE) and hedging."""
+    policy = RetryPolicy(
+        attempts=settings.gemini_retry_attempts,
+        base_delay=settings.gemini_retry_base_delay,
+        max_delay=settings.gemini_retry_max_delay,
+        deadline=settings.gemini_retry_deadline,
+    )
+    deadline = time.monotonic() + policy.deadline
+    retry = 0
+    while True:
+        try:
+            return await _hedged_attempt(http, resolved, prompt, generation_config, deadline)
+        except Exception as e:
+            reason = _retry_reason(e)
+            retry += 1
+            if reason is None or retry >= policy.attempts:
+                raise
+            delay = policy.delay(retry, getattr(e, "retry_after", None))
+            # Don't start an attempt that can't plausibly finish before the overall deadline.
+            if time.monotonic() + delay + (_latency.quantile(0.5) or 1.0) > deadline:
+                raise
+            RETRIES_TOTAL.inc(reason=reason)
+            await asyncio.sleep(delay)
+
+
+def _plan_config(resolved: ResolvedModel, plan: IdeaPlan) -> Dict[str, Any]:
+    """The model's generation config with this plan's output limit (and idea/step counts in the schema)."""
+    config = dict(resolved.generation_config)
+    config["maxOutputTokens"] = token_usage.output_limit(plan)
+    schema = config.get("responseSchema")
+    if schema is not None and plan is not STANDARD:
+        ideas = dict(schema["properties"]["ideas"], minItems=plan.ideas, maxItems=plan.ideas)
+        item = dict(ideas["items"])
+        item["properties"] = dict(
+            item["properties"],
+            steps=dict(item["properties"]["steps"], minItems=plan.min_steps, maxItems=plan.max_steps),
+        )
+        ideas["items"] = item
+        config["responseSchema"] = dict(schema, properties=dict(schema["properties"], ideas=ideas))
+    return config
+
+
+async def _generate_with_fallbacks(
+    http: httpx.AsyncClient, prompt: Prompt, plan: IdeaPlan = STANDARD
+) -> tuple[str, ResolvedModel]:
+    resolved = await _resolved_model()
+    try:
+        return await _generate_reliably(http, resolved, prompt, _plan_config(resolved, plan)), resolved
+    except GeminiAPIError as e:
+        if e.code == 400 and "responseSchema" in resolved.generation_config and "schema" in str(e).lower():
+            # The model rejected the schema; drop it for this entry and retry once.
+            resolved.generation_config.pop("responseSchema", None)
+        elif not isinstance(prompt, str) and is_stale_file(e):
+            # Before the model check: an expired or deleted file is a 404 "not found" too.
+            raise StaleFileError(str(e))
+        elif is_model_unavailable(e):
+            # The cached model went away (renamed/retired); re-resolve once and retry.
+            registry.invalidate()
+            resolved = await _resolved_model()
+        else:
+            raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:  # pragma: no cover - network path
+        raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+    try:
+        return await _generate_reliably(http, resolved, prompt, _plan_config(resolved, plan)), resolved
+    except HTTPException:
+        raise
+    except Exception as e:  # pragma: no cover - network path
+        raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+
+
+async def _repair_json_with_gemini(raw_text: str, http: httpx.AsyncClient, resolved: ResolvedModel) -> dict:
     """Ask Gemini to fix to strict JSON per schema if initial parse failed."""
     instruction = (
         "以下のテキストは本来JSONであるべきですが、形式が崩れています。"
@@ -85,227 +377,364 @@ def _repair_json_with_gemini(raw_text: str, model) -> dict:
         "元テキスト:\n" + raw_text
     )
     try:
-        fixed = model.generate_content(instruction)
-        text = getattr(fixed, "text", None) or ""
+        with accounted_as("repair"):
+            text = await _generate_reliably(http, resolved, instruction)
         text = _sanitize_json_like(text)
         return _extract_json(text)
     except Exception as e:
         raise e
 
 
+def _mock_ideas() -> dict:
+    return {
+        "ideas": [
+            {
+                "title": "Planter from Plastic Bottle",
+                "description": "Turn a discarded plastic bottle into a small herb planter.",
+                "materials": ["1.5L plastic bottle", "potting soil", "herb seeds"],
+                "tools": ["scissors", "marker", "sandpaper"],
+                "steps": [
+                    {"text": "ボトルの側面に窓の形をマーカーで描く", "operation": "その他"},
+                    {"text": "描いた線に沿ってはさみで切る", "operation": "切る"},
+                    {"text": "切り口を紙やすりでなめらかにする", "operation": "削る"},
+                    {"text": "底に水抜き穴を数カ所あける", "operation": "その他"},
+                    {"text": "土を入れて種をまく", "operation": "その他"},
+                ],
+                "difficulty": "Easy",
+                "estimated_time_minutes": 30,
+            },
+            {
+                "title": "Cardboard Desk Organizer",
+                "description": "Upcycle sturdy cardboard into a multi-slot desk organizer.",
+                "materials": ["corrugated cardboard", "glue", "decorative paper"],
+                "tools": ["box cutter", "ruler", "cutting mat"],
+                "steps": [
+                    {"text": "ベースと仕切りを定規で測ってカッターで切る", "operation": "切る"},
+                    {"text": "仕切りを土台にのりで貼り付ける", "operation": "貼り付ける"},
+                    {"text": "上部にペン用の小さな仕切りを追加する", "operation": "その他"},
+                    {"text": "外側をデコ紙で包んでのりを塗る", "operation": "のりを塗る"},
+                    {"text": "乾かして完成", "operation": "その他"},
+                ],
+                "difficulty": "Medium",
+                "estimated_time_minutes": 45,
+            },
+            {
+                "title": "Tin Can Lantern",
+                "description": "Repurpose a tin can into a pierced pattern lantern.",
+                "materials": ["clean tin can", "tea light candle"],
+                "tools": ["hammer", "nail", "marker"],
+                "steps": [
+                    {"text": "缶に水を入れて凍らせ、側面を固くする", "operation": "その他"},
+                    {"text": "点の模様をマーカーで描く", "operation": "その他"},
+                    {"text": "釘とハンマーで点を穴あけする", "operation": "切る"},
+                    {"text": "氷を溶かして缶を乾かす", "operation": "その他"},
+                    {"text": "中にキャンドルを入れて光らせる", "operation": "その他"},
+                ],
+                "difficulty": "Easy",
+                "estimated_time_minutes": 40,
+            },
+        ]
+    }
+
+
+def _offline_ideas(description: str) -> dict:
+    """Mock mode: the closest idea library entry, or the built-in sample when nothing is close."""
+    found = idea_library.nearest(description) if settings.idea_library else None
+    return found if found is not None else _mock_ideas()
+
+
 def generate_diy_ideas(description: str) -> dict:
     """
     Generate multiple DIY ideas with steps using Gemini.
 
+    Blocking wrapper around generate_diy_ideas_async for scripts and other
+    callers without an event loop. It runs its own loop with asyncio.run, so
+    it must not be called from a running event loop (that raises
+    RuntimeError); async code awaits generate_diy_ideas_async instead.
+
     Returns a dict compatible with models.schemas.GenerateResponse.ideas
     """
+    return asyncio.run(generate_diy_ideas_async(description))
+
+
+async def generate_diy_ideas_async(
+    description: str,
+    client: Optional[httpx.AsyncClient] = None,
+    plan: IdeaPlan = STANDARD,
+    images: Sequence[ImageInput] = (),
+) -> dict:
+    """
+    Generate multiple DIY ideas with steps using the Gemini REST API.
+
+    Uses the shared pooled client unless ``client`` is given. ``plan`` sets
+    the number of ideas and steps asked for; the output limit comes from the
+    token accounting for that plan. With ``images`` Gemini also sees the
+    photos; each is uploaded once (gemini_files) and referenced by every
+    attempt, while the JSON repair call stays text-only. Returns a dict
+    compatible with models.schemas.GenerateResponse.ideas
+    """
     if settings.mock_gemini:
-        return {
-            "ideas": [
-                {
-                    "title": "Planter from Plastic Bottle",
-                    "description": "Turn a discarded plastic bottle into a small herb planter.",
-                    "materials": ["1.5L plastic bottle", "potting soil", "herb seeds"],
-                    "tools": ["scissors", "marker", "sandpaper"],
-                    "steps": [
-                        {"text": "ボトルの側面に窓の形をマーカーで描く", "operation": "その他"},
-                        {"text": "描いた線に沿ってはさみで切る", "operation": "切る"},
-                        {"text": "切り口を紙やすりでなめらかにする", "operation": "削る"},
-                        {"text": "底に水抜き穴を数カ所あける", "operation": "その他"},
-                        {"text": "土を入れて種をまく", "operation": "その他"},
-                    ],
-                    "difficulty": "Easy",
-                    "estimated_time_minutes": 30,
-                },
-                {
-                    "title": "Cardboard Desk Organizer",
-                    "description": "Upcycle sturdy cardboard into a multi-slot desk organizer.",
-                    "materials": ["corrugated cardboard", "glue", "decorative paper"],
-                    "tools": ["box cutter", "ruler", "cutting mat"],
-                    "steps": [
-                        {"text": "ベースと仕切りを定規で測ってカッターで切る", "operation": "切る"},
-                        {"text": "仕切りを土台にのりで貼り付ける", "operation": "貼り付ける"},
-                        {"text": "上部にペン用の小さな仕切りを追加する", "operation": "その他"},
-                        {"text": "外側をデコ紙で包んでのりを塗る", "operation": "のりを塗る"},
-                        {"text": "乾かして完成", "operation": "その他"},
-                    ],
-                    "difficulty": "Medium",
-                    "estimated_time_minutes": 45,
-                },
-                {
-                    "title": "Tin Can Lantern",
-                    "description": "Repurpose a tin can into a pierced pattern lantern.",
-                    "materials": ["clean tin can", "tea light candle"],
-                    "tools": ["hammer", "nail", "marker"],
-                    "steps": [
-                        {"text": "缶に水を入れて凍らせ、側面を固くする", "operation": "その他"},
-                        {"text": "点の模様をマーカーで描く", "operation": "その他"},
-                        {"text": "釘とハンマーで点を穴あけする", "operation": "切る"},
-                        {"text": "氷を溶かして缶を乾かす", "operation": "その他"},
-                        {"text": "中にキャンドルを入れて光らせる", "operation": "その他"},
-                    ],
-                    "difficulty": "Easy",
-                    "estimated_time_minutes": 40,
-                },
-            ]
-        }
+        return plan.trim(_offline_ideas(description))
 
     if not settings.gemini_api_key:
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
 
-    try:
-        import google.generativeai as genai
-    except Exception as e:  # pragma: no cover
-        raise HTTPException(status_code=500, detail=f"Gemini SDK not available: {e}")
-
-    genai.configure(api_key=settings.gemini_api_key)
-
-    def _normalize(name: str) -> str:
-        return name.replace("models/", "") if name else name
-
-    preferred_norm = _normalize(settings.gemini_model or "")
-    # Favor 2.x family first, then 1.5/1.x as fallbacks.
-    fallback_candidates_norm = [
-        preferred_norm,
-        # 2.5 family (names may vary by account/region; list_models will filter)
-        "gemini-2.5-pro",
-        "gemini-2.5-flash",
-        "gemini-2.5-pro-latest",
-        "gemini-2.5-flash-latest",
-        # 2.0 family
-        "gemini-2.0-pro",
-        "gemini-2.0-flash",
-        "gemini-2.0-pro-exp",
-        "gemini-2.0-flash-exp",
-    ]
-
-    chosen_full_name = None  # e.g., "models/gemini-1.5-flash-latest"
-    try:
-        available = list(genai.list_models())
-        available_map = {}  # normalized -> full name
-        for m in available:
+    text = _format_prompt(description, plan, with_images=bool(images))
+    async with _gemini_http(client) as http:
+        for attempt in range(2):
+            prompt: Prompt = text
+            if images:
+                with span("gemini.files"):
+                    prompt = [*await asyncio.gather(*(gemini_files.part(http, img) for img in images)), {"text": text}]
             try:
-                methods = set(getattr(m, "supported_generation_methods", []) or [])
-                if "generateContent" in methods:
-                    full = getattr(m, "name", "")
-                    n = _normalize(full)
-                    if n and full:
-                        available_map[n] = full
-            except Exception:
-                continue
-        for cand in fallback_candidates_norm:
-            if cand and cand in available_map:
-                chosen_full_name = available_map[cand]
-                break
-        # If none matched, pick the first available model supporting generateContent
-        if not chosen_full_name and available_map:
-            chosen_full_name = next(iter(available_map.values()))
-    except Exception:
-        # If listing fails, just take the first non-empty candidate string
-        for cand in fallback_candidates_norm:
-            if cand:
-                chosen_full_name = cand  # SDK accepts both with or without "models/"
+                with accounted_as(plan.name):
+                    data, resolved = await _generate_with_fallbacks(http, prompt, plan)
                 break
+            except StaleFileError as e:
+                if attempt:
+                    raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+                await gemini_files.forget(img.digest for img in images)
+        return await _parse_ideas(data, http, resolved)
 
-    if not chosen_full_name:
-        chosen_full_name = "gemini-1.5-flash-latest"
 
-    gen_cfg = {
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "top_k": 32,
-        "max_output_tokens": 1536,
-        "response_mime_type": "application/json",
-    }
+async def _generate_pack(http: httpx.AsyncClient, items: List[Tuple[int, str]]) -> Dict[int, dict]:
+    """Answer several descriptions with one generateContent call.
 
-    # Some SDK versions or models might not accept response_schema; make it opt-in.
-    if settings.gemini_use_schema:
-        gen_cfg["response_schema"] = {
-            "type": "object",
-            "properties": {
-                "ideas": {
-                    "type": "array",
-                    "minItems": 3,
-                    "maxItems": 3,
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "title": {"type": "string"},
-                            "description": {"type": "string"},
-                            "materials": {"type": "array", "items": {"type": "string"}},
-                            "tools": {"type": "array", "items": {"type": "string"}},
-                            "steps": {"type": "array", "minItems": 6, "maxItems": 10, "items": {"type": "string"}},
-                            "difficulty": {"type": "string"},
-                            "estimated_time_minutes": {"type": "integer"},
-                        },
-                        "required": [
-                            "title",
-                            "description",
-                            "materials",
-                            "tools",
-                            "steps",
-                            "difficulty",
-                            "estimated_time_minutes",
-                        ],
-                    },
-                }
-            },
-            "required": ["ideas"],
-        }
-
-    # Create model, but gracefully fall back if response_schema isn't supported
-    try:
-        model = genai.GenerativeModel(
-            model_name=chosen_full_name,
-            generation_config=gen_cfg,
-        )
-    except Exception as e:
-        # Some SDK versions raise on unknown schema fields (e.g., additionalProperties)
-        # Remove schema and retry to avoid hard failure.
-        if settings.gemini_use_schema and "Schema" in str(e):
+    Returns validated ideas by item index; items missing from (or invalid in)
+    the answer are simply absent so the caller can retry them one by one.
+    """
+    keyed = [(f"item_{n + 1}", index, description) for n, (index, description) in enumerate(items)]
+    resolved = await _resolved_model()
+    # The single-answer responseSchema doesn't fit the keyed batch shape; scale the output budget instead.
+    config = {k: v for k, v in resolved.generation_config.items() if k != "responseSchema"}
+    config["maxOutputTokens"] = min(token_usage.output_limit(STANDARD) * len(items), _BATCH_MAX_OUTPUT_TOKENS)
+    prompt = _format_batch_prompt([(key, description) for key, _, description in keyed])
+    with span("gemini.batch"), accounted_as("batch"):
+        text = await _generate_text(http, resolved, prompt, config)
+
+    with span("gemini.parse"):
+        parsed: Any = None
+        for attempt in (lambda: _extract_json(text), lambda: recover_json(text)):
             try:
-                gen_cfg.pop("response_schema", None)
-                model = genai.GenerativeModel(
-                    model_name=chosen_full_name,
-                    generation_config=gen_cfg,
-                )
+                parsed = attempt()
+                break
             except Exception:
-                raise HTTPException(status_code=500, detail=f"Gemini model init failed: {e}")
-        else:
-            raise HTTPException(status_code=500, detail=f"Gemini model init failed: {e}")
+                continue
+        if not isinstance(parsed, dict):
+            return {}
+        by_key = parsed.get("results") if isinstance(parsed.get("results"), dict) else parsed
+        out: Dict[int, dict] = {}
+        for key, index, _ in keyed:
+            ideas, dropped = validate_ideas(by_key.get(key))
+            if dropped:
+                IDEAS_DROPPED.inc(dropped)
+            if ideas is not None:
+                out[index] = _degraded(ideas, "partial") if dropped else ideas
+    return out
+
+
+async def generate_diy_ideas_batch(
+    descriptions: List[str], client: Optional[httpx.AsyncClient] = None
+) -> List[Union[dict, Exception]]:
+    """
+    Generate ideas for several descriptions, amortizing the prompt preamble.
 
-    prompt = _format_prompt(description)
-    try:
-        response = model.generate_content(prompt)
-    except Exception as e:  # pragma: no cover - network path
-        raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+    Descriptions are packed GEMINI_BATCH_PACK_SIZE at a time into one keyed
+    request; any item the packed answer doesn't cover (failed call, truncated
+    or malformed output) is retried on its own, GEMINI_BATCH_FANOUT at a time.
+    Returns one entry per description, in order: the ideas dict or the
+    exception that item failed with.
+    """
+    if settings.mock_gemini:
+        return [_offline_ideas(d) for d in descriptions]
 
-    # Prefer the SDK's text property; some SDK versions also expose .candidates JSON directly.
-    data = getattr(response, "text", None) or ""
-    # First attempt: direct parse with light extraction
-    try:
-        parsed = _extract_json(data)
-        if "ideas" not in parsed or not isinstance(parsed["ideas"], list):
-            raise ValueError("Missing 'ideas' list in Gemini response")
-        return parsed
-    except Exception:
-        pass
+    if not settings.gemini_api_key:
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
 
-    # Second attempt: sanitize common issues (trailing commas, smart quotes)
+    results: List[Union[dict, Exception, None]] = [None] * len(descriptions)
+    fanout = asyncio.Semaphore(max(1, settings.gemini_batch_fanout))
+    size = max(1, settings.gemini_batch_pack_size)
+
+    async with _gemini_http(client) as http:
+
+        async def single(index: int) -> None:
+            async with fanout:
+                try:
+                    results[index] = await generate_diy_ideas_async(descriptions[index], client=http)
+                except Exception as e:
+                    results[index] = e
+            BATCH_ITEMS.inc(path="single")
+
+        async def pack(indices: List[int]) -> None:
+            answered: Dict[int, dict] = {}
+            if len(indices) > 1:
+                try:
+                    answered = await _generate_pack(http, [(i, descriptions[i]) for i in indices])
+                except Exception:
+                    answered = {}
+            for i, ideas in answered.items():
+                results[i] = ideas
+                BATCH_ITEMS.inc(path="packed")
+            await asyncio.gather(*(single(i) for i in indices if i not in answered))
+
+        indices = list(range(len(descriptions)))
+        await asyncio.gather(*(pack(indices[k : k + size]) for k in range(0, len(indices), size)))
+    return results
+
+
+async def _stream_text(
+    http: httpx.AsyncClient,
+    resolved: ResolvedModel,
+    prompt: Prompt,
+    generation_config: Optional[Dict[str, Any]] = None,
+    label: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Text chunks from streamGenerateContent (SSE), under the same limiter and attempt deadline.
+
+    ``label`` is what the token usage is accounted under; a generator runs in
+    its consumer's context, so it can't come from accounted_as().
+    """
+    url = f"{settings.gemini_api_endpoint.rstrip('/')}/v1beta/{resolved.full_name}:streamGenerateContent"
+    body = {
+        "contents": [{"role": "user", "parts": _parts(prompt)}],
+        "generationConfig": generation_config or resolved.generation_config,
+    }
+    headers = {"x-goog-api-key": settings.gemini_api_key or ""}
+    deadline = time.monotonic() + settings.gemini_attempt_timeout
+    started = time.perf_counter()
     try:
-        sanitized = _sanitize_json_like(data)
-        parsed = _extract_json(sanitized)
-        if "ideas" not in parsed or not isinstance(parsed["ideas"], list):
-            raise ValueError("Missing 'ideas' list in Gemini response")
-        return parsed
-    except Exception:
-        pass
+        async with gemini_limiter.slot(deadline) as slot:
+            async with http.stream("POST", url, params={"alt": "sse"}, json=body, headers=headers) as resp:
+                slot.observe_status(resp.status_code)
+                count_sent("gemini", "generate", int(resp.request.headers.get("content-length") or 0))
+                if resp.status_code == 429:
+                    raise upstream_busy("Gemini", resp.headers.get("retry-after"))
+                if resp.status_code >= 400:
+                    raise GeminiAPIError(resp.status_code, (await resp.aread()).decode("utf-8", "replace"))
+                lines = resp.aiter_lines()
+                last: Dict[str, Any] = {}
+                while True:
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), timeout=max(0.0, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        # The final chunk carries the token totals and the finish reason.
+                        token_usage.observe(last, time.perf_counter() - started, label)
+                        return
+                    except asyncio.TimeoutError:
+                        slot.overloaded("timeout")
+                        raise HTTPException(status_code=504, detail="Gemini request timed out")
+                    if not line.startswith("data:"):
+                        continue
+                    last = json.loads(line[5:])
+                    text = _response_text(last)
+                    if text:
+                        yield text
+    finally:
+        record("gemini.stream", time.perf_counter() - started)
+
+
+async def stream_diy_ideas(
+    description: str, client: Optional[httpx.AsyncClient] = None, plan: IdeaPlan = STANDARD
+) -> AsyncIterator[DIYIdea]:
+    """
+    Yield each DIY idea as soon as Gemini has finished writing it.
+
+    Uses streamGenerateContent and IdeaStreamParser to cut completed elements
+    out of the ``ideas`` array mid-stream. If the stream yields no usable idea
+    (malformed JSON), falls back to the regular parse/repair path on the full text.
+    """
+    if settings.mock_gemini:
+        for idea in plan.trim(_offline_ideas(description))["ideas"]:
+            yield DIYIdea(**idea)
+        return
+
+    if not settings.gemini_api_key:
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
+
+    prompt = _format_prompt(description, plan)
+    parser = IdeaStreamParser(sanitize=repair_json)
+    emitted = 0
+    async with _gemini_http(client) as http:
+        resolved = await _resolved_model()
+        try:
+            async for chunk in _stream_text(http, resolved, prompt, _plan_config(resolved, plan), plan.name):
+                for item in parser.feed(chunk):
+                    try:
+                        idea = DIYIdea(**item)
+                    except Exception:
+                        continue
+                    emitted += 1
+                    yield idea
+        except GeminiAPIError as e:
+            if emitted or not is_model_unavailable(e):
+                raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+            # Nothing sent yet: re-resolve the model and answer through the non-streaming path.
+            registry.invalidate()
+            result = await generate_diy_ideas_async(description, client=http, plan=plan)
+            for idea in result.get("ideas", []):
+                yield DIYIdea(**idea)
+            return
+        except HTTPException:
+            raise
+        except Exception as e:  # pragma: no cover - network path
+            raise HTTPException(status_code=502, detail=f"Gemini request failed: {e}")
+
+        if emitted == 0:
+            result = await _parse_ideas(parser.text, http, resolved)
+            for idea in result.get("ideas", []):
+                yield DIYIdea(**idea)
+
+
+def _parse_ideas_locally(data: str) -> Tuple[Optional[str], Optional[dict]]:
+    """Parse and validate ideas without another model call: (tier, ideas) or (None, None).
+
+    Tiers, cheapest first: strict JSON, fenced/wrapped JSON, the legacy
+    sanitizer, then the tolerant local repair engine (truncation, unbalanced
+    brackets, unescaped quotes, prose). Each candidate is checked against the
+    precompiled DIYIdea validators; ideas that fail are dropped individually.
+    A recovered or partly dropped answer comes back marked ``degraded``.
+    """
+    for tier, attempt in (
+        ("direct", lambda: json.loads(data)),
+        ("direct", lambda: _extract_json(data)),
+        ("sanitized", lambda: _extract_json(_sanitize_json_like(data))),
+        ("recovered", lambda: recover_json(data)),
+    ):
+        try:
+            parsed = attempt()
+        except Exception:
+            continue
+        ideas, dropped = validate_ideas(parsed)
+        if dropped:
+            IDEAS_DROPPED.inc(dropped)
+        if ideas is not None:
+            if tier == "recovered" or dropped:
+                ideas = _degraded(ideas, "recovered" if tier == "recovered" else "partial")
+            return tier, ideas
+    return None, None
+
+
+def _degraded(ideas: dict, reason: str) -> dict:
+    """Mark an answer rebuilt from broken or truncated output: good enough to serve, not to cache."""
+    return {**ideas, "degraded": reason}
+
+
+async def _parse_ideas(data: str, http: httpx.AsyncClient, resolved: ResolvedModel) -> dict:
+    with span("gemini.parse"):
+        tier, ideas = _parse_ideas_locally(data)
+    if ideas is not None:
+        PARSE_TOTAL.inc(tier=tier)
+        return ideas
 
     # Final attempt: ask Gemini to strictly reformat to JSON
     try:
-        repaired = _repair_json_with_gemini(data, model)
-        if "ideas" not in repaired or not isinstance(repaired["ideas"], list):
+        with span("gemini.repair"):
+            repaired = await _repair_json_with_gemini(data, http, resolved)
+        ideas, dropped = validate_ideas(repaired)
+        if ideas is None:
             raise ValueError("Missing 'ideas' list in repaired JSON")
-        return repaired
+        PARSE_TOTAL.inc(tier="repair")
+        return _degraded(ideas, "partial") if dropped else ideas
     except Exception as e:
+        PARSE_TOTAL.inc(tier="failed")
         raise HTTPException(status_code=502, detail=f"Failed to parse Gemini JSON: {e}")
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from ..config import settings
+from .shared import SharedStore, shared_store
+from .telemetry import count_sent, metrics, span
+
+# Photos for image-aware idea generation. With the "files" transport each
+# image is uploaded once through the Gemini File API and generateContent
+# refers to it by URI, so retries, hedged duplicates and the same photo in a
+# later request don't send the bytes again. URIs are kept by content digest
+# (in the shared store too, when there is one, so every worker reuses them).
+
+UPLOADS_TOTAL = metrics.counter("diy_gemini_file_uploads_total", "Photos for Gemini, by outcome: uploaded, reused, inline")
+
+
+@dataclass(frozen=True)
+class ImageInput:
+    """One preprocessed photo for Gemini; ``digest`` is the hex SHA-256 of ``data``."""
+
+    digest: str
+    mime_type: str
+    data: bytes
+
+
+class GeminiFiles:
+    """File API URIs by image digest, uploading each image at most once while its URI is valid."""
+
+    # Local entries kept; the oldest are dropped past this (they may still be found in the shared store).
+    MAX_ENTRIES = 4096
+
+    def __init__(self, ttl: float, store: Optional[SharedStore] = None):
+        self.ttl = ttl
+        self.store = store
+        self._uris: Dict[str, Tuple[str, float]] = {}  # digest -> (uri, expires_at)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.uploaded = 0
+        self.reused = 0
+        self.bytes_uploaded = 0
+
+    async def part(self, http: httpx.AsyncClient, image: ImageInput) -> Dict[str, Any]:
+        """The generateContent part for ``image``: a file reference, or inline data with the inline transport."""
+        if settings.gemini_image_transport == "inline":
+            UPLOADS_TOTAL.inc(outcome="inline")
+            return {"inlineData": {"mimeType": image.mime_type, "data": base64.b64encode(image.data).decode("ascii")}}
+        uri = await self._lookup(image.digest)
+        if uri is not None:
+            self.reused += 1
+            UPLOADS_TOTAL.inc(outcome="reused")
+        else:
+            pending = self._pending.get(image.digest)
+            if pending is None:
+                pending = self._pending[image.digest] = asyncio.ensure_future(self._upload(http, image))
+                pending.add_done_callback(lambda _: self._pending.pop(image.digest, None))
+            uri = await asyncio.shield(pending)
+        return {"fileData": {"mimeType": image.mime_type, "fileUri": uri}}
+
+    async def forget(self, digests: Iterable[str]) -> None:
+        """Drop URIs Gemini no longer accepts (deleted or expired early); the next call uploads again."""
+        for digest in digests:
+            self._uris.pop(digest, None)
+            if self.store is not None:
+                await self.store.adelete(f"gemini-file:{digest}")
+
+    async def _lookup(self, digest: str) -> Optional[str]:
+        now = time.time()
+        local = self._uris.get(digest)
+        if local is not None and local[1] > now:
+            return local[0]
+        if self.store is None:
+            return None
+        raw = await self.store.aget(f"gemini-file:{digest}")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self._remember(digest, entry["uri"], entry["expires_at"])
+        return entry["uri"]
+
+    def _remember(self, digest: str, uri: str, expires_at: float) -> None:
+        self._uris.pop(digest, None)
+        self._uris[digest] = (uri, expires_at)
+        while len(self._uris) > self.MAX_ENTRIES:
+            del self._uris[next(iter(self._uris))]
+
+    async def _upload(self, http: httpx.AsyncClient, image: ImageInput) -> str:
+        # Resumable protocol in one round trip each: start (metadata) then upload+finalize (bytes).
+        base = settings.gemini_api_endpoint.rstrip("/")
+        headers = {"x-goog-api-key": settings.gemini_api_key or ""}
+        try:
+            with span("gemini.upload"):
+                start = await asyncio.wait_for(
+                    http.post(
+                        f"{base}/upload/v1beta/files",
+                        json={"file": {"display_name": image.digest[:16]}},
+                        headers={
+                            **headers,
+                            "X-Goog-Upload-Protocol": "resumable",
+                            "X-Goog-Upload-Command": "start",
+                            "X-Goog-Upload-Header-Content-Length": str(len(image.data)),
+                            "X-Goog-Upload-Header-Content-Type": image.mime_type,
+                        },
+                    ),
+                    timeout=settings.gemini_attempt_timeout,
+                )
+                upload_url = start.headers.get("x-goog-upload-url")
+                if start.status_code >= 400 or not upload_url:
+                    detail = f"Gemini file upload failed: {start.status_code} {start.text}"
+                    raise HTTPException(status_code=502, detail=detail)
+                resp = await asyncio.wait_for(
+                    http.post(
+                        upload_url,
+                        content=image.data,
+                        headers={**headers, "X-Goog-Upload-Offset": "0", "X-Goog-Upload-Command": "upload, finalize"},
+                    ),
+                    timeout=settings.gemini_attempt_timeout,
+                )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Gemini file upload timed out")
+        except httpx.TransportError as e:
+            raise HTTPException(status_code=502, detail=f"Gemini file upload failed: {e}")
+        count_sent("gemini", "upload", len(image.data))
+        if resp.status_code >= 400:
+            raise HTTPException(status_code=502, detail=f"Gemini file upload failed: {resp.status_code} {resp.text}")
+        uri = (resp.json().get("file") or {}).get("uri")
+        if not uri:
+            raise HTTPException(status_code=502, detail="Gemini file upload returned no URI")
+        self.uploaded += 1
+        self.bytes_uploaded += len(image.data)
+        UPLOADS_TOTAL.inc(outcome="uploaded")
+        expires_at = time.time() + self.ttl
+        self._remember(image.digest, uri, expires_at)
+        if self.store is not None:
+            entry = json.dumps({"uri": uri, "expires_at": expires_at})
+            await self.store.aset(f"gemini-file:{image.digest}", entry, self.ttl)
+        return uri
+
+    def stats(self) -> dict:
+        return {
+            "transport": settings.gemini_image_transport,
+            "cached": len(self._uris),
+            "uploaded": self.uploaded,
+            "reused": self.reused,
+            "bytes_uploaded": self.bytes_uploaded,
+        }
+
+
+def is_stale_file(e: Exception) -> bool:
+    """A generateContent rejection caused by a file URI that no longer exists or isn't ours."""
+    code = getattr(e, "code", None)
+    return code in (400, 403, 404) and "file" in str(e).lower()
+
+
+gemini_files = GeminiFiles(settings.gemini_file_ttl, shared_store)
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from ..config import settings
+
+
+DEFAULT_API_ENDPOINT = "https://generativelanguage.googleapis.com"
+
+
+def _normalize(name: str) -> str:
+    return name.replace("models/", "") if name else name
+
+
+@dataclass
+class ResolvedModel:
+    """Result of one model resolution (list_models + fallback walk)."""
+
+    full_name: str  # always "models/..."
+    generation_config: Dict[str, Any]  # REST (camelCase) generationConfig
+    listing: List[Dict[str, Any]] = field(default_factory=list)
+    listing_error: Optional[str] = None
+    resolved_at: float = field(default_factory=time.monotonic)
+    resolve_seconds: float = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.resolved_at
+
+
+def _base_generation_config() -> Dict[str, Any]:
+    gen_cfg: Dict[str, Any] = {
+        "temperature": 0.7,
+        "topP": 0.9,
+        "topK": 32,
+        "maxOutputTokens": 1536,
+        "responseMimeType": "application/json",
+    }
+
+    # Some models might not accept responseSchema; make it opt-in.
+    if settings.gemini_use_schema:
+        gen_cfg["responseSchema"] = _rest_schema({
+            "type": "object",
+            "properties": {
+                "ideas": {
+                    "type": "array",
+                    "minItems": 3,
+                    "maxItems": 3,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string"},
+                            "description": {"type": "string"},
+                            "materials": {"type": "array", "items": {"type": "string"}},
+                            "tools": {"type": "array", "items": {"type": "string"}},
+                            "steps": {"type": "array", "minItems": 6, "maxItems": 10, "items": {"type": "string"}},
+                            "difficulty": {"type": "string"},
+                            "estimated_time_minutes": {"type": "integer"},
+                        },
+                        "required": [
+                            "title",
+                            "description",
+                            "materials",
+                            "tools",
+                            "steps",
+                            "difficulty",
+                            "estimated_time_minutes",
+                        ],
+                    },
+                }
+            },
+            "required": ["ideas"],
+        })
+    return gen_cfg
+
+
+def _rest_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The REST API expects OpenAPI type enums in upper case ("OBJECT", "STRING", ...)."""
+    out: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key == "type":
+            out[key] = str(value).upper()
+        elif key == "properties":
+            out[key] = {k: _rest_schema(v) for k, v in value.items()}
+        elif key == "items":
+            out[key] = _rest_schema(value)
+        else:
+            out[key] = value
+    return out
+
+
+def is_model_unavailable(exc: Exception) -> bool:
+    """Whether a generate_content error means the chosen model is gone (renamed, retired, not enabled)."""
+    code = getattr(exc, "code", None)
+    if code == 404 or type(exc).__name__ == "NotFound":
+        return True
+    msg = str(exc).lower()
+    return "not found" in msg or "is not supported for generatecontent" in msg
+
+
+class ModelRegistry:
+    """Process-wide cache of the chosen Gemini model.
+
+    Resolution (``genai.list_models()`` + walking the fallback candidates)
+    happens once, on startup or first use.
+    The result is kept for ``GEMINI_MODEL_TTL`` seconds; after that, callers keep
+    getting the cached entry while a background thread re-resolves it. A
+    fallback picked because the listing failed only lasts ``error_ttl``
+    seconds, so one transient error doesn't pin it for the whole TTL.
+    """
+
+    def __init__(self, ttl: float, error_ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.error_ttl = min(ttl, error_ttl) if error_ttl is not None else ttl
+        self._entry: Optional[ResolvedModel] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._configured = False
+
+    def get(self) -> ResolvedModel:
+        entry = self._entry
+        if entry is None:
+            with self._lock:
+                if self._entry is None:
+                    self._entry = self._resolve()
+                return self._entry
+        if entry.age > (self.error_ttl if entry.listing_error else self.ttl):
+            self._refresh_in_background()
+        return entry
+
+    def peek(self) -> Optional[ResolvedModel]:
+        return self._entry
+
+    def refresh(self) -> ResolvedModel:
+        """Re-resolve synchronously and replace the cached entry."""
+        entry = self._resolve()
+        with self._lock:
+            current = self._entry
+            if entry.listing_error and current is not None and not current.listing_error:
+                # Listing failed: keep the model we know exists, and try the listing again after error_ttl.
+                current.resolved_at = time.monotonic() - self.ttl + self.error_ttl
+                return current
+            self._entry = entry
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the stale entry; the next expired read retries.
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name="gemini-model-refresh", daemon=True).start()
+
+    def load_sdk(self) -> None:
+        """Import and configure the SDK (about a second of imports) without listing models."""
+        self._genai()
+
+    def _genai(self):
+        if not settings.gemini_api_key:
+            raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
+        try:
+            import google.generativeai as genai
+        except Exception as e:  # pragma: no cover
+            raise HTTPException(status_code=500, detail=f"Gemini SDK not available: {e}")
+        if not self._configured:
+            if settings.gemini_api_endpoint.rstrip("/") == DEFAULT_API_ENDPOINT:
+                genai.configure(api_key=settings.gemini_api_key)
+            else:
+                # Self-hosted proxy or local stand-in: list models over REST at that endpoint.
+                genai.configure(
+                    api_key=settings.gemini_api_key,
+                    transport="rest",
+                    client_options={"api_endpoint": settings.gemini_api_endpoint},
+                )
+            self._configured = True
+        return genai
+
+    def _resolve(self) -> ResolvedModel:
+        started = time.perf_counter()
+        genai = self._genai()
+
+        preferred_norm = _normalize(settings.gemini_model or "")
+        # Favor 2.x family first, then 1.5/1.x as fallbacks.
+        fallback_candidates_norm = [
+            preferred_norm,
+            # 2.5 family (names may vary by account/region; list_models will filter)
+            "gemini-2.5-pro",
+            "gemini-2.5-flash",
+            "gemini-2.5-pro-latest",
+            "gemini-2.5-flash-latest",
+            # 2.0 family
+            "gemini-2.0-pro",
+            "gemini-2.0-flash",
+            "gemini-2.0-pro-exp",
+            "gemini-2.0-flash-exp",
+        ]
+
+        chosen_full_name = None  # e.g., "models/gemini-1.5-flash-latest"
+        listing: List[Dict[str, Any]] = []
+        listing_error = None
+        try:
+            available = list(genai.list_models())
+            available_map = {}  # normalized -> full name
+            for m in available:
+                try:
+                    methods = getattr(m, "supported_generation_methods", []) or []
+                    listing.append({"name": getattr(m, "name", None), "supported_generation_methods": methods})
+                    if "generateContent" in set(methods):
+                        full = getattr(m, "name", "")
+                        n = _normalize(full)
+                        if n and full:
+                            available_map[n] = full
+                except Exception:
+                    continue
+            for cand in fallback_candidates_norm:
+                if cand and cand in available_map:
+                    chosen_full_name = available_map[cand]
+                    break
+            # If none matched, pick the first available model supporting generateContent
+            if not chosen_full_name and available_map:
+                chosen_full_name = next(iter(available_map.values()))
+        except Exception as e:
+            listing_error = str(e)
+            # If listing fails, just take the first non-empty candidate string
+            for cand in fallback_candidates_norm:
+                if cand:
+                    chosen_full_name = cand
+                    break
+
+        if not chosen_full_name:
+            chosen_full_name = "gemini-1.5-flash-latest"
+
+        if not chosen_full_name.startswith("models/"):
+            chosen_full_name = f"models/{chosen_full_name}"
+
+        return ResolvedModel(
+            full_name=chosen_full_name,
+            generation_config=_base_generation_config(),
+            listing=listing,
+            listing_error=listing_error,
+            resolve_seconds=time.perf_counter() - started,
+        )
+
+
+registry = ModelRegistry(ttl=settings.gemini_model_ttl, error_ttl=settings.gemini_model_error_ttl)
@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+import io
+import json
+import math
+import struct
+import sys
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:  # Pillow is optional: without it textures are left as they are
+    from PIL import Image
+except Exception:  # pragma: no cover
+    Image = None
+
+# Mobile variant of a GLB: vertex-clustering decimation to a triangle budget and
+# downscaled/recompressed embedded textures. Pure Python (plus Pillow), meant to
+# run in the worker process pool; see AssetStore for where variants are made.
+
+_GLB_MAGIC = b"glTF"
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+_COMPONENT_SIZE = {5120: 1, 5121: 1, 5122: 2, 5123: 2, 5125: 4, 5126: 4}
+_INDEX_TYPECODE = {5121: "B", 5123: "H", 5125: "I"}
+_TYPE_COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+_TRIANGLES = 4
+# Extensions that don't hide geometry or reference accessors we don't rewrite.
+_SAFE_EXTENSIONS = {"KHR_texture_transform", "KHR_lights_punctual", "KHR_mesh_quantization", "KHR_texture_basisu"}
+
+
+class GlbError(ValueError):
+    pass
+
+
+@dataclass
+class GlbReport:
+    bytes_in: int = 0
+    bytes_out: int = 0
+    triangles_in: int = 0
+    triangles_out: int = 0
+    textures: int = 0
+    texture_bytes_in: int = 0
+    texture_bytes_out: int = 0
+    skipped: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def read_glb(data: bytes) -> Tuple[dict, bytes]:
+    """Split a GLB into its JSON document and BIN chunk."""
+    if len(data) < 20 or data[:4] != _GLB_MAGIC:
+        raise GlbError("not a GLB file")
+    version, length = struct.unpack_from("<II", data, 4)
+    if version != 2:
+        raise GlbError(f"unsupported glTF version {version}")
+    offset, doc, binary = 12, None, b""
+    while offset + 8 <= min(length, len(data)):
+        chunk_len, chunk_type = struct.unpack_from("<II", data, offset)
+        body = data[offset + 8 : offset + 8 + chunk_len]
+        if chunk_type == _CHUNK_JSON and doc is None:
+            doc = json.loads(body)
+        elif chunk_type == _CHUNK_BIN and not binary:
+            binary = bytes(body)
+        offset += 8 + chunk_len
+    if doc is None:
+        raise GlbError("GLB has no JSON chunk")
+    return doc, binary
+
+
+def write_glb(doc: dict, binary: bytes) -> bytes:
+    body = json.dumps(doc, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    body += b" " * (-len(body) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(body) + (8 + len(binary) if binary else 0)
+    out = [_GLB_MAGIC, struct.pack("<II", 2, length), struct.pack("<II", len(body), _CHUNK_JSON), body]
+    if binary:
+        out += [struct.pack("<II", len(binary), _CHUNK_BIN), binary]
+    return b"".join(out)
+
+
+class _Document:
+    """A parsed GLB whose buffer views can be replaced and appended before re-packing."""
+
+    def __init__(self, doc: dict, binary: bytes):
+        self.doc = doc
+        self.binary = binary
+        self.accessors: List[dict] = doc.setdefault("accessors", [])
+        self.views: List[dict] = doc.setdefault("bufferViews", [])
+        self.view_data: Dict[int, bytes] = {}  # replaced or appended views
+
+    def view_bytes(self, index: int) -> bytes:
+        if index in self.view_data:
+            return self.view_data[index]
+        view = self.views[index]
+        start = view.get("byteOffset", 0)
+        return self.binary[start : start + view["byteLength"]]
+
+    def add_view(self, data: bytes, target: Optional[int] = None, stride: Optional[int] = None) -> int:
+        view: dict = {"buffer": 0, "byteLength": len(data)}
+        if stride:
+            view["byteStride"] = stride
+        if target:
+            view["target"] = target
+        self.views.append(view)
+        self.view_data[len(self.views) - 1] = data
+        return len(self.views) - 1
+
+    def add_accessor(self, accessor: dict) -> int:
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def element(self, accessor: dict) -> Tuple[bytes, int, int, int]:
+        """(view bytes, first element offset, stride, element size) of a non-sparse accessor."""
+        size = _COMPONENT_SIZE[accessor["componentType"]] * _TYPE_COMPONENTS[accessor["type"]]
+        view = self.views[accessor["bufferView"]]
+        return self.view_bytes(accessor["bufferView"]), accessor.get("byteOffset", 0), view.get("byteStride") or size, size
+
+    def read_indices(self, accessor: dict) -> array:
+        data, offset, _, size = self.element(accessor)
+        out = array(_INDEX_TYPECODE[accessor["componentType"]])
+        out.frombytes(data[offset : offset + accessor["count"] * size])
+        if sys.byteorder != "little":
+            out.byteswap()
+        return out
+
+    def read_positions(self, accessor: dict) -> Tuple[List[float], List[float], List[float]]:
+        data, offset, stride, _ = self.element(accessor)
+        count = accessor["count"]
+        if stride == 12:
+            flat = array("f")
+            flat.frombytes(data[offset : offset + count * 12])
+            if sys.byteorder != "little":
+                flat.byteswap()
+            return list(flat[0::3]), list(flat[1::3]), list(flat[2::3])
+        rows = [struct.unpack_from("<3f", data, offset + i * stride) for i in range(count)]
+        return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+
+    def gather(self, accessor: dict, keep: Sequence[int]) -> Tuple[bytes, Optional[int]]:
+        """Elements ``keep`` of an accessor, tightly packed (padded to 4 bytes as vertex attributes must be)."""
+        data, offset, stride, size = self.element(accessor)
+        padded = size + (-size % 4)
+        pad = b"\0" * (padded - size)
+        out = b"".join(data[offset + v * stride : offset + v * stride + size] + pad for v in keep)
+        return out, (padded if padded != size else None)
+
+    def pack(self) -> bytes:
+        """Drop unreferenced accessors and views, then lay the views out in one fresh BIN buffer."""
+        doc = self.doc
+        used_accessors = set()
+        for mesh in doc.get("meshes", []):
+            for prim in mesh.get("primitives", []):
+                used_accessors.update(prim.get("attributes", {}).values())
+                if "indices" in prim:
+                    used_accessors.add(prim["indices"])
+                for target in prim.get("targets", []):
+                    used_accessors.update(target.values())
+        for skin in doc.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                used_accessors.add(skin["inverseBindMatrices"])
+        for anim in doc.get("animations", []):
+            for sampler in anim.get("samplers", []):
+                used_accessors.update((sampler["input"], sampler["output"]))
+
+        amap = {old: new for new, old in enumerate(sorted(used_accessors))}
+        accessors = [self.accessors[old] for old in sorted(used_accessors)]
+        for mesh in doc.get("meshes", []):
+            for prim in mesh.get("primitives", []):
+                prim["attributes"] = {k: amap[v] for k, v in prim.get("attributes", {}).items()}
+                if "indices" in prim:
+                    prim["indices"] = amap[prim["indices"]]
+                if "targets" in prim:
+                    prim["targets"] = [{k: amap[v] for k, v in t.items()} for t in prim["targets"]]
+        for skin in doc.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                skin["inverseBindMatrices"] = amap[skin["inverseBindMatrices"]]
+        for anim in doc.get("animations", []):
+            for sampler in anim.get("samplers", []):
+                sampler["input"], sampler["output"] = amap[sampler["input"]], amap[sampler["output"]]
+
+        used_views = set()
+        for acc in accessors:
+            if "bufferView" in acc:
+                used_views.add(acc["bufferView"])
+            sparse = acc.get("sparse")
+            if sparse:
+                used_views.update((sparse["indices"]["bufferView"], sparse["values"]["bufferView"]))
+        used_views.update(img["bufferView"] for img in doc.get("images", []) if "bufferView" in img)
+
+        vmap = {old: new for new, old in enumerate(sorted(used_views))}
+        views, chunks, offset = [], [], 0
+        for old in sorted(used_views):
+            data = self.view_bytes(old)
+            pad = -offset % 4
+            chunks.append(b"\0" * pad + data)
+            offset += pad
+            view = dict(self.views[old], buffer=0, byteOffset=offset, byteLength=len(data))
+            views.append(view)
+            offset += len(data)
+        for acc in accessors:
+            if "bufferView" in acc:
+                acc["bufferView"] = vmap[acc["bufferView"]]
+            sparse = acc.get("sparse")
+            if sparse:
+                sparse["indices"]["bufferView"] = vmap[sparse["indices"]["bufferView"]]
+                sparse["values"]["bufferView"] = vmap[sparse["values"]["bufferView"]]
+        for img in doc.get("images", []):
+            if "bufferView" in img:
+                img["bufferView"] = vmap[img["bufferView"]]
+
+        binary = b"".join(chunks)
+        doc["accessors"], doc["bufferViews"] = accessors, views
+        doc["buffers"] = [{"byteLength": len(binary)}] if binary else []
+        for key in ("accessors", "bufferViews", "buffers"):
+            if not doc[key]:
+                del doc[key]
+        return write_glb(doc, binary)
+
+
+def _cluster(xs, ys, zs, indices, origin, cell) -> Tuple[List[int], List[int]]:
+    """One vertex-clustering pass: snap vertices to a grid, keep the first vertex per cell.
+
+    Returns (representative vertex per cluster, triangle list over clusters),
+    dropping triangles that collapsed or duplicate another.
+    """
+    inv = 1.0 / cell
+    ox, oy, oz = origin
+    keys = zip([int((x - ox) * inv) for x in xs], [int((y - oy) * inv) for y in ys], [int((z - oz) * inv) for z in zs])
+    clusters: Dict[Tuple[int, int, int], int] = {}
+    reps: List[int] = []
+    remap = []
+    for v, key in enumerate(keys):
+        c = clusters.get(key)
+        if c is None:
+            c = clusters[key] = len(reps)
+            reps.append(v)
+        remap.append(c)
+    tris: List[int] = []
+    seen = set()
+    it = iter(indices)
+    for a, b, c in zip(it, it, it):
+        a, b, c = remap[a], remap[b], remap[c]
+        if a == b or b == c or a == c:
+            continue
+        # Rotate (keeping winding) so the same triangle always has the same key.
+        key = (a, b, c) if a < b and a < c else ((b, c, a) if b < c else (c, a, b))
+        if key in seen:
+            continue
+        seen.add(key)
+        tris += key
+    return reps, tris
+
+
+def _decimate(xs, ys, zs, indices, target: int) -> Optional[Tuple[List[int], List[int]]]:
+    """Finest grid whose clustering fits ``target`` triangles: (kept vertices, new indices), or None."""
+    lo = (min(xs), min(ys), min(zs))
+    extent = max(max(xs) - lo[0], max(ys) - lo[1], max(zs) - lo[2])
+    if extent <= 0:
+        return None
+    best = None
+    # Surface meshes keep roughly res**2 triangles for res grid cells per axis:
+    # start coarse and rescale from each pass's count, a few passes at most.
+    res = 64.0
+    for _ in range(6):
+        reps, tris = _cluster(xs, ys, zs, indices, lo, extent / res * 1.0001)
+        count = len(tris) // 3
+        if count <= target and (best is None or count > len(best[1]) // 3):
+            best = (reps, tris)
+        if target * 0.9 <= count <= target:
+            break
+        res = max(1.0, res * math.sqrt(target / max(count, 1)) * (0.97 if count > target else 1.0))
+    if best is None or not best[1]:
+        return None
+    reps, tris = best
+    # Compact to the clusters still referenced, in first-use order (cache friendly).
+    order: Dict[int, int] = {}
+    for c in tris:
+        if c not in order:
+            order[c] = len(order)
+    keep = [0] * len(order)
+    for c, new in order.items():
+        keep[new] = reps[c]
+    return keep, [order[c] for c in tris]
+
+
+def _primitive_triangles(doc: _Document, prim: dict) -> int:
+    if prim.get("mode", _TRIANGLES) != _TRIANGLES:
+        return 0
+    if "indices" in prim:
+        return doc.accessors[prim["indices"]]["count"] // 3
+    position = prim.get("attributes", {}).get("POSITION")
+    return doc.accessors[position]["count"] // 3 if position is not None else 0
+
+
+def _can_decimate(doc: _Document, prim: dict) -> bool:
+    attrs = prim.get("attributes", {})
+    if prim.get("mode", _TRIANGLES) != _TRIANGLES or "POSITION" not in attrs or prim.get("targets"):
+        return False
+    accessors = [doc.accessors[i] for i in attrs.values()]
+    if "indices" in prim:
+        accessors.append(doc.accessors[prim["indices"]])
+    if any("sparse" in a or "bufferView" not in a for a in accessors):
+        return False
+    position = doc.accessors[attrs["POSITION"]]
+    return position["componentType"] == 5126 and position["type"] == "VEC3"
+
+
+def _decimate_primitive(doc: _Document, prim: dict, target: int) -> int:
+    """Rewrite a primitive with at most ``target`` triangles; returns its triangle count afterwards."""
+    attrs = prim["attributes"]
+    position = doc.accessors[attrs["POSITION"]]
+    if "indices" in prim:
+        indices = doc.read_indices(doc.accessors[prim["indices"]])
+    else:
+        indices = range(position["count"] - position["count"] % 3)
+    xs, ys, zs = doc.read_positions(position)
+    result = _decimate(xs, ys, zs, indices, target)
+    if result is None:
+        return len(indices) // 3
+    keep, tris = result
+
+    new_attrs = {}
+    for name, index in attrs.items():
+        acc = doc.accessors[index]
+        data, stride = doc.gather(acc, keep)
+        new = {k: v for k, v in acc.items() if k not in ("bufferView", "byteOffset", "min", "max")}
+        new.update(bufferView=doc.add_view(data, target=34962, stride=stride), count=len(keep))
+        if name == "POSITION":
+            kx, ky, kz = [xs[v] for v in keep], [ys[v] for v in keep], [zs[v] for v in keep]
+            new["min"] = [min(kx), min(ky), min(kz)]
+            new["max"] = [max(kx), max(ky), max(kz)]
+        elif "min" in acc and "max" in acc:
+            new["min"], new["max"] = acc["min"], acc["max"]
+        new_attrs[name] = doc.add_accessor(new)
+
+    component = 5123 if len(keep) < 65536 else 5125
+    packed = array(_INDEX_TYPECODE[component], tris)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    view = doc.add_view(packed.tobytes(), target=34963)
+    prim["attributes"] = new_attrs
+    prim["indices"] = doc.add_accessor(
+        {"bufferView": view, "componentType": component, "count": len(tris), "type": "SCALAR"}
+    )
+    return len(tris) // 3
+
+
+def _recompress_texture(data: bytes, max_edge: int, quality: int) -> Optional[Tuple[bytes, str]]:
+    """Downscale to ``max_edge`` and re-encode (JPEG, or PNG when alpha is used); None if not smaller."""
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            img = src.copy()
+    except Exception:
+        return None
+    resized = max(img.size) > max_edge
+    if resized:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    if img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema()[0] < 255:
+        img.convert("RGBA").save(out, format="PNG", optimize=True)
+        mime = "image/png"
+    else:
+        img.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True)
+        mime = "image/jpeg"
+    if len(out.getvalue()) >= len(data) and not resized:
+        return None
+    return out.getvalue(), mime
+
+
+def optimize_glb(data: bytes, target_triangles: int, texture_max_edge: int, texture_quality: int) -> Tuple[bytes, GlbReport]:
+    """Decimate meshes to ``target_triangles`` in total and shrink embedded textures.
+
+    Returns the original bytes with ``report.skipped`` set when the file uses
+    something this optimizer can't safely rewrite (compressed geometry,
+    external buffers, unknown extensions).
+    """
+    report = GlbReport(bytes_in=len(data), bytes_out=len(data))
+    doc_json, binary = read_glb(data)
+    doc = _Document(doc_json, binary)
+    prims = [p for mesh in doc_json.get("meshes", []) for p in mesh.get("primitives", [])]
+    report.triangles_in = report.triangles_out = sum(_primitive_triangles(doc, p) for p in prims)
+
+    unsupported = [
+        e for e in doc_json.get("extensionsUsed", []) if e not in _SAFE_EXTENSIONS and not e.startswith("KHR_materials_")
+    ]
+    if unsupported:
+        report.skipped = f"unsupported extension {unsupported[0]}"
+        return data, report
+    buffers = doc_json.get("buffers", [])
+    if len(buffers) > 1 or any("uri" in b for b in buffers):
+        report.skipped = "external buffers"
+        return data, report
+
+    if report.triangles_in > target_triangles:
+        total = 0
+        for prim in prims:
+            tris = _primitive_triangles(doc, prim)
+            budget = max(1, target_triangles * tris // report.triangles_in)
+            if tris > budget and _can_decimate(doc, prim):
+                tris = _decimate_primitive(doc, prim, budget)
+            total += tris
+        report.triangles_out = total
+
+    if Image is not None:
+        for img in doc_json.get("images", []):
+            if "bufferView" not in img or img.get("mimeType") not in ("image/png", "image/jpeg"):
+                continue
+            original = doc.view_bytes(img["bufferView"])
+            smaller = _recompress_texture(original, texture_max_edge, texture_quality)
+            if smaller is None:
+                continue
+            report.textures += 1
+            report.texture_bytes_in += len(original)
+            report.texture_bytes_out += len(smaller[0])
+            img["bufferView"] = doc.add_view(smaller[0])
+            img["mimeType"] = smaller[1]
+
+    out = doc.pack()
+    if len(out) >= len(data):
+        report.skipped = "no smaller result"
+        report.triangles_out = report.triangles_in
+        return data, report
+    report.bytes_out = len(out)
+    return out, report
+
+
+def optimize_glb_file(src: str, dst: str, target_triangles: int, texture_max_edge: int, texture_quality: int) -> dict:
+    """Worker-process entry point: optimize ``src`` into ``dst`` (written only when smaller)."""
+    with open(src, "rb") as f:
+        data = f.read()
+    out, report = optimize_glb(data, target_triangles, texture_max_edge, texture_quality)
+    if report.skipped is None:
+        with open(dst, "wb") as f:
+            f.write(out)
+    return report.as_dict()
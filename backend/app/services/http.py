@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import httpx
+
+from ..config import settings
+
+
+# App-lifetime clients, opened and closed by the FastAPI lifespan in main.py.
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def build_tripo_client() -> httpx.AsyncClient:
+    """Pooled client for Tripo: keep-alive, optional HTTP/2, bounded connections.
+
+    The default timeout is the one used for status polls; the create call
+    overrides it with the longer upload timeouts (see TripoClient).
+    """
+    return httpx.AsyncClient(
+        http2=settings.tripo_http2 and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=settings.tripo_max_connections,
+            max_keepalive_connections=settings.tripo_max_keepalive,
+            keepalive_expiry=settings.tripo_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.tripo_connect_timeout,
+            read=settings.tripo_status_timeout,
+            write=settings.tripo_status_timeout,
+            pool=settings.tripo_pool_timeout,
+        ),
+    )
+
+
+def build_gemini_client() -> httpx.AsyncClient:
+    """Pooled client for the Gemini REST API; per-attempt deadlines are enforced by the caller."""
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=settings.gemini_max_connections,
+            max_keepalive_connections=settings.gemini_max_connections,
+            keepalive_expiry=settings.gemini_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(settings.gemini_attempt_timeout, connect=settings.gemini_connect_timeout),
+    )
+
+
+async def open_clients() -> None:
+    if "tripo" not in _clients:
+        _clients["tripo"] = build_tripo_client()
+    if "gemini" not in _clients:
+        _clients["gemini"] = build_gemini_client()
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def get_client(name: str) -> Optional[httpx.AsyncClient]:
+    return _clients.get(name)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+
+from ..config import settings
+from .gemini_files import ImageInput
+from .telemetry import metrics
+from .uploads import SpooledImage
+
+try:  # Pillow is optional: without it uploads are passed through (format detection + exact dedupe only)
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover
+    Image = None
+    ImageOps = None
+
+
+# Formats Gemini accepts as image parts.
+_GEMINI_MIME = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+_MIME_BY_FORMAT = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+    "heic": "image/heic",
+}
+
+
+def detect_format(data: bytes) -> Optional[str]:
+    """Sniff the real image format from magic bytes (uploads are often mislabelled)."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "heic"
+    return None
+
+
+def mime_type(data: bytes) -> str:
+    return _MIME_BY_FORMAT.get(detect_format(data) or "", "application/octet-stream")
+
+
+@dataclass
+class PreparedImage:
+    filename: str
+    # Re-encoded bytes, or a file handle on the untouched upload (streamed to Tripo as-is)
+    content: Union[bytes, BinaryIO]
+    content_type: str
+    size: int
+    original_size: int
+    dhash: Optional[int] = None
+    # SHA-256 of ``content`` when it was re-encoded, else of the upload
+    digest: bytes = b""
+
+
+@dataclass
+class PreprocessReport:
+    images_in: int = 0
+    images_out: int = 0
+    duplicates_dropped: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def as_dict(self) -> dict:
+        return {
+            "images_in": self.images_in,
+            "images_out": self.images_out,
+            "duplicates_dropped": self.duplicates_dropped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def _dhash(img) -> int:
+    """64-bit difference hash: robust to re-encoding and resizing, cheap to compare."""
+    small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits
+
+
+def _process_one(source: Union[bytes, str], max_edge: int, quality: int) -> Tuple[Optional[bytes], Optional[str], Optional[int]]:
+    """Worker-process body: decode, honour EXIF orientation, downscale, re-encode without metadata.
+
+    ``source`` is the upload bytes or the path of its spool file. Returns
+    (None, None, None) when the image can't be decoded, meaning "upload as-is".
+    """
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as src:
+            img = ImageOps.exif_transpose(src)
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            dhash = _dhash(img)
+            out = io.BytesIO()
+            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                # Keep cut-out backgrounds; PNG is lossless so just optimize it.
+                img.convert("RGBA").save(out, format="PNG", optimize=True)
+                return out.getvalue(), "image/png", dhash
+            img.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+            return out.getvalue(), "image/jpeg", dhash
+    except Exception:
+        # Undecodable (e.g. HEIC without a plugin): upload as-is and let Tripo decide.
+        return None, None, None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.image_workers)
+    return _pool
+
+
+async def run_in_pool(fn, *args):
+    """Run a CPU-bound, picklable ``fn(*args)`` in the shared worker process pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Preprocessing results by upload digest, most recently used last. Entries are futures so that
+# concurrent callers (the Gemini and Tripo branches of one request) share a single decode.
+_decoded: "OrderedDict[bytes, asyncio.Future]" = OrderedDict()
+
+DECODES = metrics.counter("diy_image_decodes_total", "Image preprocessing results, by outcome: decoded or reused")
+
+
+def _decode(img: SpooledImage) -> "asyncio.Future":
+    loop = asyncio.get_running_loop()
+    future = _decoded.get(img.digest)
+    if future is not None and future.get_loop() is loop:
+        _decoded.move_to_end(img.digest)
+        DECODES.inc(outcome="reused")
+        return future
+    future = loop.run_in_executor(
+        _executor(), _process_one, img.source(), settings.image_max_edge, settings.image_quality
+    )
+    digest = img.digest
+    _decoded[digest] = future
+    while len(_decoded) > max(0, settings.image_decode_cache):
+        _decoded.popitem(last=False)
+
+    def forget_failure(f: "asyncio.Future") -> None:
+        # A crashed or cancelled run must not be served to the next caller.
+        if (f.cancelled() or f.exception() is not None) and _decoded.get(digest) is f:
+            del _decoded[digest]
+
+    future.add_done_callback(forget_failure)
+    DECODES.inc(outcome="decoded")
+    return future
+
+
+def _is_duplicate(candidate: PreparedImage, kept: Sequence[PreparedImage], digest: bytes, seen: set) -> bool:
+    if digest in seen:
+        return True
+    if candidate.dhash is None:
+        return False
+    limit = settings.image_dedupe_distance
+    return any(
+        k.dhash is not None and bin(k.dhash ^ candidate.dhash).count("1") <= limit for k in kept
+    )
+
+
+async def preprocess_images(images: Sequence[SpooledImage]) -> Tuple[List[PreparedImage], PreprocessReport]:
+    """Resize/re-encode/strip EXIF in the process pool and drop (near-)duplicate shots.
+
+    Each upload is decoded at most once while its result stays in the decode
+    cache, however many callers ask for it.
+    """
+    report = PreprocessReport(images_in=len(images), bytes_in=sum(img.size for img in images))
+    if settings.image_preprocess and Image is not None:
+        # Shielded: one caller giving up must not cancel a decode another caller is waiting for.
+        processed = await asyncio.gather(*(asyncio.shield(_decode(img)) for img in images))
+    else:
+        processed = [(None, None, None)] * len(images)
+
+    kept: List[PreparedImage] = []
+    seen: set = set()
+    for idx, (img, (content, ctype, dhash)) in enumerate(zip(images, processed)):
+        name = img.filename or f"image_{idx}"
+        if content is None:
+            digest = img.digest
+            ctype = mime_type(img.head())
+        else:
+            digest = hashlib.sha256(content).digest()
+        ext = {"image/png": "png", "image/jpeg": "jpg"}.get(ctype)
+        if ext and content is not None:
+            name = f"{os.path.splitext(name)[0]}.{ext}"
+        candidate = PreparedImage(
+            filename=name,
+            content=content if content is not None else img,
+            content_type=ctype,
+            size=len(content) if content is not None else img.size,
+            original_size=img.size,
+            dhash=dhash,
+            digest=digest,
+        )
+        if _is_duplicate(candidate, kept, digest, seen):
+            report.duplicates_dropped += 1
+            continue
+        seen.add(digest)
+        if content is None:
+            # Stream the spooled upload itself rather than copying it.
+            candidate.content = img.open()
+        kept.append(candidate)
+
+    report.images_out = len(kept)
+    report.bytes_out = sum(k.size for k in kept)
+    return kept, report
+
+
+async def gemini_images(images: Sequence[SpooledImage]) -> List[ImageInput]:
+    """The uploads as Gemini image parts, from the same (cached) preprocessing as the Tripo upload."""
+    prepared, _ = await preprocess_images(images)
+    out: List[ImageInput] = []
+    for p in prepared:
+        if p.content_type not in _GEMINI_MIME:
+            continue
+        data = p.content if isinstance(p.content, bytes) else await asyncio.to_thread(p.content.read)
+        out.append(ImageInput(digest=p.digest.hex(), mime_type=p.content_type, data=data))
+    return out
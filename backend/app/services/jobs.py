@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+
+from ..config import settings
+from ..models.schemas import Job
+from .shared import WORKER_ID, SharedStore, shared_store, worker_alive
+
+log = logging.getLogger(__name__)
+
+
+class SQLiteJobPersistence:
+    """Optional write-through store so finished jobs survive eviction and restarts."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)",
+                (job.id, job.model_dump_json(), job.updated_at),
+            )
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.model_validate_json(row[0]) if row else None
+
+    async def aload(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.load, job_id)
+
+    async def running_elsewhere(self, job_id: str) -> bool:
+        # Single process: a stored unfinished job we don't hold was cut off by a restart.
+        return False
+
+
+class SharedJobPersistence:
+    """Jobs in the shared store, tagged with the worker running them, so every worker can serve them.
+
+    An unfinished job counts as running while its worker's heartbeat is alive.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, store: SharedStore, ttl: float):
+        self.store = store
+        self.ttl = ttl
+
+    def save(self, job: Job) -> None:
+        record = {"owner": WORKER_ID, "job": job.model_dump(mode="json")}
+        self.store.set(f"job:{job.id}", json.dumps(record, ensure_ascii=False), ex=self.ttl)
+
+    async def _record(self, job_id: str) -> Optional[dict]:
+        raw = await self.store.aget(f"job:{job_id}")
+        return json.loads(raw) if raw is not None else None
+
+    async def aload(self, job_id: str) -> Optional[Job]:
+        record = await self._record(job_id)
+        return Job.model_validate(record["job"]) if record else None
+
+    async def running_elsewhere(self, job_id: str) -> bool:
+        record = await self._record(job_id)
+        return record is not None and await worker_alive(record["owner"])
+
+
+class JobStore:
+    """Bounded in-process job table with change notification for SSE subscribers.
+
+    When full, the oldest finished jobs are evicted first; if every slot holds
+    an unfinished job, new submissions are rejected with 503. Changes are
+    written through to ``persistence`` on a thread of its own, in order,
+    without making the caller wait for the write.
+    """
+
+    def __init__(self, max_jobs: int, persistence: Optional[SQLiteJobPersistence | SharedJobPersistence] = None):
+        self.max_jobs = max_jobs
+        self.persistence = persistence
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    def create(self, generate_model: bool) -> Job:
+        self._make_room()
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex,
+            model_status="pending" if generate_model else "skipped",
+            created_at=now,
+            updated_at=now,
+        )
+        self._jobs[job.id] = job
+        self._changed[job.id] = asyncio.Event()
+        self._persist(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.persistence is not None:
+            job = await self.persistence.aload(job_id)
+            if job is not None and not job.finished and not await self.persistence.running_elsewhere(job_id):
+                # Its runner belonged to a previous (or dead) process.
+                job = job.model_copy(update={"status": "failed", "ideas_error": job.ideas_error or "interrupted"})
+        return job
+
+    def update(self, job_id: str, **changes) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job = job.model_copy(update={**changes, "updated_at": time.time()})
+        job = job.model_copy(update={"status": self._overall_status(job)})
+        self._jobs[job_id] = job
+        self._persist(job)
+        # Wake current subscribers and arm a fresh event for the next change.
+        event = self._changed.get(job_id)
+        self._changed[job_id] = asyncio.Event()
+        if event is not None:
+            event.set()
+        return job
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[Job]]:
+        """Yield the job on every change until it finishes; yields None on idle heartbeats."""
+        while True:
+            event = self._changed.get(job_id)
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+            if job.finished:
+                return
+            if event is None:
+                if not isinstance(self.persistence, SharedJobPersistence):
+                    return
+                # Another worker runs it: poll the shared record until it changes.
+                idle = 0.0
+                while True:
+                    await asyncio.sleep(self.persistence.poll_interval)
+                    current = await self.persistence.aload(job_id)
+                    if current is None or current.updated_at != job.updated_at:
+                        break
+                    idle += self.persistence.poll_interval
+                    if idle >= heartbeat:
+                        idle = 0.0
+                        yield None
+                continue
+            while True:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=heartbeat)
+                    break
+                except asyncio.TimeoutError:
+                    yield None
+
+    def stats(self) -> dict:
+        active = sum(1 for j in self._jobs.values() if not j.finished)
+        return {"jobs": len(self._jobs), "active": active, "max_jobs": self.max_jobs}
+
+    @staticmethod
+    def _overall_status(job: Job) -> str:
+        phases = (job.ideas_status, job.model_status)
+        if "failed" in phases and "pending" not in phases:
+            return "failed"
+        if "pending" not in phases:
+            return "succeeded"
+        return "running"
+
+    def _make_room(self) -> None:
+        while len(self._jobs) >= self.max_jobs:
+            victim = next((jid for jid, j in self._jobs.items() if j.finished), None)
+            if victim is None:
+                raise HTTPException(status_code=503, detail="Too many jobs in progress", headers={"Retry-After": "5"})
+            del self._jobs[victim]
+            self._changed.pop(victim, None)
+
+    def _persist(self, job: Job) -> None:
+        if self.persistence is None:
+            return
+        if isinstance(self.persistence, SharedJobPersistence):
+            # The store's own thread, so these writes stay ordered with its other calls.
+            written = self.persistence.store.submit(self.persistence.save, job)
+        else:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+            written = self._writer.submit(self.persistence.save, job)
+        written.add_done_callback(_log_failed_write)
+
+
+def _log_failed_write(written: Future) -> None:
+    if written.exception() is not None:
+        log.error("job store write failed", exc_info=written.exception())
+
+
+def build_job_store() -> JobStore:
+    persistence = None
+    if settings.job_store_backend == "sqlite":
+        persistence = SQLiteJobPersistence(settings.job_store_path)
+    elif settings.job_store_backend == "shared":
+        if shared_store is None:
+            raise RuntimeError("JOB_STORE_BACKEND=shared needs SHARED_STORE_URL")
+        persistence = SharedJobPersistence(shared_store, settings.job_store_ttl)
+    return JobStore(settings.job_store_max_jobs, persistence)
+
+
+job_store = build_job_store()
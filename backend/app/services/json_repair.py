@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from ..models.schemas import DIYIdea
+
+# Local recovery for near-JSON model output, so the Gemini self-repair round trip
+# is only needed for text that has no recoverable structure at all.
+
+_ROOT_START = re.compile(r'[{\[]\s*["“”}\]]')
+_OPEN_QUOTES = '"“”'
+_CLOSERS = {"{": "}", "[": "]"}
+_STRING_SPECIAL = re.compile(r'[\\"“”\n\r\t]')
+_ESCAPES = set('"\\/bfnrtu')
+# Characters that may appear outside strings; anything else (fences, prose) is dropped.
+_BARE = set("0123456789-+.eEtruefalsn \t\r\n")
+_BARE_RUN = re.compile(r"[0-9+\-.eEtruefalsn \t\r\n]+")
+
+
+class _IdeasPayload(BaseModel):
+    ideas: List[DIYIdea]
+
+
+# Built once: validators are compiled by pydantic-core at construction time.
+_PAYLOAD = TypeAdapter(_IdeasPayload)
+_IDEA = TypeAdapter(DIYIdea)
+
+
+def _string_closes(text: str, j: int, frame: Optional[List]) -> bool:
+    """Decide whether a quote inside a string terminates it, from what follows it.
+
+    ``j`` is the index after the quote. A quote followed by the right delimiter
+    for its position (``:`` after a key, ``,``/``}``/``]`` after a value) ends
+    the string; anything else is an unescaped quote inside the text.
+    """
+    n = len(text)
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    if j >= n:
+        return True
+    c = text[j]
+    in_object = frame is not None and frame[0] == "}"
+    if in_object and frame[1]:
+        return c == ":"
+    if c in "}]":
+        return True
+    if c != ",":
+        return False
+    j += 1
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    if j >= n:
+        return True
+    nxt = text[j]
+    if in_object:
+        return nxt in _OPEN_QUOTES or nxt == "}"
+    return nxt in _OPEN_QUOTES or nxt in "{[]-0123456789tfn"
+
+
+def repair_json(text: str) -> str:
+    """Rewrite near-JSON into strict JSON text.
+
+    Handles prose and code fences around the document, smart quotes used as
+    delimiters, unescaped quotes and raw newlines inside strings, trailing and
+    missing commas, mismatched closers, and output truncated mid-document (cut
+    back to the last complete value, then closed).
+    """
+    m = _ROOT_START.search(text)
+    start = m.start() if m else min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        return text
+
+    out: List[str] = []
+    stack: List[List] = []  # [closer, expecting_key]
+    in_str = False
+    is_key = False
+    quote = '"'
+    # Last point where the document was complete up to a value: (len(out), closers)
+    safe: Tuple[int, Tuple[str, ...]] = (0, ())
+
+    def last_sig() -> str:
+        for tok in reversed(out):
+            s = tok.strip()
+            if s:
+                return s[-1]
+        return ""
+
+    def mark_safe() -> None:
+        nonlocal safe
+        safe = (len(out), tuple(f[0] for f in stack))
+
+    def drop_trailing_comma() -> None:
+        for k in range(len(out) - 1, -1, -1):
+            if out[k].strip():
+                if out[k] == ",":
+                    del out[k]
+                return
+
+    i, n = start, len(text)
+    while i < n:
+        ch = text[i]
+        if in_str:
+            special = _STRING_SPECIAL.search(text, i)
+            if special is None:
+                out.append(text[i:])
+                break
+            if special.start() > i:
+                # Copy the plain run of string content in one go.
+                out.append(text[i : special.start()])
+                i = special.start()
+                ch = text[i]
+            if ch == "\\":
+                if i + 1 < n:
+                    # Keep valid escapes; double the backslash of invalid ones (\', \x, ...).
+                    out.append(text[i : i + 2] if text[i + 1] in _ESCAPES else "\\\\" + text[i + 1])
+                i += 2
+                continue
+            if ch in _OPEN_QUOTES and (ch == '"' or quote != '"'):
+                frame = stack[-1] if stack else None
+                if _string_closes(text, i + 1, frame):
+                    in_str = False
+                    out.append('"')
+                    if not is_key:
+                        mark_safe()
+                else:
+                    out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in _OPEN_QUOTES or ch in "{[":
+            if stack and last_sig() in '}]"0123456789el':
+                # Two values back to back: the model dropped a comma.
+                out.append(",")
+                if stack[-1][0] == "}":
+                    stack[-1][1] = True
+        if ch in _OPEN_QUOTES:
+            in_str = True
+            quote = ch
+            is_key = bool(stack) and stack[-1][0] == "}" and stack[-1][1]
+            out.append('"')
+        elif ch in "{[":
+            stack.append([_CLOSERS[ch], ch == "{"])
+            out.append(ch)
+            mark_safe()
+        elif ch in "}]":
+            if any(f[0] == ch for f in stack):
+                drop_trailing_comma()
+                while stack:
+                    closer = stack.pop()[0]
+                    out.append(closer)
+                    if closer == ch:
+                        break
+                if not stack:
+                    break
+                mark_safe()
+            # A closer that matches nothing open is dropped.
+        elif ch == ",":
+            if last_sig() not in ",[{:" and stack:
+                if last_sig().isalnum():
+                    mark_safe()  # a bare literal/number just ended
+                out.append(",")
+                if stack[-1][0] == "}":
+                    stack[-1][1] = True
+        elif ch == ":":
+            out.append(":")
+            if stack and stack[-1][0] == "}":
+                stack[-1][1] = False
+        elif ch in _BARE:
+            # Whitespace, numbers and literals: copy the whole run.
+            run = _BARE_RUN.match(text, i)
+            out.append(run.group())
+            i = run.end()
+            continue
+        i += 1
+
+    if not stack and not in_str:
+        return "".join(out)
+    length, closers = safe
+    return "".join(out[:length]).rstrip().rstrip(",") + "".join(reversed(closers))
+
+
+def recover_json(text: str) -> Any:
+    """Parse model output with local repair; raises ValueError when nothing usable is left."""
+    return json.loads(repair_json(text or ""))
+
+
+def validate_ideas(obj: Any) -> Tuple[Optional[dict], int]:
+    """Validate a parsed payload against the DIYIdea schema.
+
+    Returns ({"ideas": [...]}, dropped) keeping only the ideas that validate,
+    or (None, dropped) when there is no ``ideas`` list or no idea survives.
+    Valid ideas are passed through as parsed; callers build DIYIdea from them.
+    """
+    if not isinstance(obj, dict) or not isinstance(obj.get("ideas"), list):
+        return None, 0
+    try:
+        _PAYLOAD.validate_python(obj)
+        ideas = obj["ideas"]
+    except ValidationError:
+        # Keep the ideas that are fine (typically all but a truncated last one).
+        ideas = [item for item in obj["ideas"] if _is_valid_idea(item)]
+    dropped = len(obj["ideas"]) - len(ideas)
+    if not ideas:
+        return None, dropped
+    return {"ideas": ideas}, dropped
+
+
+def _is_valid_idea(item: Any) -> bool:
+    try:
+        _IDEA.validate_python(item)
+    except ValidationError:
+        return False
+    return True
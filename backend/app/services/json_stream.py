@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Callable, List, Optional
+
+_IDEAS_ARRAY = re.compile(r'"ideas"\s*:\s*\[')
+
+
+class IdeaStreamParser:
+    """Incremental parser that pulls finished elements out of the ``ideas`` array.
+
+    Feed it text chunks as they arrive; each call returns the objects of the
+    ``"ideas": [...]`` array that have been closed since the previous call.
+    Text before the array (prose, code fences, the opening ``{``) is skipped
+    and nothing is parsed twice: the scanner remembers its position, nesting
+    depth and string/escape state between chunks.
+    """
+
+    def __init__(self, sanitize: Optional[Callable[[str], str]] = None):
+        self._sanitize = sanitize
+        self._buf = ""
+        self._pos = 0  # next index of _buf to scan
+        self._in_array = False
+        self._done = False
+        self._depth = 0  # nesting depth relative to the ideas array
+        self._in_string = False
+        self._escape = False
+        self._item_start: Optional[int] = None
+        self.skipped = 0  # elements that closed but were not valid JSON objects
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, chunk: str) -> List[dict]:
+        self._buf += chunk
+        if self._done:
+            return []
+        if not self._in_array:
+            m = _IDEAS_ARRAY.search(self._buf, max(0, self._pos - 16))
+            if not m:
+                self._pos = len(self._buf)
+                return []
+            self._in_array = True
+            self._pos = m.end()
+
+        out: List[dict] = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the ideas array itself.
+                    self._done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    item = self._load(buf[self._item_start : i + 1])
+                    if item is not None:
+                        out.append(item)
+                    self._item_start = None
+            i += 1
+        self._pos = i
+        return out
+
+    def _load(self, text: str) -> Optional[dict]:
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            try:
+                if self._sanitize is None:
+                    raise
+                obj = json.loads(self._sanitize(text))
+            except ValueError:
+                self.skipped += 1
+                return None
+        if not isinstance(obj, dict):
+            self.skipped += 1
+            return None
+        return obj
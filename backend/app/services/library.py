@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..config import settings
+from .cache import ideas_cache_key
+from .similar import SimilarityIndex
+from .telemetry import metrics
+
+# Precomputed ideas for the descriptions that make up most traffic, built
+# offline by ``python -m app.warmup`` and loaded whole at startup. Entries are
+# keyed like the result cache (description + prompt version), so a prompt
+# change retires the library until it is rebuilt.
+
+LOOKUPS_TOTAL = metrics.counter("diy_idea_library_lookups_total", "Idea library lookups, by outcome")
+
+# Bump when the table layout or payload encoding changes; older files are ignored.
+LIBRARY_FORMAT = "1"
+
+
+class IdeaLibrary:
+    """Read-mostly SQLite file of validated ideas, served from memory.
+
+    ``ideas`` rows hold the zlib-compressed JSON payload; ``meta`` holds the
+    file format. ``load`` keeps only rows for the running prompt version and
+    indexes their descriptions for near-duplicate matches.
+    """
+
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self.prompt_version: Optional[str] = None
+        self._entries: Dict[str, dict] = {}
+        self._index = SimilarityIndex(1, threshold)
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.stale = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ideas ("
+            " key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, description TEXT NOT NULL,"
+            " payload BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        row = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+        if row is None:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('format', ?)", (LIBRARY_FORMAT,))
+            conn.commit()
+        elif row[0] != LIBRARY_FORMAT:
+            conn.close()
+            raise ValueError(f"{self.path}: library format {row[0]}, expected {LIBRARY_FORMAT}")
+        return conn
+
+    def load(self, prompt_version: str) -> int:
+        """Read every entry for ``prompt_version`` into memory; returns the entry count."""
+        self.prompt_version = prompt_version
+        entries: Dict[str, dict] = {}
+        descriptions: Dict[str, str] = {}
+        stale = 0
+        if os.path.exists(self.path):
+            conn = self._connect()
+            try:
+                for key, version, description, payload in conn.execute(
+                    "SELECT key, prompt_version, description, payload FROM ideas"
+                ):
+                    if version != prompt_version:
+                        stale += 1
+                        continue
+                    entries[key] = json.loads(zlib.decompress(payload))
+                    descriptions[key] = description
+            finally:
+                conn.close()
+        index = SimilarityIndex(len(entries) + 1, self.threshold)
+        for key, description in descriptions.items():
+            index.add(description, key)
+        with self._lock:
+            self._entries, self._index, self.stale = entries, index, stale
+            self.loaded_at = time.time()
+        return len(entries)
+
+    def keys(self, prompt_version: str) -> set:
+        """Keys already on disk for ``prompt_version`` (read straight from the file)."""
+        if not os.path.exists(self.path):
+            return set()
+        conn = self._connect()
+        try:
+            return {k for (k,) in conn.execute("SELECT key FROM ideas WHERE prompt_version = ?", (prompt_version,))}
+        finally:
+            conn.close()
+
+    def write(self, prompt_version: str, items: Iterable[Tuple[str, dict]]) -> int:
+        """Insert or replace (description, ideas) pairs on disk; the in-memory copy is untouched."""
+        now = time.time()
+        rows = [
+            (
+                ideas_cache_key(description, prompt_version),
+                prompt_version,
+                description,
+                zlib.compress(json.dumps(ideas, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9),
+                now,
+            )
+            for description, ideas in items
+        ]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ideas (key, prompt_version, description, payload, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+    def get(self, key: str, description: str) -> Optional[dict]:
+        """Ideas stored under ``key``, else those of a description at least ``threshold`` similar."""
+        if not self._entries:
+            return None
+        found = self._entries.get(key)
+        if found is not None:
+            return self._count(found, "exact")
+        best = self._index.search(description, 1)
+        if best and best[0][0] >= self.threshold:
+            return self._count(self._entries.get(best[0][1]), "similar")
+        return self._count(None, "miss")
+
+    def nearest(self, description: str) -> Optional[dict]:
+        """The closest entry regardless of threshold (offline mode), or None when nothing shares a band."""
+        if not self._entries:
+            return None
+        found = self._entries.get(ideas_cache_key(description, self.prompt_version or ""))
+        if found is None:
+            best = self._index.search(description, 1)
+            found = self._entries.get(best[0][1]) if best else None
+        return found
+
+    def _count(self, found: Optional[dict], outcome: str) -> Optional[dict]:
+        if found is None:
+            self.misses += 1
+            LOOKUPS_TOTAL.inc(outcome="miss")
+        else:
+            self.hits += 1
+            LOOKUPS_TOTAL.inc(outcome=outcome)
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.idea_library,
+            "path": self.path,
+            "entries": len(self),
+            "stale_entries": self.stale,
+            "prompt_version": self.prompt_version,
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+idea_library = IdeaLibrary(settings.idea_library_path, settings.similar_threshold)
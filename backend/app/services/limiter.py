@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from ..config import settings
+from .telemetry import metrics, record
+
+SHED_TOTAL = metrics.counter("diy_limiter_shed_total", "Upstream calls rejected with 503 before being sent, by reason")
+DECREASE_TOTAL = metrics.counter("diy_limiter_decrease_total", "Multiplicative limit decreases, by cause")
+
+# Queue priority of the upstream calls made in this context: 0 (idea-only requests) goes first.
+# Set by the request scheduler for the request class being served.
+upstream_priority: ContextVar[int] = ContextVar("diy_upstream_priority", default=0)
+
+
+class Saturated(HTTPException):
+    """Shed locally before reaching the provider; retrying only adds load."""
+
+
+class UpstreamBusy(HTTPException):
+    """The provider throttled the call (429); ``retry_after`` is its hint in seconds."""
+
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} is rate limiting requests, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.retry_after = retry_after
+
+
+class Slot:
+    """One admitted upstream call; report how it went with ``overloaded()`` or leave it as a success."""
+
+    def __init__(self):
+        self.overload: Optional[str] = None
+        self.ignored = False
+
+    def overloaded(self, cause: str) -> None:
+        self.overload = cause
+
+    def observe_status(self, code: int) -> None:
+        """Classify an HTTP answer: 429/5xx are overload, other errors are not learned from."""
+        if code == 429 or code >= 500:
+            self.overloaded("429" if code == 429 else "5xx")
+        elif code >= 400:
+            self.ignore()
+
+    def ignore(self) -> None:
+        """Don't learn from this call (client-side errors, cancellations)."""
+        self.ignored = True
+
+
+class _Waiters:
+    """Callers waiting for a slot, by priority (lowest number first) and FIFO within a priority.
+
+    Every ``SHARE``-th grant goes to the lowest-priority caller waiting
+    instead, so a steady stream of urgent calls can't starve the rest.
+    """
+
+    SHARE = 4
+
+    def __init__(self):
+        self._levels: Dict[int, Deque[asyncio.Future]] = {}
+        self._grants = 0
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._levels.values())
+
+    def append(self, fut: asyncio.Future, priority: int = 0) -> None:
+        self._levels.setdefault(priority, deque()).append(fut)
+
+    def popleft(self) -> asyncio.Future:
+        levels = sorted(p for p, q in self._levels.items() if q)
+        if not levels:
+            raise IndexError("pop from an empty waiter queue")
+        self._grants += 1
+        level = levels[-1] if len(levels) > 1 and self._grants % self.SHARE == 0 else levels[0]
+        return self._levels[level].popleft()
+
+    def remove(self, fut: asyncio.Future) -> None:
+        for queue in self._levels.values():
+            try:
+                queue.remove(fut)
+                return
+            except ValueError:
+                pass
+        raise ValueError("not waiting")
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one upstream provider, with a bounded, deadline-aware wait queue.
+
+    The limit grows by ~1 per limit's worth of successful calls while it is
+    actually being used, and is cut by ``backoff`` when the provider signals
+    overload (429/5xx/timeouts) or its latency drifts well above the observed
+    baseline, at most once per latency window so a burst of failures from the
+    same moment counts once. Callers that can't get a slot wait in a queue
+    ordered by ``upstream_priority`` (FIFO within a priority); they are shed
+    with 503 + Retry-After when the queue is full, when they have waited
+    ``queue_timeout``, or when their deadline is too close to fit a typical
+    call.
+
+    Thread-safe, and safe to share between event loops (each in its own
+    thread): a slot freed on one loop is granted to a waiter on another
+    through that waiter's loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        backoff: float = 0.5,
+        latency_tolerance: Optional[float] = 3.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.inflight = 0
+        self.baseline: Optional[float] = None  # slow-rising floor of observed latency
+        self.latency: Optional[float] = None  # EWMA of observed latency
+        self.shed = 0
+        self._last_decrease = 0.0
+        self._waiters = _Waiters()
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None) -> AsyncIterator[Slot]:
+        """Admit one call; ``deadline`` is a ``time.monotonic()`` instant the call must finish by."""
+        queued = time.monotonic()
+        await self._acquire(deadline)
+        started = time.monotonic()
+        record(f"{self.name}.queue", started - queued)
+        slot = Slot()
+        try:
+            yield slot
+        except asyncio.CancelledError:
+            slot.ignore()
+            raise
+        except Exception:
+            # Transport errors count as overload unless the caller already classified the call.
+            if slot.overload is None and not slot.ignored:
+                slot.overloaded("error")
+            raise
+        finally:
+            self._release(slot, time.monotonic() - started)
+
+    def signal_overload(self, cause: str) -> None:
+        """Overload seen outside an admitted call (e.g. a 429 on a status poll)."""
+        with self._lock:
+            self._learn(0.0, cause)
+
+    def retry_after(self) -> int:
+        """Seconds until a new caller would plausibly get a slot."""
+        per_call = self.latency or 1.0
+        backlog = (len(self._waiters) + 1) / max(self.limit, 1.0)
+        return max(1, min(60, math.ceil(per_call * backlog)))
+
+    def _shed(self, reason: str) -> Saturated:
+        self.shed += 1
+        SHED_TOTAL.inc(provider=self.name, reason=reason)
+        return Saturated(
+            status_code=503,
+            detail=f"{self.name} is saturated, try again later",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def _acquire(self, deadline: Optional[float]) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.inflight < int(self.limit) and not self._waiters:
+                self.inflight += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise self._shed("queue_full")
+            wait = self.queue_timeout
+            if deadline is not None:
+                # No point queueing for a call that can't finish before the caller's deadline.
+                wait = min(wait, deadline - time.monotonic() - (self.latency or 0.0))
+                if wait <= 0:
+                    raise self._shed("deadline")
+            fut = loop.create_future()
+            self._waiters.append(fut, upstream_priority.get())
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if fut.done() and not fut.cancelled():
+                    # Granted just as we gave up: hand the slot back.
+                    self.inflight -= 1
+                    self._wake_locked()
+                else:
+                    fut.cancel()
+                    try:
+                        self._waiters.remove(fut)
+                    except ValueError:
+                        pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout")
+            raise
+
+    def _release(self, slot: Slot, elapsed: float) -> None:
+        with self._lock:
+            self.inflight -= 1
+            if not slot.ignored:
+                self._learn(elapsed, slot.overload)
+            self._wake_locked()
+
+    def _learn(self, elapsed: float, overload: Optional[str]) -> None:
+        now = time.monotonic()
+        if overload is None:
+            self.latency = elapsed if self.latency is None else self.latency * 0.8 + elapsed * 0.2
+            if self.baseline is None or elapsed < self.baseline:
+                self.baseline = elapsed
+            else:
+                self.baseline += (elapsed - self.baseline) * 0.01
+            tolerance = self.latency_tolerance
+            if tolerance is not None and self.latency > self.baseline * tolerance and self.latency > 0.05:
+                overload = "latency"
+            elif self.inflight + 1 >= int(self.limit) * 0.8:
+                # Additive increase, only while the current limit is actually in use.
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                return
+            else:
+                return
+        window = max(self.latency or 0.0, 0.05)
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        DECREASE_TOTAL.inc(provider=self.name, cause=overload)
+
+    def _wake_locked(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.inflight += 1
+            loop = fut.get_loop()
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if loop is running:
+                fut.set_result(None)
+            else:
+                loop.call_soon_threadsafe(_grant, fut, self)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "shed": self.shed,
+            "latency_ewma": round(self.latency, 4) if self.latency is not None else None,
+            "latency_baseline": round(self.baseline, 4) if self.baseline is not None else None,
+        }
+
+
+def _grant(fut: asyncio.Future, limiter: AdaptiveLimiter) -> None:
+    if fut.done():
+        # The waiter gave up in the meantime; return the slot.
+        with limiter._lock:
+            limiter.inflight -= 1
+            limiter._wake_locked()
+        return
+    fut.set_result(None)
+
+
+def upstream_busy(provider: str, retry_after: Optional[str]) -> UpstreamBusy:
+    """503 for a provider that throttled us, passing its Retry-After through when it sent one."""
+    return UpstreamBusy(provider, int(retry_after) if retry_after and retry_after.isdigit() else 5)
+
+
+gemini_limiter = AdaptiveLimiter(
+    "gemini",
+    initial=settings.gemini_limit_initial,
+    min_limit=1,
+    max_limit=settings.gemini_max_concurrency,
+    max_queue=settings.gemini_queue_size,
+    queue_timeout=settings.gemini_queue_timeout,
+    # Generation latency varies with output length, so only a large drift counts as overload.
+    latency_tolerance=5.0,
+)
+tripo_limiter = AdaptiveLimiter(
+    "tripo",
+    initial=settings.tripo_limit_initial,
+    min_limit=1,
+    max_limit=settings.tripo_max_concurrency,
+    max_queue=settings.tripo_queue_size,
+    queue_timeout=settings.tripo_queue_timeout,
+)
+
+_LIMITERS: Dict[str, AdaptiveLimiter] = {"gemini": gemini_limiter, "tripo": tripo_limiter}
+
+
+def _gauge(field: str):
+    return lambda: {(("provider", name),): float(lim.stats()[field] or 0) for name, lim in _LIMITERS.items()}
+
+
+metrics.gauge("diy_limiter_limit", "Current adaptive concurrency limit", _gauge("limit"))
+metrics.gauge("diy_limiter_inflight", "Upstream calls in flight", _gauge("inflight"))
+metrics.gauge("diy_limiter_queued", "Calls waiting for a concurrency slot", _gauge("queued"))
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an attempt count and an overall deadline."""
+
+    attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    deadline: float = 90.0  # seconds for all attempts and waits together
+
+    def delay(self, retry: int, hint: Optional[float] = None) -> float:
+        """Sleep before retry number ``retry`` (1-based); ``hint`` is a server Retry-After to respect."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry - 1)))
+        delay = random.uniform(0, ceiling)
+        return max(delay, hint) if hint is not None else delay
+
+
+class LatencyTracker:
+    """Quantiles over the most recent ``window`` successful call latencies."""
+
+    def __init__(self, window: int = 512):
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._recent.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            ordered: List[float] = sorted(self._recent)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgeBudget:
+    """Caps hedged (duplicate) requests at a fraction of primary requests."""
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self.primaries = 0
+        self.hedges = 0
+
+    def primary(self) -> None:
+        self.primaries += 1
+
+    def try_spend(self) -> bool:
+        # Allow a little slack at the start so the first slow call can still hedge.
+        if self.hedges + 1 > self.ratio * self.primaries + 1:
+            return False
+        self.hedges += 1
+        return True
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import statistics
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from fastapi import Request
+
+from ..config import settings
+from .limiter import Saturated, upstream_priority
+from .telemetry import metrics, record
+
+# Admission in front of the upstream services, by request class. Idea-only
+# requests ("ideas": one Gemini call, ~1s) and 3D requests ("model": a Tripo
+# task of a minute or more) get separate concurrency pools and wait queues,
+# so a burst of 3D work can't hold the slots cheap requests need, and the
+# Gemini calls of idea-only requests are queued ahead of those of 3D requests
+# (limiter.upstream_priority). Inside a queue, waiting clients (API key or IP,
+# SCHED_FAIR_BY) are served round-robin rather than in arrival order.
+
+SHED_TOTAL = metrics.counter("diy_sched_shed_total", "Requests rejected by the scheduler, by request class and reason")
+WAIT_SECONDS = metrics.histogram("diy_sched_wait_seconds", "Time admitted requests waited in the scheduler queue")
+
+
+class Ticket:
+    """One admitted request holding a slot of its queue; ``release()`` may be called more than once."""
+
+    def __init__(self, queue: "RequestQueue"):
+        self.queue = queue
+        self.admitted = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.queue._release(time.monotonic() - self.admitted)
+
+
+class RequestQueue:
+    """Concurrency pool and bounded wait queue for one request class, fair between clients.
+
+    Requests beyond ``concurrency`` wait; each client has its own FIFO and
+    free slots go round-robin over the clients waiting, so one client's burst
+    only delays that client. A request is shed with 503 + Retry-After when the
+    queue holds ``max_queue`` requests, when its client already has
+    ``client_max_queued`` waiting, or after ``queue_timeout`` seconds.
+
+    Lives on the server's event loop; not thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        client_max_queued: int,
+    ):
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_max_queued = client_max_queued
+        self.inflight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self._clients: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._service: Deque[float] = deque(maxlen=64)  # seconds recent requests held their slot
+
+    @asynccontextmanager
+    async def admit(self, client: str = "") -> AsyncIterator[Ticket]:
+        """Hold a slot of this queue, with upstream calls made at its priority, for the ``async with`` body."""
+        ticket = await self.acquire(client)
+        token = upstream_priority.set(self.priority)
+        try:
+            yield ticket
+        finally:
+            upstream_priority.reset(token)
+            ticket.release()
+
+    async def acquire(self, client: str = "") -> Ticket:
+        """Wait for a slot; the caller must ``release()`` the ticket (for responses that outlive the handler)."""
+        queued = time.monotonic()
+        if self.inflight < self.concurrency and not self.queued:
+            return self._admit(0.0)
+        if self.queued >= self.max_queue:
+            raise self._shed("queue_full")
+        waiting = self._clients.get(client)
+        if client and waiting is not None and len(waiting) >= self.client_max_queued:
+            raise self._shed("client_queue_full")
+        fut = asyncio.get_running_loop().create_future()
+        if waiting is None:
+            waiting = self._clients[client] = deque()
+        waiting.append(fut)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # Granted just as we gave up: hand the slot back.
+                self.inflight -= 1
+                self._wake()
+            else:
+                fut.cancel()
+                self._withdraw(client, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout")
+            raise
+        return self._admit(time.monotonic() - queued, granted=True)
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would plausibly be admitted."""
+        per_request = statistics.median(self._service) if self._service else 1.0
+        backlog = (self.queued + 1) / max(self.concurrency, 1)
+        return max(1, min(60, math.ceil(per_request * backlog)))
+
+    def _admit(self, waited: float, granted: bool = False) -> Ticket:
+        if not granted:
+            self.inflight += 1
+        self.admitted += 1
+        WAIT_SECONDS.observe(waited, request_class=self.name)
+        record(f"sched.{self.name}.queue", waited)
+        return Ticket(self)
+
+    def _shed(self, reason: str) -> Saturated:
+        self.shed += 1
+        SHED_TOTAL.inc(request_class=self.name, reason=reason)
+        return Saturated(
+            status_code=503,
+            detail=f"too many {self.name} requests waiting, try again later",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    def _withdraw(self, client: str, fut: asyncio.Future) -> None:
+        waiting = self._clients.get(client)
+        if waiting is None:
+            return
+        try:
+            waiting.remove(fut)
+        except ValueError:
+            return
+        self.queued -= 1
+        if not waiting:
+            del self._clients[client]
+
+    def _release(self, held: float) -> None:
+        self.inflight -= 1
+        self._service.append(held)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._clients and self.inflight < self.concurrency:
+            client, waiting = next(iter(self._clients.items()))
+            fut = waiting.popleft()
+            self.queued -= 1
+            if waiting:
+                # This client had its turn: the next slot goes to the next client in line.
+                self._clients.move_to_end(client)
+            else:
+                del self._clients[client]
+            if fut.done():
+                continue
+            self.inflight += 1
+            fut.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "clients_waiting": len(self._clients),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "retry_after": self.retry_after(),
+        }
+
+
+def client_key(request: Request) -> str:
+    """Who a request counts against for fair share: API key or IP per SCHED_FAIR_BY, "" when off."""
+    if not settings.sched_fair_by:
+        return ""
+    if settings.sched_fair_by == "key":
+        credential = request.headers.get("x-api-key") or ""
+        auth = request.headers.get("authorization") or ""
+        if not credential and auth.lower().startswith("bearer "):
+            credential = auth[7:].strip()
+        if credential:
+            # Keys are only compared, never shown; don't keep them in memory or /health.
+            return "key:" + hashlib.sha256(credential.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+ideas_queue = RequestQueue(
+    "ideas",
+    priority=0,
+    concurrency=settings.sched_ideas_concurrency,
+    max_queue=settings.sched_ideas_queue,
+    queue_timeout=settings.sched_ideas_queue_timeout,
+    client_max_queued=settings.sched_client_max_queued,
+)
+model_queue = RequestQueue(
+    "model",
+    priority=1,
+    concurrency=settings.sched_model_concurrency,
+    max_queue=settings.sched_model_queue,
+    queue_timeout=settings.sched_model_queue_timeout,
+    client_max_queued=settings.sched_client_max_queued,
+)
+
+QUEUES: Dict[str, RequestQueue] = {"ideas": ideas_queue, "model": model_queue}
+
+
+def queue_for(generate_model: bool) -> RequestQueue:
+    return model_queue if generate_model else ideas_queue
+
+
+def stats() -> dict:
+    return {"fair_by": settings.sched_fair_by or None, **{name: q.stats() for name, q in QUEUES.items()}}
+
+
+def _gauge(field: str):
+    return lambda: {(("request_class", name),): float(q.stats()[field]) for name, q in QUEUES.items()}
+
+
+metrics.gauge("diy_sched_queue_depth", "Requests waiting for admission, by request class", _gauge("queued"))
+metrics.gauge("diy_sched_inflight", "Admitted requests in progress, by request class", _gauge("inflight"))
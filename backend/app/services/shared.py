@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse
+
+from ..config import settings
+
+# State shared by the workers of one deployment (WORKERS > 1): result cache,
+# cross-worker coalescing leases, job state and worker heartbeats. The store
+# speaks a small Redis subset (GET, SET with EX/NX, DEL) so a Redis server can
+# back it; ``sqlite:///path`` is the local stand-in for a single host. Request
+# paths use the async methods (aget/aset/adelete): a store round trip, or a
+# wait for the SQLite write lock, must not stall the worker's event loop.
+
+# Identifies this process in leases and job ownership.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SharedStore:
+    """String key/value store with per-key expiry, safe to use from several processes.
+
+    The sync methods block; the async ones run them on the store's own
+    thread, one at a time and in submission order (``submit`` queues a write
+    there without waiting for it).
+    """
+
+    backend = "none"
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"shared-{self.backend}")
+        return self._executor.submit(fn, *args, **kwargs)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.wrap_future(self.submit(self.get, key))
+
+    async def aset(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        return await asyncio.wrap_future(self.submit(self.set, key, value, ex, nx))
+
+    async def adelete(self, key: str) -> int:
+        return await asyncio.wrap_future(self.submit(self.delete, key))
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        """Store ``value`` (expiring after ``ex`` seconds); with ``nx`` only if the key is absent. True if stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def aclose(self) -> None:
+        """Finish queued writes and close, off the event loop."""
+        await asyncio.to_thread(self.close)
+
+
+class SQLiteStore(SharedStore):
+    """SharedStore on a SQLite file in WAL mode: every worker on the host opens the same file."""
+
+    backend = "sqlite"
+
+    # Expired rows are purged on every this many writes.
+    _PURGE_EVERY = 512
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        now = time.time()
+        expires_at = now + ex if ex is not None else None
+        with self._lock:
+            if nx:
+                # Take the key only if it is absent or expired (an atomic upsert, so two workers can't both win).
+                cur = self._conn.execute(
+                    "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE"
+                    " SET value = excluded.value, expires_at = excluded.expires_at"
+                    " WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+                    (key, value, expires_at, now),
+                )
+                stored = cur.rowcount > 0
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+                )
+                stored = True
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        return stored
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStore(SharedStore):
+    """SharedStore on a Redis (or Redis-protocol) server; needs the optional ``redis`` package.
+
+    The async methods use ``redis.asyncio`` directly instead of a thread.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as e:  # pragma: no cover - optional dependency
+            raise RuntimeError(f"SHARED_STORE_URL={url} needs the 'redis' package: {e}")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._aredis = redis.asyncio.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        px = max(1, int(ex * 1000)) if ex is not None else None
+        return bool(self._redis.set(key, value, px=px, nx=nx))
+
+    def delete(self, key: str) -> int:
+        return int(self._redis.delete(key))
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await self._aredis.get(key)
+
+    async def aset(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        px = max(1, int(ex * 1000)) if ex is not None else None
+        return bool(await self._aredis.set(key, value, px=px, nx=nx))
+
+    async def adelete(self, key: str) -> int:
+        return int(await self._aredis.delete(key))
+
+    def close(self) -> None:
+        super().close()
+        self._redis.close()
+
+    async def aclose(self) -> None:
+        await self._aredis.aclose()
+        await super().aclose()
+
+
+def build_shared_store(url: str) -> Optional[SharedStore]:
+    """``sqlite:///relative.db``, ``sqlite:////abs/path.db``, ``redis://host:6379/0``; empty means none."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteStore(url[len("sqlite:///"):])
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url)
+    raise ValueError(f"SHARED_STORE_URL: unsupported scheme {parsed.scheme!r}")
+
+
+shared_store = build_shared_store(settings.shared_store_url)
+
+
+async def worker_alive(worker_id: str) -> bool:
+    if worker_id == WORKER_ID:
+        return True
+    return shared_store is not None and await shared_store.aget(f"worker:{worker_id}") is not None
+
+
+async def heartbeat(interval: float = 5.0) -> None:
+    """Keep ``worker:<WORKER_ID>`` alive in the shared store so other workers know our jobs are running."""
+    key = f"worker:{WORKER_ID}"
+    try:
+        while True:
+            await shared_store.aset(key, str(time.time()), interval * 3)
+            await asyncio.sleep(interval)
+    finally:
+        await shared_store.adelete(key)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+from .cache import normalize_description
+from .telemetry import metrics
+
+# Near-duplicate lookup over past descriptions: MinHash signatures of character
+# n-grams, banded into LSH tables kept as sorted arrays of packed integers, and
+# an exact Jaccard check on the few best candidates.
+
+LOOKUPS_TOTAL = metrics.counter("diy_similar_lookups_total", "Near-duplicate description lookups, by outcome")
+
+_HASHES = 24  # one 48-byte BLAKE2b digest per n-gram gives all 24 (16-bit) MinHash values
+_BANDS = 8
+_ROWS = _HASHES // _BANDS  # 3 rows: a pair at 0.7 Jaccard shares a band with p ~ 0.97
+_SLOT_BITS = 20  # low bits of a band entry: slot index (so at most ~1M entries)
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+_BAND_MASK = (1 << (64 - _SLOT_BITS)) - 1
+_BUCKET_SCAN = 64  # entries read per band bucket; very common buckets are sampled
+_VERIFY = 8  # candidates checked with exact Jaccard
+
+# Spelled-out units, longest first, so "1.5リットル" and "1.5L" shingle alike.
+_UNITS = [
+    ("ミリリットル", "ml"),
+    ("リットル", "l"),
+    ("センチメートル", "cm"),
+    ("ミリメートル", "mm"),
+    ("センチ", "cm"),
+    ("キログラム", "kg"),
+    ("グラム", "g"),
+]
+
+
+_DROP = str.maketrans("", "", "、。・,!?「」()[]")
+
+
+def canonical(text: str) -> str:
+    """normalize_description plus unit spellings unified, punctuation and spaces dropped."""
+    out = normalize_description(text).translate(_DROP)
+    for spelled, unit in _UNITS:
+        out = out.replace(spelled, unit)
+    return "".join(out.split())
+
+
+def _ngrams(t: str) -> Set[str]:
+    n = 3 if len(t.encode("ascii", "ignore")) * 2 > len(t) else 2
+    if len(t) <= n:
+        return {t} if t else set()
+    return {t[i : i + n] for i in range(len(t) - n + 1)}
+
+
+def shingles(text: str) -> Set[str]:
+    """Character n-grams of the canonical text: bigrams for Japanese, trigrams for mostly-ASCII text."""
+    return _ngrams(canonical(text))
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def _band_keys(grams: Set[str]) -> List[int]:
+    # Column-wise minimum over per-gram digests read as 24 uint16 each: the MinHash signature.
+    sig = list(map(min, zip(*[array("H", hashlib.blake2b(g.encode("utf-8"), digest_size=48).digest()) for g in grams])))
+    return [hash(tuple(sig[i : i + _ROWS])) & _BAND_MASK for i in range(0, _HASHES, _ROWS)]
+
+
+class SimilarityIndex:
+    """Bounded near-duplicate index from description to result-cache key.
+
+    Entries live in ``capacity`` slots reused oldest-first. Each LSH band is a
+    sorted ``array('Q')`` of ``band_hash << 20 | slot``, so a bucket is one
+    bisect plus a short scan, and the whole index stays a few flat arrays
+    (~70 bytes per entry plus the canonical text and key).
+    """
+
+    def __init__(self, capacity: int, threshold: float):
+        if capacity >= 1 << _SLOT_BITS:
+            raise ValueError(f"capacity must be below {1 << _SLOT_BITS}")
+        self.capacity = max(1, capacity)
+        self.threshold = threshold
+        self._bands = [array("Q") for _ in range(_BANDS)]
+        self._slot_bands = array("Q", bytes(8 * _BANDS * self.capacity))
+        self._texts: List[Optional[str]] = [None] * self.capacity
+        self._keys: List[Optional[str]] = [None] * self.capacity
+        self._slot_of: Dict[str, int] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def add(self, description: str, key: str) -> None:
+        """Remember that ``key`` holds the result generated for ``description``."""
+        grams = shingles(description)
+        if not grams or key in self._slot_of:
+            return
+        bands = _band_keys(grams)
+        with self._lock:
+            if key in self._slot_of:
+                return
+            slot = self._next
+            self._next = (slot + 1) % self.capacity
+            self._clear_locked(slot)
+            self._texts[slot] = canonical(description)
+            self._keys[slot] = key
+            self._slot_of[key] = slot
+            for band, table in zip(bands, self._bands):
+                insort(table, band << _SLOT_BITS | slot)
+            self._slot_bands[slot * _BANDS : (slot + 1) * _BANDS] = array("Q", bands)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            slot = self._slot_of.get(key)
+            if slot is not None:
+                self._clear_locked(slot)
+
+    def _clear_locked(self, slot: int) -> None:
+        key = self._keys[slot]
+        if key is None:
+            return
+        for band, table in zip(self._slot_bands[slot * _BANDS : (slot + 1) * _BANDS], self._bands):
+            packed = band << _SLOT_BITS | slot
+            i = bisect_left(table, packed)
+            if i < len(table) and table[i] == packed:
+                del table[i]
+        del self._slot_of[key]
+        self._keys[slot] = self._texts[slot] = None
+
+    def search(self, description: str, k: int = 1) -> List[Tuple[float, str]]:
+        """Top-``k`` (Jaccard similarity, key) among candidates sharing an LSH band, best first."""
+        grams = shingles(description)
+        if not grams:
+            return []
+        bands = _band_keys(grams)
+        votes: Counter = Counter()
+        with self._lock:
+            for band, table in zip(bands, self._bands):
+                i = bisect_left(table, band << _SLOT_BITS)
+                j = bisect_left(table, (band + 1) << _SLOT_BITS, i, min(len(table), i + _BUCKET_SCAN))
+                votes.update([packed & _SLOT_MASK for packed in table[i:j]])
+            candidates = [(self._texts[s], self._keys[s]) for s, _ in votes.most_common(_VERIFY) if self._keys[s]]
+        scored = sorted(((jaccard(grams, _ngrams(text)), key) for text, key in candidates), reverse=True)
+        return scored[:k]
+
+    def lookup(self, description: str) -> Optional[Tuple[float, str]]:
+        """Best match at or above the threshold, or None."""
+        best = self.search(description, 1)
+        if best and best[0][0] >= self.threshold:
+            self.hits += 1
+            LOOKUPS_TOTAL.inc(outcome="hit")
+            return best[0]
+        self.misses += 1
+        LOOKUPS_TOTAL.inc(outcome="miss")
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.similar_lookup,
+            "entries": len(self),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+similar_index = SimilarityIndex(settings.similar_index_max_entries, settings.similar_threshold)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from ..config import settings
+from .gemini_registry import registry as gemini_registry
+from .http import get_client
+from .telemetry import metrics
+
+# Startup sequence and readiness. The lifespan runs the local steps (config,
+# pools, on-disk stores) before the worker listens; the network steps (Gemini
+# SDK import and model resolution, first connections to Gemini and Tripo) run
+# in the background afterwards, and /ready answers 503 until they are done.
+
+
+@dataclass
+class Check:
+    ok: bool
+    detail: str = ""
+    seconds: float = 0.0
+    # A failed required check keeps the worker out of rotation; others only report.
+    required: bool = False
+
+    def as_dict(self) -> dict:
+        return {"ok": self.ok, "detail": self.detail, "seconds": round(self.seconds, 3), "required": self.required}
+
+
+class Startup:
+    def __init__(self):
+        self.began = time.monotonic()
+        self.checks: Dict[str, Check] = {}
+        self.listening_after: Optional[float] = None
+        self.warm_after: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def step(self, name: str, required: bool = False) -> Iterator[Check]:
+        """Time a step; an exception marks it failed (and is re-raised only for required steps)."""
+        check = Check(ok=True, required=required)
+        started = time.perf_counter()
+        try:
+            yield check
+        except Exception as e:
+            check.ok = False
+            check.detail = str(getattr(e, "detail", e)) or type(e).__name__
+            if required:
+                raise
+        finally:
+            check.seconds = time.perf_counter() - started
+            self.checks[name] = check
+
+    def listening(self) -> None:
+        self.listening_after = time.monotonic() - self.began
+
+    @property
+    def warm(self) -> bool:
+        return self.warm_after is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.warm and all(c.ok for c in self.checks.values() if c.required)
+
+    def start_warmup(self) -> None:
+        self.task = asyncio.create_task(self._warmup(), name="startup-warmup")
+
+    async def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def _warmup(self) -> None:
+        steps = []
+        if settings.startup_warmup:
+            if not settings.mock_gemini and settings.gemini_api_key:
+                steps.append(self._warm_gemini())
+            if not settings.mock_tripo and settings.tripo_api_base:
+                steps.append(self._warm_tripo())
+        try:
+            await asyncio.wait_for(asyncio.gather(*steps), timeout=settings.startup_timeout)
+        except asyncio.TimeoutError:
+            self.checks["warmup"] = Check(ok=False, detail=f"timed out after {settings.startup_timeout}s")
+        self.warm_after = time.monotonic() - self.began
+
+    async def _warm_gemini(self) -> None:
+        with self.step("gemini_sdk"):
+            await asyncio.to_thread(gemini_registry.load_sdk)
+        with self.step("gemini_model") as check:
+            resolved = await asyncio.to_thread(gemini_registry.get)
+            check.detail = resolved.full_name + (f" (listing failed: {resolved.listing_error})" if resolved.listing_error else "")
+        # One cheap authenticated call opens the pooled connection and checks the key.
+        with self.step("gemini_connection") as check:
+            resp = await _first_request(
+                "gemini",
+                f"{settings.gemini_api_endpoint.rstrip('/')}/v1beta/models",
+                params={"pageSize": 1},
+                headers={"x-goog-api-key": settings.gemini_api_key or ""},
+            )
+            if resp is not None:
+                check.detail = f"HTTP {resp.status_code}"
+                if resp.status_code in (401, 403):
+                    # The key is rejected: every request would fail, unlike a network blip.
+                    check.ok, check.required = False, True
+
+    async def _warm_tripo(self) -> None:
+        # Any answer will do: the point is the TCP/TLS handshake before the first upload.
+        with self.step("tripo_connection") as check:
+            resp = await _first_request("tripo", settings.tripo_api_base)
+            if resp is not None:
+                check.detail = f"HTTP {resp.status_code}"
+
+    def stats(self) -> dict:
+        missing = []
+        if not settings.mock_gemini and not settings.gemini_api_key:
+            missing.append("GEMINI_API_KEY")
+        if not settings.mock_tripo and not (settings.tripo_api_key and settings.tripo_api_base):
+            missing.append("TRIPO_API_KEY/TRIPO_API_BASE")
+        return {
+            "ready": self.ready,
+            "listening_after_seconds": _round(self.listening_after),
+            "warm_after_seconds": _round(self.warm_after),
+            "unconfigured": missing,
+            "checks": {name: c.as_dict() for name, c in self.checks.items()},
+        }
+
+
+async def _first_request(client_name: str, url: str, **kwargs):
+    client = get_client(client_name)
+    if client is None:
+        return None
+    return await client.get(url, **kwargs)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+startup = Startup()
+
+STEP_SECONDS = metrics.gauge(
+    "diy_startup_step_seconds",
+    "Duration of each startup step",
+    lambda: {(("step", name),): c.seconds for name, c in startup.checks.items()},
+)
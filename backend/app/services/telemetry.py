@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# In-process metrics and request tracing. No external collector: /metrics renders
+# the registry in Prometheus text format and the middleware adds Server-Timing.
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in items]
+
+
+class Gauge:
+    """Point-in-time value; either set explicitly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._fn = fn
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[_labels(labels)] = value
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        if self._fn is not None:
+            try:
+                values.update(self._fn())
+            except Exception:
+                pass
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', repr(bound))])} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name: str, help: str, fn: Optional[Callable[[], Dict[LabelKey, float]]] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, fn)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def render(self) -> str:
+        out = []
+        for metric in self._metrics.values():
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.samples())
+        return "\n".join(out) + "\n"
+
+
+metrics = MetricsRegistry()
+
+PHASE_SECONDS = metrics.histogram("diy_phase_seconds", "Duration of generate pipeline phases")
+REQUEST_SECONDS = metrics.histogram("diy_request_seconds", "End-to-end HTTP request duration")
+BYTES_SENT = metrics.counter("diy_upstream_bytes_sent_total", "Request bytes sent to upstream APIs, by upstream and kind")
+REQUEST_UPSTREAM_BYTES = metrics.histogram(
+    "diy_request_upstream_bytes", "Bytes sent upstream on behalf of one HTTP request", BYTE_BUCKETS
+)
+
+
+class Trace:
+    """Spans recorded while serving one request (shared by the tasks it spawns)."""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.bytes_sent = 0
+
+    def server_timing(self) -> str:
+        totals: Dict[str, List[float]] = {}
+        for name, dur in self.spans:
+            t = totals.setdefault(name, [0.0, 0])
+            t[0] += dur
+            t[1] += 1
+        parts = []
+        for name, (dur, count) in totals.items():
+            token = name.replace(".", "-")
+            desc = f';desc="x{count}"' if count > 1 else ""
+            parts.append(f"{token};dur={dur * 1000:.1f}{desc}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("diy_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def record(name: str, seconds: float, trace: Optional[Trace] = None) -> None:
+    """Observe a phase duration; ``trace`` overrides the context's trace for work done on a request's behalf."""
+    PHASE_SECONDS.observe(seconds, phase=name)
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.spans.append((name, seconds))
+
+
+def count_sent(upstream: str, kind: str, n: int, trace: Optional[Trace] = None) -> None:
+    """Count request bytes sent upstream, globally and against the current request."""
+    BYTES_SENT.inc(n, upstream=upstream, kind=kind)
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.bytes_sent += n
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a pipeline phase into the phase histogram and the current request's trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: one Trace per request, Server-Timing and X-Upstream-Bytes headers, request histograms."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _current.set(trace)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total = time.perf_counter() - started
+                value = trace.server_timing()
+                value = f"{value}, total;dur={total * 1000:.1f}" if value else f"total;dur={total * 1000:.1f}"
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", value.encode())]
+                if trace.bytes_sent:
+                    message["headers"].append((b"x-upstream-bytes", str(trace.bytes_sent).encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route=path, status=str(status["code"]))
+            if trace.bytes_sent:
+                REQUEST_UPSTREAM_BYTES.observe(trace.bytes_sent, route=path)
@@ -1,24 +1,340 @@
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 
 import httpx
 from fastapi import HTTPException
 
 from ..config import settings
+from .http import build_tripo_client, get_client
+from .images import mime_type
+from .limiter import tripo_limiter, upstream_busy
+from .telemetry import Trace, count_sent, current_trace, metrics, record, span
+
+log = logging.getLogger(__name__)
+
+SUCCESS_STATES = {"succeeded", "success", "completed", "done"}
+FAIL_STATES = {"failed", "error", "canceled", "cancelled"}
+
+POLLS_TOTAL = metrics.counter("diy_tripo_polls_total", "Tripo status requests sent, by mode")
+POLLS_PER_TASK = metrics.histogram(
+    "diy_tripo_polls_per_task", "Status polls needed until a Tripo task settled", buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200)
+)
+
+
+def _interpret_status(sjson: dict) -> Optional[dict]:
+    """Map one status payload to a result dict, None while still running, or raise on failure."""
+    status = (
+        sjson.get("status")
+        or sjson.get("state")
+        or sjson.get("data", {}).get("status")
+    )
+
+    # Extract URLs if present
+    model_url = (
+        sjson.get("model_url")
+        or sjson.get("assets", {}).get("glb")
+        or sjson.get("assets", {}).get("obj")
+        or sjson.get("result", {}).get("glb")
+        or sjson.get("result", {}).get("obj")
+        or sjson.get("glb")
+        or sjson.get("obj")
+        or sjson.get("model_glb")
+    )
+    preview_url = (
+        sjson.get("preview_image_url")
+        or sjson.get("preview")
+        or sjson.get("thumbnail")
+    )
+
+    if status and str(status).lower() in FAIL_STATES:
+        detail = sjson.get("message") or sjson
+        raise HTTPException(status_code=502, detail=f"Tripo job failed: {detail}")
+
+    # Some APIs include result before a final status; prioritize explicit success
+    if model_url and (not status or str(status).lower() in SUCCESS_STATES):
+        fmt = (
+            "glb" if str(model_url).endswith(".glb") else (
+                "obj" if str(model_url).endswith(".obj") else sjson.get("format")
+            )
+        )
+        return {"model_url": model_url, "preview_image_url": preview_url, "format": fmt}
+
+    # Not ready yet
+    return None
+
+
+@dataclass
+class _PendingTask:
+    task_id: str
+    status_url: str
+    headers: Dict[str, str]
+    client: httpx.AsyncClient
+    future: "asyncio.Future[dict]"
+    started: float = field(default_factory=time.monotonic)
+    next_poll: float = 0.0
+    polls: int = 0
+    # A status request for this task is in flight; it isn't due again until that one returns.
+    polling: bool = False
+    # Trace of the request that registered the task, so poll iterations show up in its breakdown.
+    trace: Optional[Trace] = None
+
+    def schedule_next(self, now: float) -> None:
+        # Adaptive backoff: young jobs are polled at the base interval, older ones
+        # progressively less often (a fraction of their age), capped at the max interval.
+        age = now - self.started
+        interval = max(settings.tripo_poll_interval, age * settings.tripo_poll_backoff)
+        self.next_poll = now + min(interval, max(settings.tripo_poll_max_interval, settings.tripo_poll_interval))
+
+
+class TripoPoller:
+    """Single background task that polls every pending Tripo task on one schedule.
+
+    Callers register a task id and await a future; each tick polls only the
+    tasks that are due (one batched request per client when
+    TRIPO_BATCH_STATUS_PATH is set, otherwise one GET each, concurrently) and
+    resolves futures as tasks reach a terminal state or their deadline. A
+    tick's requests run in the background, so one slow status reply delays
+    only its own task, and a bad reply fails only its own task.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, _PendingTask] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._rounds: Set[asyncio.Task] = set()
+        self.polls_sent = 0
+        self.batches_sent = 0
+        self.ticks = 0
+
+    async def wait(self, task_id: str, status_url: str, headers: Dict[str, str], client: httpx.AsyncClient) -> dict:
+        self._ensure_running()
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        pending = _PendingTask(task_id, status_url, headers, client, loop.create_future(), started=now, trace=current_trace())
+        pending.next_poll = now + settings.tripo_poll_interval
+        self._pending[task_id] = pending
+        self._wakeup.set()
+        try:
+            with span("tripo.wait"):
+                return await asyncio.wait_for(asyncio.shield(pending.future), timeout=settings.tripo_poll_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Tripo polling timed out")
+        finally:
+            # Covers completion, timeout and caller cancellation alike.
+            self._pending.pop(task_id, None)
+            POLLS_PER_TASK.observe(pending.polls)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "ticks": self.ticks,
+            "polls_sent": self.polls_sent,
+            "batches_sent": self.batches_sent,
+        }
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        tasks = [t for t in (task, *self._rounds) if t is not None and not t.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # Waiters of this loop stay registered; only futures of a previous loop can't be served any more.
+            self._pending = {k: p for k, p in self._pending.items() if p.future.get_loop() is loop}
+            for p in self._pending.values():
+                p.polling = False
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            # Fresh context: the poller must not inherit the trace of whichever request started it.
+            self._task = loop.create_task(self._run(), name="tripo-poller", context=contextvars.Context())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = time.monotonic()
+                due = [
+                    p for p in self._pending.values() if p.next_poll <= now and not p.polling and not p.future.done()
+                ]
+                if due:
+                    self.ticks += 1
+                    for p in due:
+                        p.polling = True
+                    for group in self._groups(due):
+                        task = asyncio.create_task(self._round(group))
+                        self._rounds.add(task)
+                        task.add_done_callback(self._rounds.discard)
+                self._wakeup.clear()
+                upcoming = [p.next_poll for p in self._pending.values() if not p.polling and not p.future.done()]
+                timeout = max(0.0, min(upcoming) - time.monotonic()) if upcoming else None
+            except Exception:
+                # Never let one bad tick stop polling for everyone else.
+                log.exception("tripo poller tick failed")
+                timeout = settings.tripo_poll_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _groups(due: List[_PendingTask]) -> List[List[_PendingTask]]:
+        """Split a tick into rounds that each wait on one status request: a batch per client, else a task each."""
+        if not settings.tripo_batch_status_path:
+            return [[p] for p in due]
+        groups: Dict[int, List[_PendingTask]] = {}
+        for p in due:
+            groups.setdefault(id(p.client), []).append(p)
+        return list(groups.values())
+
+    async def _round(self, due: List[_PendingTask]) -> None:
+        try:
+            await self._poll(due)
+        except Exception as e:
+            log.exception("tripo status poll failed")
+            for p in due:
+                self._fail(p, HTTPException(status_code=502, detail=f"Tripo status request failed: {e}"))
+        finally:
+            now = time.monotonic()
+            for p in due:
+                p.polling = False
+                p.schedule_next(now)
+            self._wakeup.set()
+
+    async def _poll(self, due: List[_PendingTask]) -> None:
+        if settings.tripo_batch_status_path:
+            await self._poll_batch(due)
+        else:
+            await asyncio.gather(*(self._poll_one(p) for p in due))
+
+    async def _poll_one(self, p: _PendingTask) -> None:
+        self.polls_sent += 1
+        POLLS_TOTAL.inc(mode="single")
+        p.polls += 1
+        started = time.perf_counter()
+        try:
+            sresp = await p.client.get(p.status_url, headers=p.headers)
+            if sresp.status_code == 429:
+                # Throttled: keep the task pending (the next poll is already backed off) and tell the limiter.
+                tripo_limiter.signal_overload("429")
+                return
+            sresp.raise_for_status()
+            sjson = sresp.json()
+        except httpx.HTTPStatusError as e:
+            self._fail(p, HTTPException(status_code=e.response.status_code, detail=f"Tripo status error: {e.response.text}"))
+            return
+        except ValueError:
+            self._fail(p, HTTPException(status_code=502, detail=f"Tripo status reply is not JSON: {sresp.text[:200]}"))
+            return
+        except Exception as e:
+            self._fail(p, HTTPException(status_code=502, detail=f"Tripo status request failed: {e}"))
+            return
+        finally:
+            record("tripo.poll", time.perf_counter() - started, p.trace)
+        self._settle(p, sjson)
+
+    async def _poll_batch(self, group: List[_PendingTask]) -> None:
+        first = group[0]
+        base_url = (settings.tripo_api_base or "").rstrip("/")
+        batch_url = f"{base_url}/{settings.tripo_batch_status_path.lstrip('/')}"
+        self.batches_sent += 1
+        POLLS_TOTAL.inc(mode="batch")
+        started = time.perf_counter()
+        try:
+            resp = await first.client.post(batch_url, headers=first.headers, json={"task_ids": [p.task_id for p in group]})
+            resp.raise_for_status()
+            by_id = _batch_payload_by_id(resp.json())
+        except Exception:
+            # Batch endpoint unavailable or malformed: fall back to individual polls this tick.
+            await asyncio.gather(*(self._poll_one(p) for p in group))
+            return
+        elapsed = time.perf_counter() - started
+        missing = [p for p in group if p.task_id not in by_id]
+        for p in group:
+            if p.task_id in by_id:
+                p.polls += 1
+                record("tripo.poll", elapsed, p.trace)
+                self._settle(p, by_id[p.task_id])
+        if missing:
+            await asyncio.gather(*(self._poll_one(p) for p in missing))
+
+    def _settle(self, p: _PendingTask, sjson: Any) -> None:
+        try:
+            if not isinstance(sjson, dict):
+                raise TypeError(f"expected an object, got {type(sjson).__name__}")
+            result = _interpret_status(sjson)
+        except HTTPException as e:
+            self._fail(p, e)
+            return
+        except Exception as e:
+            self._fail(p, HTTPException(status_code=502, detail=f"Tripo status reply not understood: {e}"))
+            return
+        if result is not None and not p.future.done():
+            p.future.set_result(result)
+
+    @staticmethod
+    def _fail(p: _PendingTask, exc: Exception) -> None:
+        if not p.future.done():
+            p.future.set_exception(exc)
+
+
+def _batch_payload_by_id(payload: Any) -> Dict[str, dict]:
+    """Accept either {id: status} (optionally under "data"/"tasks") or a list of status objects with ids."""
+    if isinstance(payload, dict):
+        inner = payload.get("data", payload.get("tasks", payload))
+        if isinstance(inner, dict):
+            return {str(k): v for k, v in inner.items() if isinstance(v, dict)}
+        payload = inner
+    out: Dict[str, dict] = {}
+    for item in payload or []:
+        if isinstance(item, dict):
+            tid = item.get("task_id") or item.get("id")
+            if tid:
+                out[str(tid)] = item
+    return out
+
+
+poller = TripoPoller()
 
 
 class TripoClient:
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
         self.api_key = api_key or settings.tripo_api_key
         # If not provided, leave empty; endpoint specifics must be configured by user.
         self.base_url = (base_url or settings.tripo_api_base or "").rstrip("/")
+        # Borrow the app-lifetime pooled client unless one is passed explicitly.
+        self._client = client
+
+    @asynccontextmanager
+    async def _http(self) -> AsyncIterator[httpx.AsyncClient]:
+        client = self._client or get_client("tripo")
+        if client is not None:
+            yield client
+            return
+        # Outside the app lifespan (scripts, benchmarks): one client for the whole job.
+        async with build_tripo_client() as own:
+            yield own
 
-    async def generate_from_images(self, images: List[Tuple[str, bytes]]):
+    async def generate_from_images(self, images: List[Tuple]):
         """
         Generate a 3D model from one or more images.
 
-        images: list of (filename, content_bytes)
+        images: list of (filename, content_bytes) or (filename, content_bytes, content_type);
+        without a content type it is sniffed from the bytes.
 
         Returns a dict with keys: model_url, preview_image_url, format
 
@@ -60,20 +376,39 @@ class TripoClient:
         create_url = f"{self.base_url.rstrip('/')}/{create_path.lstrip('/')}"
 
         files = []
-        for idx, (filename, content) in enumerate(images):
-            files.append(("images", (filename or f"image_{idx}.jpg", content, "image/jpeg")))
+        for idx, (filename, content, *rest) in enumerate(images):
+            ctype = rest[0] if rest else mime_type(content)
+            files.append(("images", (filename or f"image_{idx}.jpg", content, ctype)))
 
         # Additional options can be added here per docs, e.g., 'format': 'glb'
         data = {}
 
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with self._http() as client:
+            return await self._create_and_poll(client, create_url, status_path_tmpl, headers, files, data)
+
+    async def _create_and_poll(self, client: httpx.AsyncClient, create_url, status_path_tmpl, headers, files, data):
+        # Uploads get their own (longer) write/read budget; polls use the client's default timeout.
+        create_timeout = httpx.Timeout(
+            connect=settings.tripo_connect_timeout,
+            read=settings.tripo_create_timeout,
+            write=settings.tripo_create_timeout,
+            pool=settings.tripo_pool_timeout,
+        )
+        async with tripo_limiter.slot() as slot:
             try:
-                resp = await client.post(create_url, headers=headers, files=files, data=data)
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(status_code=e.response.status_code, detail=f"Tripo error: {e.response.text}")
+                with span("tripo.create"):
+                    resp = await client.post(create_url, headers=headers, files=files, data=data, timeout=create_timeout)
             except Exception as e:  # pragma: no cover - network path
+                slot.overloaded("timeout" if isinstance(e, httpx.TimeoutException) else "error")
                 raise HTTPException(status_code=502, detail=f"Tripo request failed: {e}")
+            slot.observe_status(resp.status_code)
+        count_sent("tripo", "upload", int(resp.request.headers.get("content-length") or 0))
+        if resp.status_code == 429:
+            raise upstream_busy("Tripo", resp.headers.get("retry-after"))
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(status_code=e.response.status_code, detail=f"Tripo error: {e.response.text}")
 
         payload = resp.json()
 
@@ -98,61 +433,5 @@ class TripoClient:
 
         status_url = f"{self.base_url.rstrip('/')}/{status_path_tmpl.lstrip('/')}".format(task_id=task_id, id=task_id)
 
-        # Polling loop
-        import time
-
-        deadline = time.time() + settings.tripo_poll_timeout
-        success_states = {"succeeded", "success", "completed", "done"}
-        fail_states = {"failed", "error", "canceled", "cancelled"}
-
-        async with httpx.AsyncClient(timeout=60) as client:
-            while True:
-                if time.time() > deadline:
-                    raise HTTPException(status_code=504, detail="Tripo polling timed out")
-                try:
-                    sresp = await client.get(status_url, headers=headers)
-                    sresp.raise_for_status()
-                except httpx.HTTPStatusError as e:
-                    raise HTTPException(status_code=e.response.status_code, detail=f"Tripo status error: {e.response.text}")
-                except Exception as e:  # pragma: no cover
-                    raise HTTPException(status_code=502, detail=f"Tripo status request failed: {e}")
-
-                sjson = sresp.json()
-                status = (
-                    sjson.get("status")
-                    or sjson.get("state")
-                    or sjson.get("data", {}).get("status")
-                )
-
-                # Extract URLs if present
-                model_url = (
-                    sjson.get("model_url")
-                    or sjson.get("assets", {}).get("glb")
-                    or sjson.get("assets", {}).get("obj")
-                    or sjson.get("result", {}).get("glb")
-                    or sjson.get("result", {}).get("obj")
-                    or sjson.get("glb")
-                    or sjson.get("obj")
-                    or sjson.get("model_glb")
-                )
-                preview_url = (
-                    sjson.get("preview_image_url")
-                    or sjson.get("preview")
-                    or sjson.get("thumbnail")
-                )
-
-                if status and str(status).lower() in fail_states:
-                    detail = sjson.get("message") or sjson
-                    raise HTTPException(status_code=502, detail=f"Tripo job failed: {detail}")
-
-                # Some APIs include result before a final status; prioritize explicit success
-                if model_url and (not status or str(status).lower() in success_states):
-                    fmt = (
-                        "glb" if str(model_url).endswith(".glb") else (
-                            "obj" if str(model_url).endswith(".obj") else sjson.get("format")
-                        )
-                    )
-                    return {"model_url": model_url, "preview_image_url": preview_url, "format": fmt}
-
-                # Not ready yet
-                await asyncio.sleep(settings.tripo_poll_interval)
+        # Completion is detected by the shared poller rather than a loop per request.
+        return await poller.wait(str(task_id), status_url, headers, client)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import BinaryIO, List, Optional, Sequence
+
+from fastapi import HTTPException, UploadFile
+
+from ..config import settings
+
+_CHUNK = 1024 * 1024
+
+
+class ByteBudget:
+    """Process-wide ceiling on request-body bytes held by in-flight uploads."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def try_acquire(self, n: int) -> bool:
+        if self.in_use + n > self.capacity:
+            self.rejected += 1
+            return False
+        self.in_use += n
+        self.peak = max(self.peak, self.in_use)
+        return True
+
+    def release(self, n: int) -> None:
+        self.in_use = max(0, self.in_use - n)
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "in_use": self.in_use, "peak": self.peak, "rejected": self.rejected}
+
+
+upload_budget = ByteBudget(settings.upload_max_inflight_bytes)
+
+
+class UploadLimitMiddleware:
+    """Reject oversized or unaffordable multipart uploads before the body is parsed.
+
+    The declared Content-Length is checked against the per-request limit (413)
+    and reserved from the global in-flight budget (503 + Retry-After) for the
+    life of the request. Bodies without a length are counted as they stream in.
+    """
+
+    def __init__(self, app, paths: Sequence[str]):
+        self.app = app
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        limit = settings.upload_max_request_bytes
+        try:
+            reserved = int(declared) if declared is not None else 0
+        except ValueError:
+            reserved = -1
+        if reserved < 0:
+            await _reject(send, 400, "Invalid Content-Length header")
+            return
+        if reserved > limit:
+            await _reject(send, 413, f"Upload exceeds {limit} bytes")
+            return
+        if not upload_budget.try_acquire(reserved):
+            await _reject(send, 503, "Server is busy with other uploads", retry_after=2)
+            return
+
+        received = 0
+
+        async def counting_receive():
+            nonlocal received, reserved
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+                if received > reserved:
+                    # Chunked body: grow the reservation as bytes arrive.
+                    if not upload_budget.try_acquire(received - reserved):
+                        raise HTTPException(
+                            status_code=503, detail="Server is busy with other uploads", headers={"Retry-After": "2"}
+                        )
+                    reserved = received
+            return message
+
+        try:
+            await self.app(scope, counting_receive, send)
+        finally:
+            upload_budget.release(reserved)
+
+
+async def _reject(send, status: int, detail: str, retry_after: Optional[int] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class SpooledImage:
+    """One uploaded image, held in memory when small and in a named temp file otherwise.
+
+    The file path lets the preprocessing workers read it directly and lets the
+    Tripo upload stream it without ever materializing the whole body.
+    """
+
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.size = 0
+        self.path: Optional[str] = None
+        self._mem: Optional[bytes] = None
+        self._digest = hashlib.sha256()
+        self._handles: List[BinaryIO] = []
+        self.digest = b""
+
+    def source(self):
+        """What to hand to a worker process: the bytes if small, otherwise the file path."""
+        return self._mem if self.path is None else self.path
+
+    def head(self, n: int = 16) -> bytes:
+        if self.path is None:
+            return (self._mem or b"")[:n]
+        with open(self.path, "rb") as f:
+            return f.read(n)
+
+    def open(self) -> BinaryIO:
+        f: BinaryIO = io.BytesIO(self._mem or b"") if self.path is None else open(self.path, "rb")
+        self._handles.append(f)
+        return f
+
+    def detach(self) -> "SpooledImage":
+        """Move the spooled data into a new owner; closing this instance afterwards is a no-op.
+
+        Used when background work outlives the request that uploaded the image.
+        """
+        other = SpooledImage(self.filename)
+        other.size, other.path, other._mem, other.digest = self.size, self.path, self._mem, self.digest
+        self.path = None
+        self._mem = None
+        return other
+
+    def close(self) -> None:
+        for f in self._handles:
+            f.close()
+        self._handles.clear()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._mem = None
+
+
+async def spool_upload(uf: UploadFile, limit: int) -> SpooledImage:
+    """Copy an UploadFile chunk by chunk, hashing as it goes; spills to disk past UPLOAD_SPOOL_BYTES."""
+    img = SpooledImage(uf.filename)
+    buf = bytearray()
+    tmp = None
+    try:
+        while True:
+            chunk = await uf.read(_CHUNK)
+            if not chunk:
+                break
+            img.size += len(chunk)
+            if img.size > limit:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+            img._digest.update(chunk)
+            if tmp is None and len(buf) + len(chunk) <= settings.upload_spool_bytes:
+                buf += chunk
+                continue
+            if tmp is None:
+                tmp = tempfile.NamedTemporaryFile(prefix="upload-", dir=settings.upload_tmp_dir or None, delete=False)
+                img.path = tmp.name
+                await asyncio.to_thread(tmp.write, bytes(buf))
+                buf = bytearray()
+            await asyncio.to_thread(tmp.write, chunk)
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+        img.close()
+        raise
+    if tmp is not None:
+        tmp.close()
+    else:
+        img._mem = bytes(buf)
+    img.digest = img._digest.digest()
+    return img
+
+
+async def spool_uploads(images: Sequence[UploadFile]) -> List[SpooledImage]:
+    spooled: List[SpooledImage] = []
+    remaining = settings.upload_max_request_bytes
+    try:
+        for uf in images:
+            img = await spool_upload(uf, remaining)
+            spooled.append(img)
+            if img.size == 0:
+                raise HTTPException(status_code=400, detail=f"Empty upload: {uf.filename}")
+            remaining -= img.size
+    except BaseException:
+        close_all(spooled)
+        raise
+    return spooled
+
+
+def close_all(images: Sequence[SpooledImage]) -> None:
+    for img in images:
+        img.close()
@@ -0,0 +1,114 @@
+"""Build the idea library: generate and validate ideas for seed descriptions offline.
+
+Seeds are read one per line from the given files (blank lines and ``#``
+comments skipped), or default to the materials that dominate traffic.
+Descriptions already in the library for the current prompt version are
+skipped unless ``--force``. The server only uses the library with IDEA_LIBRARY=1.
+
+Run from backend/:  python -m app.warmup [seeds.txt ...] [--out idea_library.sqlite3] [--concurrency 4]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import List, Optional, Sequence
+
+from .config import settings
+from .services.cache import ideas_cache_key
+from .services.gemini import PROMPT_VERSION, generate_diy_ideas_async
+from .services.http import close_clients, open_clients
+from .services.json_repair import validate_ideas
+from .services.library import IdeaLibrary
+
+DEFAULT_SEEDS = [
+    "ペットボトル",
+    "1.5Lのペットボトル",
+    "段ボール",
+    "段ボール箱",
+    "空き缶",
+    "アルミ缶",
+    "牛乳パック",
+    "新聞紙",
+    "古新聞",
+    "ガラス瓶",
+    "卵パック",
+    "トイレットペーパーの芯",
+    "古いTシャツ",
+]
+
+
+def read_seeds(paths: Sequence[str]) -> List[str]:
+    seeds: List[str] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            seeds.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+    # Keep the first occurrence of each description.
+    return list(dict.fromkeys(seeds or DEFAULT_SEEDS))
+
+
+async def build(library: IdeaLibrary, seeds: Sequence[str], concurrency: int, force: bool) -> dict:
+    """Generate ideas for the seeds missing from ``library``, ``concurrency`` at a time."""
+    known = set() if force else library.keys(PROMPT_VERSION)
+    todo = [s for s in seeds if ideas_cache_key(s, PROMPT_VERSION) not in known]
+    sem = asyncio.Semaphore(max(1, concurrency))
+    failed: dict = {}
+    written = 0
+
+    async def one(description: str) -> None:
+        nonlocal written
+        async with sem:
+            try:
+                result = await generate_diy_ideas_async(description)
+            except Exception as e:
+                failed[description] = str(getattr(e, "detail", e))
+                return
+        ideas, dropped = validate_ideas(result)
+        if ideas is None:
+            failed[description] = f"no valid ideas ({dropped} dropped)"
+            return
+        # Written as each seed finishes, so an interrupted run keeps what it has.
+        count = await asyncio.to_thread(library.write, PROMPT_VERSION, [(description, ideas)])
+        written += count
+
+    await open_clients()
+    try:
+        await asyncio.gather(*(one(s) for s in todo))
+    finally:
+        await close_clients()
+    return {
+        "seeds": len(seeds),
+        "skipped": len(seeds) - len(todo),
+        "written": written,
+        "failed": failed,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.warmup", description=__doc__.splitlines()[0])
+    parser.add_argument("seeds", nargs="*", help="files with one description per line (default: built-in list)")
+    parser.add_argument("--out", default=settings.idea_library_path, help="library file (IDEA_LIBRARY_PATH)")
+    parser.add_argument("--concurrency", type=int, default=settings.idea_library_concurrency)
+    parser.add_argument("--force", action="store_true", help="regenerate descriptions already in the library")
+    args = parser.parse_args(argv)
+
+    if settings.mock_gemini:
+        parser.error("MOCK_GEMINI is set; the library would only hold sample ideas")
+    if not settings.gemini_api_key:
+        parser.error("GEMINI_API_KEY not configured")
+
+    started = time.perf_counter()
+    library = IdeaLibrary(args.out, settings.similar_threshold)
+    report = asyncio.run(build(library, read_seeds(args.seeds), args.concurrency, args.force))
+    report["entries"] = library.load(PROMPT_VERSION)
+    report["prompt_version"] = PROMPT_VERSION
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Simulation: fixed vs. adaptive Gemini concurrency against a stub provider that throttles.
+
+The stub accepts ``--capacity`` concurrent requests, answers 429 beyond that
+and slows down as it fills up. ``--clients`` closed-loop clients hammer
+generate_diy_ideas_async. With a fixed (non-adapting) limit above the
+provider's capacity most overflow turns into upstream 429s; the adaptive
+limiter should settle near the capacity, keep 429s rare and turn the excess
+into quick local 503s with Retry-After instead.
+
+Run from backend/:  python -m bench.adaptive_limit --clients 64 --capacity 12
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services import gemini
+from app.services.gemini_registry import registry
+from app.services.http import close_clients, open_clients
+from app.services.limiter import AdaptiveLimiter
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import serve_in_thread
+
+
+async def _run(limiter: AdaptiveLimiter, clients: int, duration: float) -> dict:
+    gemini.gemini_limiter = limiter
+    await open_clients()
+    outcomes = {"ok": 0, "shed_503": 0, "throttled_503": 0, "other_error": 0}
+    latencies = []
+    limits = []
+    stop = time.monotonic() + duration
+
+    async def client():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                await gemini.generate_diy_ideas_async("ペットボトル")
+                outcomes["ok"] += 1
+                latencies.append(time.perf_counter() - started)
+            except HTTPException as e:
+                if e.status_code == 503 and "saturated" in str(e.detail):
+                    outcomes["shed_503"] += 1
+                elif e.status_code == 503:
+                    outcomes["throttled_503"] += 1
+                else:
+                    outcomes["other_error"] += 1
+                # Back off briefly, as a client honouring Retry-After would (scaled down for the simulation).
+                await asyncio.sleep(0.05)
+
+    async def sample():
+        while time.monotonic() < stop:
+            limits.append(round(limiter.limit, 2))
+            await asyncio.sleep(0.25)
+
+    await asyncio.gather(sample(), *(client() for _ in range(clients)))
+    await close_clients()
+    latencies.sort()
+    return {
+        **outcomes,
+        "throughput_rps": round(outcomes["ok"] / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        "final_limit": round(limiter.limit, 2),
+        "limit_trace": limits[:: max(1, -(-len(limits) // 12))],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--capacity", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=18971)
+    args = parser.parse_args()
+
+    settings.mock_gemini = False
+    settings.gemini_api_key = "stub"
+    settings.gemini_api_endpoint = f"http://127.0.0.1:{args.port}"
+    stub, stats = make_gemini_stub(latency=args.latency, capacity=args.capacity)
+    serve_in_thread(stub, args.port)
+    registry.get()
+
+    report = {}
+    variants = {
+        # backoff=1.0 and no latency signal: the limit never moves.
+        "fixed": AdaptiveLimiter("gemini", 64, 64, 64, 256, 10.0, backoff=1.0, latency_tolerance=None),
+        "adaptive": AdaptiveLimiter("gemini", 8, 1, 64, 64, 2.0, latency_tolerance=5.0),
+    }
+    for name, limiter in variants.items():
+        before_calls, before_429 = stats.generate_calls, stats.throttled
+        result = asyncio.run(_run(limiter, args.clients, args.duration))
+        result["upstream_calls"] = stats.generate_calls - before_calls
+        result["upstream_429"] = stats.throttled - before_429
+        report[name] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Time to first successful response of a freshly started worker.
+
+Starts ``uvicorn app.main:app`` in a subprocess against local Gemini and
+Tripo stubs and measures, from process spawn:
+
+- listening: first 200 from /health (liveness)
+- ready: first 200 from /ready (only meaningful with the startup warmup)
+- first_ok: first successful POST /v1/generate, and how long that request took
+
+Variants: ``lazy`` (STARTUP_WARMUP=0, the client calls as soon as the worker
+listens, so the first request imports the SDK, resolves the model and opens
+connections) and ``warm`` (the client waits for /ready, as a load balancer
+would). Each variant is run ``--runs`` times; medians are reported.
+
+Run from backend/:  python -m bench.cold_start --runs 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import make_tripo_stub, serve_in_thread
+
+VARIANTS = {
+    "lazy": {"STARTUP_WARMUP": "0"},
+    "warm": {"STARTUP_WARMUP": "1"},
+}
+
+
+def _wait(client: httpx.Client, path: str, began: float, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter() - began
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(path)
+
+
+def _one(env: dict, port: int, gate_on_ready: bool, run: int) -> dict:
+    began = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            deadline = began + 60
+            row = {"listening": _wait(client, "/health", began, deadline)}
+            if gate_on_ready:
+                row["ready"] = _wait(client, "/ready", began, deadline)
+            sent = time.perf_counter()
+            resp = client.post("/v1/generate", data={"description": f"段ボール箱 {run} {port}"})
+            resp.raise_for_status()
+            done = time.perf_counter()
+            row["first_ok"] = done - began
+            row["first_request"] = done - sent
+            return row
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.1, help="Gemini stub latency per call (seconds)")
+    parser.add_argument("--port", type=int, default=18990)
+    args = parser.parse_args()
+
+    gemini_port, tripo_port = args.port + 1, args.port + 2
+    serve_in_thread(make_gemini_stub(latency=args.latency)[0], gemini_port)
+    serve_in_thread(make_tripo_stub()[0], tripo_port)
+    base_env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        MOCK_EXTERNAL="0",
+        MOCK_GEMINI="0",
+        MOCK_TRIPO="0",
+        GEMINI_API_KEY="stub",
+        GEMINI_API_ENDPOINT=f"http://127.0.0.1:{gemini_port}",
+        TRIPO_API_KEY="stub",
+        TRIPO_API_BASE=f"http://127.0.0.1:{tripo_port}",
+        IDEA_LIBRARY="0",
+        ASSET_STORE="0",
+        RESULT_CACHE_BACKEND="off",
+    )
+
+    report = {}
+    for name, overrides in VARIANTS.items():
+        rows = [_one({**base_env, **overrides}, args.port, name == "warm", run) for run in range(args.runs)]
+        report[name] = {
+            f"{key}_ms": round(statistics.median(r[key] for r in rows) * 1000, 1) for key in rows[0]
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
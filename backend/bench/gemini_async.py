@@ -0,0 +1,85 @@
+"""Throughput of the native async Gemini path vs. offloading a blocking call to the default thread pool.
+
+Both variants talk to the same local Gemini stub with a fixed latency. The
+"threaded" variant reproduces the previous design: a blocking HTTP call per
+request, run through ``asyncio.to_thread``.
+
+Run from backend/:  python -m bench.gemini_async --requests 400 --latency 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from app.config import settings
+from app.services.gemini import generate_diy_ideas_async
+from app.services.gemini_registry import registry
+from app.services.http import close_clients, open_clients
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import serve_in_thread
+
+
+def _blocking_generate(url: str) -> dict:
+    with httpx.Client(timeout=60) as client:
+        resp = client.post(url, json={"contents": [{"parts": [{"text": "x"}]}]})
+        resp.raise_for_status()
+        return resp.json()
+
+
+async def _run_threaded(n: int, url: str) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(_blocking_generate, url) for _ in range(n)))
+    return time.perf_counter() - started
+
+
+async def _run_async(n: int) -> float:
+    await open_clients()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(generate_diy_ideas_async("ペットボトル") for _ in range(n)))
+        return time.perf_counter() - started
+    finally:
+        await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=64, help="GEMINI_MAX_CONCURRENCY for the async path")
+    parser.add_argument("--port", type=int, default=18932)
+    args = parser.parse_args()
+
+    app, stats = make_gemini_stub(latency=args.latency)
+    server = serve_in_thread(app, args.port)
+    endpoint = f"http://127.0.0.1:{args.port}"
+    settings.mock_gemini = False
+    settings.gemini_api_key = "stub"
+    settings.gemini_api_endpoint = endpoint
+    settings.gemini_max_concurrency = args.concurrency
+    settings.gemini_max_connections = args.concurrency
+    registry.get()
+
+    try:
+        threaded = asyncio.run(_run_threaded(args.requests, f"{endpoint}/v1beta/models/gemini-2.0-flash:generateContent"))
+        native = asyncio.run(_run_async(args.requests))
+    finally:
+        server.should_exit = True
+    print(json.dumps({
+        "requests": args.requests,
+        "upstream_latency_s": args.latency,
+        "default_executor_threads": min(32, (os.cpu_count() or 1) + 4),
+        "threaded_rps": round(args.requests / threaded, 1),
+        "async_rps": round(args.requests / native, 1),
+        "async_concurrency": args.concurrency,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
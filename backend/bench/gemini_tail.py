@@ -0,0 +1,108 @@
+"""Tail latency of idea generation with no retries, with retries, and with retries plus hedging.
+
+The Gemini stub answers most calls in ``--latency`` seconds but ``--tail-rate``
+of them take ``--tail-latency`` and ``--error-rate`` fail with 503 — the
+bursty tail seen from the real API. Reports p50/p95/p99, failures, and
+upstream calls per request (the cost of retrying/hedging).
+
+Run from backend/:  python -m bench.gemini_tail --requests 400
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.config import settings
+from app.services import gemini
+from app.services.gemini_registry import registry
+from app.services.http import close_clients, open_clients
+from app.services.limiter import gemini_limiter
+from app.services.retry import HedgeBudget, LatencyTracker
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import serve_in_thread
+
+VARIANTS = {
+    "single_attempt": {"gemini_retry_attempts": 1, "gemini_hedge": False},
+    "retry": {"gemini_retry_attempts": 3, "gemini_hedge": False},
+    "retry_hedge": {"gemini_retry_attempts": 3, "gemini_hedge": True},
+}
+
+
+def _pct(values, q):
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+
+
+async def _run(requests: int, concurrency: int, warmup: int, stats) -> dict:
+    await open_clients()
+    gate = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(measured: bool = True):
+        nonlocal failures
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await gemini.generate_diy_ideas_async("ペットボトル")
+                if measured:
+                    latencies.append(time.perf_counter() - started)
+            except Exception:
+                failures += measured
+
+    # Fill the latency window first, as a long-running server would have.
+    await asyncio.gather(*(one(measured=False) for _ in range(warmup)))
+    before = stats.generate_calls
+    await asyncio.gather(*(one() for _ in range(requests)))
+    calls = stats.generate_calls - before
+    await close_clients()
+    latencies.sort()
+    return {
+        "p50_ms": _pct(latencies, 0.50),
+        "p95_ms": _pct(latencies, 0.95),
+        "p99_ms": _pct(latencies, 0.99),
+        "failures": failures,
+        "upstream_calls_per_request": round(calls / requests, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--tail-rate", type=float, default=0.03)
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=18981)
+    args = parser.parse_args()
+
+    settings.mock_gemini = False
+    settings.gemini_api_key = "stub"
+    settings.gemini_api_endpoint = f"http://127.0.0.1:{args.port}"
+    settings.gemini_retry_base_delay = 0.05
+    stub, stats = make_gemini_stub(
+        latency=args.latency, tail_rate=args.tail_rate, tail_latency=args.tail_latency, error_rate=args.error_rate
+    )
+    serve_in_thread(stub, args.port)
+    registry.get()
+    # Isolated outliers would otherwise read as latency drift and halve the limit,
+    # leaving no headroom to hedge into; bench.adaptive_limit covers that behaviour.
+    gemini_limiter.latency_tolerance = None
+
+    report = {}
+    for name, overrides in VARIANTS.items():
+        for key, value in overrides.items():
+            setattr(settings, key, value)
+        gemini._latency = LatencyTracker()
+        gemini._hedge_budget = HedgeBudget(settings.gemini_hedge_budget)
+        gemini_limiter.limit = float(settings.gemini_limit_initial)
+        result = asyncio.run(_run(args.requests, args.concurrency, args.warmup, stats))
+        report[name] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
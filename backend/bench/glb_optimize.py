@@ -0,0 +1,128 @@
+"""Bytes and triangle counts of GLB files before and after the mobile optimization pass.
+
+Without arguments it builds sample GLBs shaped like Tripo output (one dense
+textured mesh: positions, normals, UVs, an embedded baseColor texture) at a
+few densities; pass real files with ``--glb model.glb ...``.
+
+Run from backend/:  python -m bench.glb_optimize [--glb a.glb b.glb] [--target 50000]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import time
+from array import array
+from typing import List, Tuple
+
+from app.config import settings
+from app.services.glb import optimize_glb, write_glb
+
+
+def _texture(edge: int, seed: int) -> bytes:
+    """A photo-like PNG texture: smooth gradients plus fine noise."""
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    noise = Image.frombytes("RGB", (edge // 4, edge // 4), rng.randbytes((edge // 4) ** 2 * 3))
+    img = noise.resize((edge, edge), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+    grain = Image.frombytes("L", (edge, edge), rng.randbytes(edge * edge)).convert("RGB")
+    img = Image.blend(img, grain, 0.15)
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def sample_glb(rings: int, segments: int, texture_edge: int, seed: int = 0) -> bytes:
+    """A bumpy UV sphere, (rings x segments x 2) triangles, indexed, with normals, UVs and a texture."""
+    rng = random.Random(seed)
+    pos, nrm, uv = array("f"), array("f"), array("f")
+    for r in range(rings + 1):
+        theta = math.pi * r / rings
+        for s in range(segments + 1):
+            phi = 2 * math.pi * s / segments
+            n = (math.sin(theta) * math.cos(phi), math.cos(theta), math.sin(theta) * math.sin(phi))
+            radius = 1.0 + 0.03 * rng.random()
+            pos.extend(c * radius for c in n)
+            nrm.extend(n)
+            uv.extend((s / segments, r / rings))
+    idx = array("I")
+    row = segments + 1
+    for r in range(rings):
+        for s in range(segments):
+            a, b = r * row + s, (r + 1) * row + s
+            idx.extend((a, b, a + 1, a + 1, b, b + 1))
+    tex = _texture(texture_edge, seed)
+    count = len(pos) // 3
+    xs, ys, zs = pos[0::3], pos[1::3], pos[2::3]
+
+    blobs: List[Tuple[bytes, dict]] = [
+        (pos.tobytes(), {"target": 34962}),
+        (nrm.tobytes(), {"target": 34962}),
+        (uv.tobytes(), {"target": 34962}),
+        (idx.tobytes(), {"target": 34963}),
+        (tex, {}),
+    ]
+    views, binary = [], b""
+    for data, extra in blobs:
+        binary += b"\0" * (-len(binary) % 4)
+        views.append({"buffer": 0, "byteOffset": len(binary), "byteLength": len(data), **extra})
+        binary += data
+    doc = {
+        "asset": {"version": "2.0", "generator": "bench.glb_optimize"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1, "TEXCOORD_0": 2}, "indices": 3, "material": 0}]}],
+        "materials": [{"pbrMetallicRoughness": {"baseColorTexture": {"index": 0}}}],
+        "textures": [{"source": 0}],
+        "images": [{"bufferView": 4, "mimeType": "image/png"}],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": count, "type": "VEC3",
+             "min": [min(xs), min(ys), min(zs)], "max": [max(xs), max(ys), max(zs)]},
+            {"bufferView": 1, "componentType": 5126, "count": count, "type": "VEC3"},
+            {"bufferView": 2, "componentType": 5126, "count": count, "type": "VEC2"},
+            {"bufferView": 3, "componentType": 5125, "count": len(idx), "type": "SCALAR"},
+        ],
+        "bufferViews": views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    return write_glb(doc, binary)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--glb", nargs="*", default=[], help="GLB files to optimize instead of the samples")
+    parser.add_argument("--target", type=int, default=settings.glb_target_triangles)
+    parser.add_argument("--texture-edge", type=int, default=settings.glb_texture_max_edge)
+    parser.add_argument("--quality", type=int, default=settings.glb_texture_quality)
+    args = parser.parse_args()
+
+    if args.glb:
+        samples = []
+        for path in args.glb:
+            with open(path, "rb") as f:
+                samples.append((os.path.basename(path), f.read()))
+    else:
+        samples = [
+            ("sphere_20k_tex1024", sample_glb(100, 100, 1024)),
+            ("sphere_200k_tex2048", sample_glb(250, 400, 2048, seed=1)),
+            ("sphere_500k_tex2048", sample_glb(500, 500, 2048, seed=2)),
+        ]
+
+    report = {}
+    for name, data in samples:
+        started = time.perf_counter()
+        out, rep = optimize_glb(data, args.target, args.texture_edge, args.quality)
+        row = rep.as_dict()
+        row["seconds"] = round(time.perf_counter() - started, 3)
+        row["size_ratio"] = round(len(out) / len(data), 3)
+        report[name] = row
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Truncation, latency and richness of idea generation with a fixed vs adaptive output limit and with budgets.
+
+The Gemini stub answers with as many ideas and steps as the prompt asks for
+(step texts of random length, ``--wordiness``), takes ``--per-token`` seconds
+per output token on top of ``--latency``, and stops at maxOutputTokens with
+finishReason MAX_TOKENS. Variants:
+
+- ``fixed_1536``: the old fixed maxOutputTokens of 1536, standard plan
+- ``adaptive``: output limit sized from recent answers, standard plan
+- ``latency_<s>``: each request carries a latency budget of ``--latency-budget``
+- ``tokens_<n>``: each request carries a token budget of ``--token-budget``
+
+Reports p50/p95 latency, truncation rate, parse tiers (``repair`` is the
+extra Gemini call), ideas per answer, tokens per request and plans chosen.
+
+Run from backend/:  python -m bench.idea_budget --requests 300
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter as Tally
+
+from app.config import settings
+from app.services import budget, gemini
+from app.services.budget import Budget, TokenAccounting
+from app.services.gemini_registry import registry
+from app.services.http import close_clients, open_clients
+from app.services.limiter import gemini_limiter
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import serve_in_thread
+
+TIERS = ("direct", "sanitized", "recovered", "repair", "failed")
+
+
+def _pct(values, q):
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+
+async def _run(requests: int, concurrency: int, warmup: int, spend, stats) -> dict:
+    await open_clients()
+    gate = asyncio.Semaphore(concurrency)
+    latencies, ideas, plans = [], [], Tally()
+    failures = 0
+
+    async def one(measured: bool = True):
+        nonlocal failures
+        async with gate:
+            plan = budget.token_usage.choose(spend)
+            started = time.perf_counter()
+            try:
+                result = await gemini.generate_diy_ideas_async("ペットボトル", plan=plan)
+            except Exception:
+                failures += measured
+                return
+            if measured:
+                latencies.append(time.perf_counter() - started)
+                ideas.append(len(result["ideas"]))
+                plans[plan.name] += 1
+
+    # Let the accounting see a window of answers first, as a long-running server would have.
+    await asyncio.gather(*(one(measured=False) for _ in range(warmup)))
+    calls, tokens, truncated = stats.generate_calls, stats.output_tokens, stats.truncated
+    tiers = {tier: gemini.PARSE_TOTAL.value(tier=tier) for tier in TIERS}
+    await asyncio.gather(*(one() for _ in range(requests)))
+    await close_clients()
+    calls = stats.generate_calls - calls
+    latencies.sort()
+    return {
+        "p50_ms": _pct(latencies, 0.50),
+        "p95_ms": _pct(latencies, 0.95),
+        "failures": failures,
+        "truncation_rate": round((stats.truncated - truncated) / calls, 4) if calls else 0.0,
+        "parse_tiers": {
+            t: int(gemini.PARSE_TOTAL.value(tier=t) - n) for t, n in tiers.items() if gemini.PARSE_TOTAL.value(tier=t) > n
+        },
+        "upstream_calls_per_request": round(calls / requests, 3),
+        "output_tokens_per_request": round((stats.output_tokens - tokens) / requests, 1),
+        "ideas_per_answer": round(sum(ideas) / len(ideas), 2) if ideas else None,
+        "plans": dict(plans),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.1, help="fixed seconds per call")
+    parser.add_argument("--per-token", type=float, default=0.0005, help="seconds per output token")
+    parser.add_argument("--wordiness", type=int, default=10, help="longest step text, in phrases")
+    parser.add_argument("--latency-budget", type=float, default=0.5, help="seconds")
+    parser.add_argument("--token-budget", type=int, default=1500)
+    parser.add_argument("--port", type=int, default=18983)
+    args = parser.parse_args()
+
+    settings.mock_gemini = False
+    settings.gemini_api_key = "stub"
+    settings.gemini_api_endpoint = f"http://127.0.0.1:{args.port}"
+    stub, stats = make_gemini_stub(
+        latency=args.latency, varied=True, wordiness=args.wordiness, per_token=args.per_token
+    )
+    serve_in_thread(stub, args.port)
+    registry.get()
+    gemini_limiter.latency_tolerance = None
+
+    variants = {
+        "fixed_1536": (1536, None),
+        "adaptive": (settings.gemini_output_token_cap, None),
+        f"latency_{args.latency_budget:g}s": (settings.gemini_output_token_cap, Budget(seconds=args.latency_budget)),
+        f"tokens_{args.token_budget}": (settings.gemini_output_token_cap, Budget(tokens=args.token_budget)),
+    }
+    report = {}
+    for name, (cap, spend) in variants.items():
+        # Fresh accounting per variant; the fixed variant's cap is below the standard prior, so it never moves.
+        budget.token_usage = gemini.token_usage = TokenAccounting(cap=cap)
+        report[name] = asyncio.run(_run(args.requests, args.concurrency, args.warmup, spend, stats))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Upstream bytes and image decodes of image-aware idea generation (image_ideas=true).
+
+Starts uvicorn in a subprocess against the local Gemini and Tripo stubs and
+sends ``--requests`` POST /v1/generate with image_ideas=true and
+generate_model=true. Each request has its own description, so the idea cache
+misses every time, and a photo drawn from a pool of ``--photos``. The Gemini
+stub fails ``--gemini-5xx`` of generateContent calls (retried) and returns
+broken JSON for ``--gemini-malformed`` of them (some need the repair call).
+
+Variants:
+
+- ``inline``: photos embedded in every generateContent call, retries included
+- ``files``: photos uploaded once through the File API, referenced by URI
+- ``files_no_decode_cache``: as ``files`` with IMAGE_DECODE_CACHE=0, so the
+  Gemini and Tripo branches each decode the photo (the old behaviour)
+
+Reports, per request: bytes sent upstream (the X-Upstream-Bytes header, split
+by upstream from /metrics), bytes the Gemini stub received, image decodes and
+file uploads, and p50/p95 latency.
+
+Run from backend/:  python -m bench.image_ideas --requests 60
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict
+
+import httpx
+
+from .load import _image, _pct, _wait_ready
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import make_tripo_stub, serve_in_thread
+
+VARIANTS = {
+    "inline": {"GEMINI_IMAGE_TRANSPORT": "inline"},
+    "files": {"GEMINI_IMAGE_TRANSPORT": "files"},
+    "files_no_decode_cache": {"GEMINI_IMAGE_TRANSPORT": "files", "IMAGE_DECODE_CACHE": "0"},
+}
+
+_SAMPLE = re.compile(r'^(diy_upstream_bytes_sent_total|diy_image_decodes_total)\{(.*)\} (\S+)$', re.MULTILINE)
+
+
+def _counters(text: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for name, labels, value in _SAMPLE.findall(text):
+        out[f"{name}{{{labels}}}"] = float(value)
+    return out
+
+
+async def _drive(base_url: str, args, photos) -> dict:
+    latencies, sent, statuses = [], [], {}
+    gate = asyncio.Semaphore(args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+
+        async def one(i: int) -> None:
+            async with gate:
+                started = time.perf_counter()
+                resp = await client.post(
+                    "/v1/generate",
+                    data={"description": f"古い木箱 {i}", "image_ideas": "true", "generate_model": "true"},
+                    files=[("images", (f"shot{i}.jpg", photos[i % len(photos)], "image/jpeg"))],
+                )
+                statuses[str(resp.status_code)] = statuses.get(str(resp.status_code), 0) + 1
+                if resp.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                    sent.append(int(resp.headers.get("x-upstream-bytes", 0)))
+
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        metrics = _counters((await client.get("/metrics")).text)
+    latencies.sort()
+    return {
+        "status_counts": statuses,
+        "p50_ms": _pct(latencies, 0.5),
+        "p95_ms": _pct(latencies, 0.95),
+        "upstream_bytes_per_request": round(sum(sent) / len(sent)) if sent else None,
+        "metrics": metrics,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--photos", type=int, default=10, help="distinct photos the requests draw from")
+    parser.add_argument("--gemini-latency", default="0.1")
+    parser.add_argument("--gemini-5xx", type=float, default=0.2)
+    parser.add_argument("--gemini-malformed", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=18940)
+    args = parser.parse_args()
+
+    gemini_port, tripo_port = args.port + 1, args.port + 2
+    gemini_stub, gemini_stats = make_gemini_stub(
+        latency=args.gemini_latency, error_rate=args.gemini_5xx, malformed_rate=args.gemini_malformed
+    )
+    tripo_stub, _ = make_tripo_stub(polls_until_done=1)
+    serve_in_thread(gemini_stub, gemini_port)
+    serve_in_thread(tripo_stub, tripo_port)
+    photos = [_image(n) for n in range(args.photos)]
+
+    base_env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        MOCK_EXTERNAL="0",
+        MOCK_GEMINI="0",
+        MOCK_TRIPO="0",
+        GEMINI_API_KEY="stub",
+        GEMINI_API_ENDPOINT=f"http://127.0.0.1:{gemini_port}",
+        GEMINI_RETRY_BASE_DELAY="0.05",
+        TRIPO_API_KEY="stub",
+        TRIPO_API_BASE=f"http://127.0.0.1:{tripo_port}",
+        TRIPO_ITD_CREATE_PATH="/v2/create",
+        TRIPO_ITD_STATUS_PATH="/v2/status/{task_id}",
+        TRIPO_POLL_INTERVAL="0.05",
+        ASSET_STORE="0",
+        IDEA_LIBRARY="0",
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    report = {}
+    for name, overrides in VARIANTS.items():
+        received, uploads, parts = gemini_stats.bytes_received, gemini_stats.file_uploads, gemini_stats.image_parts
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+             "--log-level", "warning"],
+            env={**base_env, **overrides},
+        )
+        try:
+            _wait_ready(base_url, proc)
+            row = asyncio.run(_drive(base_url, args, photos))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        row["gemini_stub_bytes_per_request"] = round((gemini_stats.bytes_received - received) / args.requests)
+        row["gemini_file_uploads"] = gemini_stats.file_uploads - uploads
+        row["gemini_image_parts_sent"] = gemini_stats.image_parts - parts
+        report[name] = row
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Local parse success rate and cost on malformed Gemini output: legacy tiers vs. the repair engine.
+
+"legacy" is the previous local path (``_extract_json``, then the sanitizer);
+anything it rejects used to cost a second Gemini call. "local" is
+``_parse_ideas_locally``. The built-in corpus applies the failure modes seen
+in real responses (fences, prose, truncation, unbalanced brackets, unescaped
+quotes, smart quotes, missing/trailing commas) to realistic idea documents;
+recorded responses can be added with ``--corpus file.jsonl`` (one
+``{"name": ..., "text": ...}`` per line).
+
+Run from backend/:  python -m bench.json_parse
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.services.gemini import _extract_json, _mock_ideas, _parse_ideas_locally, _sanitize_json_like
+
+from .stub_gemini import IDEAS
+
+
+def _legacy(text: str):
+    for attempt in (lambda: _extract_json(text), lambda: _extract_json(_sanitize_json_like(text))):
+        try:
+            parsed = attempt()
+        except Exception:
+            continue
+        if isinstance(parsed.get("ideas"), list):
+            return parsed
+    return None
+
+
+def _local(text: str):
+    return _parse_ideas_locally(text)[1]
+
+
+def _truncate(at: float) -> Callable[[str, random.Random], str]:
+    return lambda s, rng: s[: int(len(s) * at)]
+
+
+def _unescaped_quote(s: str, rng: random.Random) -> str:
+    return s.replace("ペットボトル", 'ペット"ボトル"', 1).replace("窓の形", '"窓"の形', 1).replace(
+        "Turn a discarded", 'Turn a "discarded"', 1
+    )
+
+
+MUTATIONS: Dict[str, Callable[[str, random.Random], str]] = {
+    "clean": lambda s, rng: s,
+    "fenced": lambda s, rng: f"```json\n{s}\n```",
+    "prose": lambda s, rng: f"Here are three ideas for you:\n{s}\nLet me know if you need more!",
+    "trailing_commas": lambda s, rng: s.replace("}", ",}").replace("]", ",]"),
+    "smart_quotes": lambda s, rng: s.replace('"title"', "“title”").replace('"tools"', "“tools”"),
+    "unescaped_quotes": _unescaped_quote,
+    "raw_newlines": lambda s, rng: s.replace("。", "。\n", 3),
+    "missing_comma": lambda s, rng: s.replace("},\n    {", "}\n    {"),
+    "missing_close": lambda s, rng: s.rstrip()[:-1],
+    "missing_array_close": lambda s, rng: s.replace("\n  ]\n}", "\n}"),
+    "truncated_90": _truncate(0.9),
+    "truncated_70": _truncate(0.7),
+    "truncated_50": _truncate(0.5),
+    "fenced_truncated": lambda s, rng: "```json\n" + s[: int(len(s) * 0.8)],
+    "bad_escape": lambda s, rng: s.replace("Easy", "Eas\\'y", 1),
+}
+
+
+def build_corpus() -> List[Tuple[str, str]]:
+    rng = random.Random(7)
+    docs = [json.dumps(_mock_ideas(), ensure_ascii=False, indent=2), json.dumps(IDEAS, ensure_ascii=False, indent=2)]
+    return [(name, fn(doc, rng)) for name, fn in MUTATIONS.items() for doc in docs]
+
+
+def _measure(fn, text: str, repeat: int) -> Tuple[bool, int, float]:
+    result = fn(text)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    per_call = (time.perf_counter() - started) / repeat
+    ideas = len(result["ideas"]) if result else 0
+    return result is not None, ideas, per_call * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="extra JSONL of recorded responses")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus += [(row.get("name", "recorded"), row["text"]) for row in map(json.loads, f) if row.strip()]
+
+    report = {}
+    for label, fn in (("legacy", _legacy), ("local", _local)):
+        rows = [(name, *_measure(fn, text, args.repeat)) for name, text in corpus]
+        ok = [r for r in rows if r[1]]
+        report[label] = {
+            "samples": len(rows),
+            "parsed": len(ok),
+            "success_rate": round(len(ok) / len(rows), 3),
+            "ideas_recovered": sum(r[2] for r in rows),
+            "median_us": round(statistics.median(r[3] for r in rows), 1),
+            "max_us": round(max(r[3] for r in rows), 1),
+            "failed": sorted({r[0] for r in rows if not r[1]}),
+        }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Latency distributions for the stub servers, given as short specs.
+
+- ``0.2`` or ``fixed:0.2``: always 200ms
+- ``uniform:0.1,0.5``: uniform between the two bounds
+- ``lognormal:0.8,0.5``: log-normal with the given median and sigma (the usual shape of LLM latency)
+- ``tail:0.2,0.05,3.0``: ``base`` seconds, except ``rate`` of calls take ``tail`` seconds
+"""
+from __future__ import annotations
+
+import math
+import random
+from typing import Union
+
+
+class Latency:
+    def __init__(self, spec: Union[float, str]):
+        self.spec = str(spec)
+        kind, _, params = self.spec.partition(":") if ":" in self.spec else ("fixed", "", self.spec)
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "tail": 3}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"bad latency spec {self.spec!r}; see bench/latency.py")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        if self.kind == "tail":
+            return p[2] if rng.random() < p[1] else p[0]
+        return p[0]
+
+    def __repr__(self) -> str:
+        return f"Latency({self.spec!r})"
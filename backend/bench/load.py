@@ -0,0 +1,294 @@
+"""End-to-end load test: /v1/generate at a fixed arrival rate against local Gemini and Tripo stubs.
+
+The app runs as a real uvicorn worker in a subprocess, configured to call
+the stubs in this process. Requests are sent open-loop (on schedule,
+whether or not earlier ones finished) for ``--duration`` seconds at
+``--rate`` per second; ``--model-share`` of them upload an image and
+generate a 3D model, and ``--hot-share`` of them reuse one of a few common
+descriptions (the rest are unique, so they miss every cache).
+
+The stubs take latency distributions and fault rates (bench/latency.py,
+bench/stub_gemini.py, bench/stub_tripo.py). The JSON report has throughput,
+p50/p95/p99 latency, status counts, the worker's peak RSS and upstream call
+counts. With ``--baseline`` a previous report is compared and the exit code
+is 1 when a metric is worse by more than ``--tolerance``.
+
+Run from backend/:
+  python -m bench.load --rate 20 --duration 30 --out load.json
+  python -m bench.load --rate 20 --duration 30 --baseline load.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import make_tripo_stub, serve_in_thread
+
+HOT_DESCRIPTIONS = ["ペットボトル", "段ボール箱", "空き缶", "牛乳パック", "新聞紙"]
+
+# Report paths compared against a baseline, and whether a larger value is worse.
+COMPARED = {
+    "throughput_rps": False,
+    "latency_ms.p50": True,
+    "latency_ms.p95": True,
+    "latency_ms.p99": True,
+    "error_rate": True,
+    "peak_rss_mb": True,
+    "upstream_per_request.gemini": True,
+    "upstream_per_request.tripo": True,
+}
+
+
+def _image(seed: int) -> bytes:
+    """A 1024x768 JPEG; distinct seeds give distinct bytes, so uploads miss the model cache."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    img = Image.frombytes("RGB", (64, 48), rng.randbytes(64 * 48 * 3)).resize((1024, 768))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    # VmHWM: the high-water mark of resident memory (Linux only).
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+
+
+async def _drive(base_url: str, args) -> dict:
+    rng = random.Random(args.seed)
+    total = int(args.rate * args.duration)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def one(i: int, at: float, description: str, image: Optional[bytes]) -> None:
+            await asyncio.sleep(max(0.0, at - time.perf_counter()))
+            data = {"description": description}
+            files = None
+            if image is not None:
+                data["generate_model"] = "true"
+                files = [("images", (f"shot{i}.jpg", image, "image/jpeg"))]
+            started = time.perf_counter()
+            try:
+                resp = await client.post("/v1/generate", data=data, files=files)
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(time.perf_counter() - started)
+
+        # The whole workload is drawn up front, so a seed always gives the same requests.
+        # Common descriptions come with one of a few common photos; the rest are one-offs.
+        hot_images = [_image(n) for n in range(len(HOT_DESCRIPTIONS))]
+        plan, offset = [], 0.0
+        for i in range(total):
+            hot = rng.random() < args.hot_share
+            description = rng.choice(HOT_DESCRIPTIONS) if hot else f"古い木箱 {i} {args.seed}"
+            image = None
+            if rng.random() < args.model_share:
+                image = hot_images[HOT_DESCRIPTIONS.index(description)] if hot else _image(args.seed * 1_000_003 + i)
+            plan.append((i, offset, description, image))
+            offset += rng.expovariate(args.rate) if args.poisson else 1.0 / args.rate
+        began = time.perf_counter()
+        await asyncio.gather(*(one(i, began + at, d, m) for i, at, d, m in plan))
+        wall = time.perf_counter() - began
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "requests": total,
+        "ok": ok,
+        "status_counts": dict(sorted(statuses.items())),
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(ok / wall, 2) if wall else 0.0,
+        "latency_ms": {"p50": _pct(latencies, 0.5), "p95": _pct(latencies, 0.95), "p99": _pct(latencies, 0.99),
+                       "max": _pct(latencies, 1.0)},
+    }
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"worker exited with {proc.returncode}")
+            try:
+                if client.get("/ready").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+    raise TimeoutError("worker never became ready")
+
+
+def _lookup(report: dict, path: str):
+    for part in path.split("."):
+        report = report.get(part) if isinstance(report, dict) else None
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Metrics worse than the baseline by more than ``tolerance`` (relative)."""
+    regressions = []
+    for path, larger_is_worse in COMPARED.items():
+        new, old = _lookup(report, path), _lookup(baseline, path)
+        if new is None or old is None:
+            continue
+        if larger_is_worse:
+            # Small absolute floors keep near-zero baselines (error rate, p50 of cache hits) from flapping.
+            worse = new > old * (1 + tolerance) and new - old > (0.01 if path == "error_rate" else 1.0)
+        else:
+            worse = new < old * (1 - tolerance)
+        if worse:
+            regressions.append(f"{path}: {old} -> {new}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=20.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of fixed")
+    parser.add_argument("--model-share", type=float, default=0.2, help="share of requests with generate_model=true")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="share of requests for common descriptions")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--gemini-latency", default="lognormal:0.8,0.4")
+    parser.add_argument("--gemini-429", type=float, default=0.02)
+    parser.add_argument("--gemini-5xx", type=float, default=0.01)
+    parser.add_argument("--gemini-malformed", type=float, default=0.02)
+    parser.add_argument("--tripo-latency", default="uniform:0.02,0.1")
+    parser.add_argument("--tripo-polls", type=int, default=3)
+    parser.add_argument("--tripo-poll-jitter", type=int, default=3)
+    parser.add_argument("--tripo-429", type=float, default=0.0)
+    parser.add_argument("--tripo-5xx", type=float, default=0.01)
+    parser.add_argument("--tripo-fail", type=float, default=0.01)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra worker settings")
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--out", help="write the report here as well")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    gemini_port, tripo_port = args.port + 1, args.port + 2
+    gemini_stub, gemini_stats = make_gemini_stub(
+        latency=args.gemini_latency,
+        throttle_rate=args.gemini_429,
+        error_rate=args.gemini_5xx,
+        malformed_rate=args.gemini_malformed,
+        seed=args.seed,
+    )
+    tripo_stub, tripo_stats = make_tripo_stub(
+        polls_until_done=args.tripo_polls,
+        latency=args.tripo_latency,
+        poll_jitter=args.tripo_poll_jitter,
+        throttle_rate=args.tripo_429,
+        error_rate=args.tripo_5xx,
+        fail_rate=args.tripo_fail,
+        seed=args.seed,
+    )
+    serve_in_thread(gemini_stub, gemini_port)
+    serve_in_thread(tripo_stub, tripo_port)
+
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        ENV="benchmark",
+        MOCK_EXTERNAL="0",
+        MOCK_GEMINI="0",
+        MOCK_TRIPO="0",
+        GEMINI_API_KEY="stub",
+        GEMINI_API_ENDPOINT=f"http://127.0.0.1:{gemini_port}",
+        GEMINI_RETRY_BASE_DELAY="0.05",
+        TRIPO_API_KEY="stub",
+        TRIPO_API_BASE=f"http://127.0.0.1:{tripo_port}",
+        TRIPO_ITD_CREATE_PATH="/v2/create",
+        TRIPO_ITD_STATUS_PATH="/v2/status/{task_id}",
+        TRIPO_POLL_INTERVAL="0.05",
+        TRIPO_POLL_MAX_INTERVAL="0.25",
+        # Stub model URLs don't resolve; mirroring would only log failures.
+        ASSET_STORE="0",
+        IDEA_LIBRARY="0",
+    )
+    env.update(item.split("=", 1) for item in args.env)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        _wait_ready(base_url, proc)
+        gemini_before = gemini_stats.generate_calls
+        tripo_before = tripo_stats.creates + tripo_stats.status_calls
+        report = asyncio.run(_drive(base_url, args))
+        report["peak_rss_mb"] = _peak_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    gemini_calls = gemini_stats.generate_calls - gemini_before
+    tripo_calls = tripo_stats.creates + tripo_stats.status_calls - tripo_before
+    report["upstream"] = {
+        "gemini": {"generate_calls": gemini_calls, "throttled": gemini_stats.throttled,
+                   "errors": gemini_stats.errors, "malformed": gemini_stats.malformed},
+        "tripo": {"creates": tripo_stats.creates, "status_calls": tripo_stats.status_calls,
+                  "throttled": tripo_stats.throttled, "errors": tripo_stats.errors,
+                  "failed_jobs": tripo_stats.failed_jobs, "connections": len(tripo_stats.connections)},
+    }
+    report["upstream_per_request"] = {
+        "gemini": round(gemini_calls / report["requests"], 3) if report["requests"] else 0.0,
+        "tripo": round(tripo_calls / report["requests"], 3) if report["requests"] else 0.0,
+    }
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Latency of cheap idea-only requests next to a burst of 3D requests, and fair share between clients.
+
+Starts uvicorn in a subprocess against the local Gemini and Tripo stubs (Tripo
+tasks take ``--tripo-polls`` polls of TRIPO_POLL_INTERVAL each) with a small
+Gemini concurrency limit, so the two request classes compete for it.
+
+``mixed`` scenario: ``--model-requests`` POST /v1/generate with
+generate_model=true are sent at once, and ``--idea-requests`` idea-only
+requests are spread over the following ``--spread`` seconds. Variants:
+
+- ``pools_off``: scheduler pools and queues large enough never to hold a
+  request back (Gemini calls still queue by request class)
+- ``scheduled``: SCHED_MODEL_CONCURRENCY=``--model-slots``
+
+``fairness`` scenario: with SCHED_IDEAS_CONCURRENCY=``--idea-slots``, one
+client (X-API-Key "greedy") sends ``--greedy`` idea-only requests at once and
+another ("polite") sends ``--polite`` just after. Variants ``fifo``
+(SCHED_FAIR_BY empty) and ``by_key`` (SCHED_FAIR_BY=key).
+
+Reports p50/p95 latency and status counts per request class or client.
+
+Run from backend/:  python -m bench.scheduler
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from .load import _image, _pct, _wait_ready
+from .stub_gemini import make_gemini_stub
+from .stub_tripo import make_tripo_stub, serve_in_thread
+
+
+def _summary(latencies: List[float], statuses: Dict[str, int]) -> dict:
+    latencies.sort()
+    return {"p50_ms": _pct(latencies, 0.5), "p95_ms": _pct(latencies, 0.95), "status_counts": statuses}
+
+
+async def _send(client: httpx.AsyncClient, out: dict, delay: float, **kwargs) -> None:
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    resp = await client.post("/v1/generate", **kwargs)
+    out["statuses"][str(resp.status_code)] = out["statuses"].get(str(resp.status_code), 0) + 1
+    if resp.status_code == 200:
+        out["latencies"].append(time.perf_counter() - started)
+
+
+async def _mixed(base_url: str, args, run: int) -> dict:
+    model = {"latencies": [], "statuses": {}}
+    ideas = {"latencies": [], "statuses": {}}
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        sends = [
+            _send(
+                client, model, 0.0,
+                data={"description": f"壊れた椅子 {run}-{i}", "generate_model": "true"},
+                files=[("images", (f"chair{i}.jpg", _image(run * 1000 + i), "image/jpeg"))],
+            )
+            for i in range(args.model_requests)
+        ]
+        step = args.spread / max(args.idea_requests, 1)
+        sends += [
+            _send(client, ideas, 0.2 + i * step, data={"description": f"空き瓶 {run}-{i}"})
+            for i in range(args.idea_requests)
+        ]
+        await asyncio.gather(*sends)
+    return {
+        "ideas": _summary(ideas["latencies"], ideas["statuses"]),
+        "model": _summary(model["latencies"], model["statuses"]),
+    }
+
+
+async def _fairness(base_url: str, args, run: int) -> dict:
+    greedy = {"latencies": [], "statuses": {}}
+    polite = {"latencies": [], "statuses": {}}
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        sends = [
+            _send(client, greedy, 0.0, data={"description": f"段ボール {run}-{i}"}, headers={"X-API-Key": "greedy"})
+            for i in range(args.greedy)
+        ]
+        sends += [
+            _send(client, polite, 0.1, data={"description": f"古い傘 {run}-{i}"}, headers={"X-API-Key": "polite"})
+            for i in range(args.polite)
+        ]
+        await asyncio.gather(*sends)
+    return {
+        "greedy": _summary(greedy["latencies"], greedy["statuses"]),
+        "polite": _summary(polite["latencies"], polite["statuses"]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-requests", type=int, default=40)
+    parser.add_argument("--idea-requests", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=4.0, help="seconds the idea-only requests are spread over")
+    parser.add_argument("--model-slots", type=int, default=4)
+    parser.add_argument("--idea-slots", type=int, default=2)
+    parser.add_argument("--greedy", type=int, default=30)
+    parser.add_argument("--polite", type=int, default=5)
+    parser.add_argument("--gemini-latency", default="0.3")
+    parser.add_argument("--gemini-concurrency", type=int, default=4)
+    parser.add_argument("--tripo-polls", type=int, default=10)
+    parser.add_argument("--port", type=int, default=18960)
+    args = parser.parse_args()
+
+    gemini_port, tripo_port = args.port + 1, args.port + 2
+    gemini_stub, _ = make_gemini_stub(latency=args.gemini_latency)
+    tripo_stub, _ = make_tripo_stub(polls_until_done=args.tripo_polls)
+    serve_in_thread(gemini_stub, gemini_port)
+    serve_in_thread(tripo_stub, tripo_port)
+
+    base_env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        MOCK_EXTERNAL="0",
+        MOCK_GEMINI="0",
+        MOCK_TRIPO="0",
+        GEMINI_API_KEY="stub",
+        GEMINI_API_ENDPOINT=f"http://127.0.0.1:{gemini_port}",
+        GEMINI_MAX_CONCURRENCY=str(args.gemini_concurrency),
+        GEMINI_LIMIT_INITIAL=str(args.gemini_concurrency),
+        GEMINI_QUEUE_TIMEOUT="60",
+        TRIPO_API_KEY="stub",
+        TRIPO_API_BASE=f"http://127.0.0.1:{tripo_port}",
+        TRIPO_ITD_CREATE_PATH="/v2/create",
+        TRIPO_ITD_STATUS_PATH="/v2/status/{task_id}",
+        TRIPO_POLL_INTERVAL="0.1",
+        ASSET_STORE="0",
+        IDEA_LIBRARY="0",
+        SIMILAR_LOOKUP="0",
+        SCHED_IDEAS_QUEUE_TIMEOUT="60",
+        # Only ordering is compared here; the per-client cap would shed the greedy client's burst.
+        SCHED_CLIENT_MAX_QUEUED="1000",
+        SCHED_MODEL_QUEUE_TIMEOUT="120",
+    )
+    unbounded = {"SCHED_IDEAS_CONCURRENCY": "10000", "SCHED_MODEL_CONCURRENCY": "10000"}
+    runs = [
+        ("mixed", "pools_off", _mixed, unbounded),
+        ("mixed", "scheduled", _mixed, {"SCHED_MODEL_CONCURRENCY": str(args.model_slots)}),
+        ("fairness", "fifo", _fairness, {"SCHED_IDEAS_CONCURRENCY": str(args.idea_slots), "SCHED_FAIR_BY": ""}),
+        ("fairness", "by_key", _fairness, {"SCHED_IDEAS_CONCURRENCY": str(args.idea_slots), "SCHED_FAIR_BY": "key"}),
+    ]
+    base_url = f"http://127.0.0.1:{args.port}"
+    report: Dict[str, dict] = {}
+    for run, (scenario, name, drive, overrides) in enumerate(runs):
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+             "--log-level", "warning"],
+            env={**base_env, **overrides},
+        )
+        try:
+            _wait_ready(base_url, proc)
+            report.setdefault(scenario, {})[name] = asyncio.run(drive(base_url, args, run))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Hit rate and query latency of the near-duplicate description index at 100k entries.
+
+Indexes ``--entries`` synthetic descriptions (item, material, colour, size,
+condition), then queries with
+
+- paraphrases of indexed ones: a word moved, the unit spelled out or
+  abbreviated, a particle added, spacing changed. A hit on the same entry is
+  counted as "same", a hit on another entry (e.g. the same item in another
+  colour) as "other".
+- descriptions of items that were never indexed. Any hit here is a false
+  positive.
+
+Hit rates are reported for several SIMILAR_THRESHOLD values.
+
+Run from backend/:  python -m bench.similar_lookup --entries 100000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import resource
+import time
+
+from app.services.similar import SimilarityIndex
+
+ITEMS = [
+    "ペットボトル", "ガラス瓶", "牛乳パック", "段ボール箱", "空き缶", "トイレットペーパーの芯", "古いTシャツ", "ジーンズ",
+    "卵パック", "ワインのコルク", "木箱", "古タイヤ", "ハンガー", "古新聞", "紙袋", "プラスチック容器", "靴箱", "古いタオル",
+    "ビニール傘", "カセットテープ", "CDケース", "古い靴下", "ジャムの瓶", "ティッシュ箱", "割り箸", "お菓子の缶", "毛糸",
+    "古いカーテン", "ボタン", "ワインボトル", "スプーン", "古い鍋", "植木鉢", "すのこ", "レンガ", "竹", "流木", "古いセーター",
+    "マスキングテープ", "ストロー",
+]
+MATERIALS = ["プラスチック", "ガラス", "紙", "アルミ", "木製", "布", "綿", "ステンレス", "陶器", "ゴム"]
+COLOURS = ["透明", "白", "黒", "赤", "青", "緑", "茶色", "黄色", "ピンク", "灰色"]
+SIZES = [("500", "ml", "ミリリットル"), ("1.5", "l", "リットル"), ("2", "l", "リットル"), ("30", "cm", "センチ"),
+         ("10", "cm", "センチメートル"), ("200", "g", "グラム"), ("1", "kg", "キログラム"), ("50", "cm", "センチ"),
+         ("350", "ml", "ミリリットル"), ("5", "mm", "ミリメートル")]
+CONDITIONS = ["きれい", "少し汚れている", "傷あり", "ラベル付き", "洗浄済み", "へこみあり", "色あせ", "新品同様", "古い", "割れなし"]
+UNSEEN_ITEMS = ["古い自転車のチューブ", "電球", "フロッピーディスク", "釣り糸", "ビーズ", "缶のプルタブ", "古い地図", "鉛筆の削りかす"]
+
+
+def describe(item, material, colour, size, condition, rng: random.Random, paraphrase: bool) -> str:
+    """A description; paraphrases move one word, respell the unit, add a particle and change spacing."""
+    number, unit, spelled = size
+    if not paraphrase:
+        return " ".join([item, material, colour, f"{number}{unit.upper() if unit == 'l' else unit}", condition])
+    parts = [item, material, colour + rng.choice(["", "な", "の"]), f"{number}{rng.choice([unit, spelled])}", condition]
+    moved = parts.pop(rng.randrange(1, len(parts)))
+    parts.insert(rng.randrange(0, len(parts) + 1), moved)
+    return rng.choice(["", " ", "、"]).join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8])
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    combos = list(itertools.product(ITEMS, MATERIALS, COLOURS, SIZES, CONDITIONS))
+    rng.shuffle(combos)
+    combos = combos[: args.entries]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = SimilarityIndex(capacity=args.entries, threshold=min(args.thresholds))
+    started = time.perf_counter()
+    for i, combo in enumerate(combos):
+        index.add(describe(*combo, rng, paraphrase=False), f"k{i}")
+    build = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def run(queries):
+        latencies, results = [], []
+        for text, expected in queries:
+            t0 = time.perf_counter()
+            best = index.search(text, 1)
+            latencies.append(time.perf_counter() - t0)
+            results.append((best[0] if best else (0.0, None), expected))
+        latencies.sort()
+        pct = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e6, 1)
+        return results, {"p50_us": pct(0.5), "p99_us": pct(0.99), "max_us": pct(1.0)}
+
+    sampled = rng.sample(range(len(combos)), min(args.queries, len(combos)))
+    near = [(describe(*combos[i], rng, paraphrase=True), f"k{i}") for i in sampled]
+    near_results, near_latency = run(near)
+    unseen = [
+        (describe(item, rng.choice(MATERIALS), rng.choice(COLOURS), rng.choice(SIZES), rng.choice(CONDITIONS), rng, True), None)
+        for item in rng.choices(UNSEEN_ITEMS, k=args.queries)
+    ]
+    unseen_results, unseen_latency = run(unseen)
+
+    by_threshold = {}
+    for threshold in args.thresholds:
+        same = sum(1 for (score, key), expected in near_results if score >= threshold and key == expected)
+        other = sum(1 for (score, key), expected in near_results if score >= threshold and key != expected)
+        false_hits = sum(1 for (score, _), _ in unseen_results if score >= threshold)
+        by_threshold[str(threshold)] = {
+            "hit_same_entry": round(same / len(near), 3),
+            "hit_other_entry": round(other / len(near), 3),
+            "unseen_false_hit": round(false_hits / len(unseen), 3),
+        }
+
+    print(json.dumps({
+        "entries": len(index),
+        "build_seconds": round(build, 2),
+        "index_rss_mb": round((rss_after - rss_before) / 1024, 1),
+        "query_latency": {"near_duplicate": near_latency, "unseen": unseen_latency},
+        "hit_rate_by_threshold": by_threshold,
+        "examples": [text for text, _ in near[:3]],
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
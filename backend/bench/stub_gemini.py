@@ -0,0 +1,244 @@
+"""Local stand-in for the Gemini REST API (v1beta), used by the benchmarks.
+
+Serves ``GET /v1beta/models``, ``POST /v1beta/models/{model}:generateContent``,
+``:streamGenerateContent?alt=sse`` and the resumable File API upload
+(``POST /upload/v1beta/files``) with a configurable latency
+distribution (see bench/latency.py), returning a canned ideas document
+(streamed in ``stream_chunks`` pieces), or one per ``item_N`` key for packed
+batch prompts. 429s, 503s and malformed JSON can be injected at given rates.
+
+Answers carry ``usageMetadata`` token counts (about one token per four UTF-8
+bytes) and stop at ``maxOutputTokens`` with ``finishReason: MAX_TOKENS``,
+like the real API. With ``varied`` the answer follows the idea and step
+counts the prompt asks for, with step texts of up to ``wordiness`` phrases, and with
+``per_token`` every output token adds that many seconds of latency.
+File URIs the stub didn't issue (or that were dropped from ``stats.files``,
+to simulate expiry or deletion) are rejected with ``missing_file_status``:
+404 NOT_FOUND by default, or 403 PERMISSION_DENIED, both of which Gemini answers.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Set, Union
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .latency import Latency
+
+IDEAS = {
+    "ideas": [
+        {
+            "title": f"アイデア{n}",
+            "description": "スタブが返す固定のアイデアです。",
+            "materials": ["ペットボトル"],
+            "tools": ["はさみ"],
+            "steps": [{"text": "切る", "operation": "切る"}] * 6,
+            "difficulty": "Easy",
+            "estimated_time_minutes": 30,
+        }
+        for n in range(1, 4)
+    ]
+}
+
+
+_BATCH_KEY = re.compile(r"^(item_\d+): ", re.MULTILINE)
+_COUNTS = re.compile(r"日本語で(\d+)案.*?(\d+)〜(\d+)個の手順", re.DOTALL)
+
+
+def _varied_ideas(prompt: str, rng: random.Random, wordiness: int = 6) -> dict:
+    """Ideas in the numbers the prompt asks for; step texts vary in length as real answers do."""
+    found = _COUNTS.search(prompt)
+    ideas, low, high = (int(g) for g in found.groups()) if found else (3, 6, 10)
+    return {
+        "ideas": [
+            {
+                **IDEAS["ideas"][0],
+                "title": f"アイデア{n}",
+                "steps": [
+                    {"text": "材料を定規で測って" * rng.randint(1, wordiness) + "切る", "operation": "切る"}
+                    for _ in range(rng.randint(low, high))
+                ],
+            }
+            for n in range(1, ideas + 1)
+        ]
+    }
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+@dataclass
+class GeminiStubStats:
+    generate_calls: int = 0
+    list_calls: int = 0
+    throttled: int = 0
+    errors: int = 0
+    malformed: int = 0
+    truncated: int = 0
+    output_tokens: int = 0
+    inflight: int = 0
+    peak_inflight: int = 0
+    bytes_received: int = 0
+    file_uploads: int = 0
+    image_parts: int = 0
+    files: Set[str] = field(default_factory=set)
+
+
+def _candidate(text: str, finish: Optional[str] = None, usage: Optional[dict] = None) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish:
+        candidate["finishReason"] = finish
+    out = {"candidates": [candidate]}
+    if usage:
+        out["usageMetadata"] = usage
+    return out
+
+
+def _malform(text: str, rng: random.Random) -> str:
+    """Either wrap in a markdown fence with trailing commas (locally repairable) or cut the document short."""
+    if rng.random() < 0.5:
+        return "```json\n" + text.replace("}]", "},]", 1) + "\n```"
+    return text[: rng.randrange(len(text) // 3, len(text) - 1)]
+
+
+def make_gemini_stub(
+    latency: Union[float, str] = 0.2,
+    stream_chunks: int = 12,
+    capacity: int = 0,
+    tail_rate: float = 0.0,
+    tail_latency: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 1,
+    throttle_rate: float = 0.0,
+    malformed_rate: float = 0.0,
+    varied: bool = False,
+    wordiness: int = 6,
+    per_token: float = 0.0,
+    missing_file_status: int = 404,
+):
+    """Build the stub app.
+
+    With ``capacity`` > 0 the stub throttles like a real provider: past that
+    many concurrent requests it answers 429, and latency grows with the load
+    it accepts. ``tail_rate`` of generate calls take ``tail_latency`` instead
+    of ``latency`` and ``error_rate`` of them fail with a 503, to model
+    Gemini's bursty tail. ``throttle_rate`` of them answer 429 regardless of
+    load and ``malformed_rate`` return broken JSON. ``latency`` is seconds or
+    a distribution spec.
+    """
+    rng = random.Random(seed)
+    latency = Latency(latency)
+    app = FastAPI()
+    stats = GeminiStubStats()
+
+    @app.get("/v1beta/models")
+    async def list_models():
+        stats.list_calls += 1
+        return {
+            "models": [
+                {"name": "models/gemini-2.0-flash", "supportedGenerationMethods": ["generateContent"]},
+            ]
+        }
+
+    @app.post("/upload/v1beta/files")
+    async def upload_start(request: Request):
+        stats.bytes_received += len(await request.body())
+        session = f"f{stats.file_uploads + len(stats.files)}-{rng.randrange(1 << 30):x}"
+        upload_url = f"{request.base_url}upload/v1beta/files/session/{session}"
+        return JSONResponse({}, headers={"x-goog-upload-url": upload_url})
+
+    @app.post("/upload/v1beta/files/session/{session}")
+    async def upload_finalize(session: str, request: Request):
+        stats.bytes_received += len(await request.body())
+        stats.file_uploads += 1
+        uri = f"{request.base_url}v1beta/files/{session}"
+        stats.files.add(uri)
+        return {"file": {"name": f"files/{session}", "uri": uri, "state": "ACTIVE"}}
+
+    @app.post("/v1beta/models/{target}")
+    async def generate(target: str, request: Request):
+        raw = await request.body()
+        stats.bytes_received += len(raw)
+        body = json.loads(raw)
+        stats.generate_calls += 1
+        parts = [p for c in body.get("contents", []) for p in c.get("parts", [])]
+        for uri in (p["fileData"].get("fileUri") for p in parts if "fileData" in p):
+            if uri not in stats.files:
+                if missing_file_status == 403:
+                    message = f"You do not have permission to access the File {uri} or it may not exist."
+                    error = {"code": 403, "message": message, "status": "PERMISSION_DENIED"}
+                else:
+                    error = {"code": 404, "message": f"File {uri} not found.", "status": "NOT_FOUND"}
+                return JSONResponse({"error": error}, status_code=error["code"])
+        stats.image_parts += sum(1 for p in parts if "fileData" in p or "inlineData" in p)
+        if capacity and stats.inflight >= capacity:
+            stats.throttled += 1
+            return JSONResponse({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, status_code=429)
+        if throttle_rate and rng.random() < throttle_rate:
+            stats.throttled += 1
+            return JSONResponse(
+                {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, status_code=429, headers={"Retry-After": "1"}
+            )
+        if error_rate and rng.random() < error_rate:
+            stats.errors += 1
+            return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, status_code=503)
+        prompt = "".join(p.get("text", "") for p in parts)
+        keys = _BATCH_KEY.findall(prompt)
+        # Packed batch prompt: answer every item key with the canned ideas.
+        answer = _varied_ideas(prompt, rng, wordiness) if varied and not keys else IDEAS
+        text = json.dumps({"results": {k: IDEAS for k in keys}} if keys else answer, ensure_ascii=False)
+        if malformed_rate and rng.random() < malformed_rate:
+            stats.malformed += 1
+            text = _malform(text, rng)
+        finish = "STOP"
+        limit = (body.get("generationConfig") or {}).get("maxOutputTokens")
+        if limit and _tokens(text) > limit:
+            stats.truncated += 1
+            finish, text = "MAX_TOKENS", text[: len(text) * limit // _tokens(text)]
+        usage = {"promptTokenCount": _tokens(prompt), "candidatesTokenCount": _tokens(text)}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+        stats.output_tokens += usage["candidatesTokenCount"]
+        if target.endswith(":streamGenerateContent"):
+            size = max(1, len(text) // stream_chunks + 1)
+            pause = (latency.sample(rng) + per_token * usage["candidatesTokenCount"]) / stream_chunks
+
+            async def sse():
+                for i in range(0, len(text), size):
+                    await asyncio.sleep(pause)
+                    last = i + size >= len(text)
+                    chunk = _candidate(text[i:i + size], finish if last else None, usage if last else None)
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+
+            return StreamingResponse(sse(), media_type="text/event-stream")
+        stats.inflight += 1
+        stats.peak_inflight = max(stats.peak_inflight, stats.inflight)
+        try:
+            delay = tail_latency if tail_rate and rng.random() < tail_rate else latency.sample(rng)
+            delay += per_token * usage["candidatesTokenCount"]
+            if delay:
+                load = stats.inflight / capacity if capacity else 0.0
+                await asyncio.sleep(delay * (1.0 + load))
+        finally:
+            stats.inflight -= 1
+        return _candidate(text, finish, usage)
+
+    return app, stats
+
+
+if __name__ == "__main__":
+    # Standalone, so a benchmark's stub doesn't compete with its load generator for one interpreter.
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=18960)
+    parser.add_argument("--latency", default="0.05")
+    args = parser.parse_args()
+    uvicorn.run(make_gemini_stub(latency=args.latency)[0], host="127.0.0.1", port=args.port, log_level="warning")
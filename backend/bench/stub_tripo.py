@@ -0,0 +1,116 @@
+"""Local stand-in for the Tripo image-to-3D API, used by the benchmarks.
+
+Jobs report ``running`` for ``polls_until_done`` status calls (plus up to
+``poll_jitter`` more) and then ``success`` with a model URL, or ``failed``
+for ``fail_rate`` of them; ``POST /v2/status/batch`` answers several task
+ids at once. Creates can be made to answer 429 or 500 at given rates, and
+every call waits a latency drawn from ``latency`` (see bench/latency.py).
+The stub records every TCP connection it sees so benchmarks can show
+connection reuse.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Set, Tuple, Union
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .latency import Latency
+
+
+@dataclass
+class StubStats:
+    creates: int = 0
+    status_calls: int = 0
+    throttled: int = 0
+    errors: int = 0
+    failed_jobs: int = 0
+    connections: Set[Tuple[str, int]] = field(default_factory=set)
+
+
+def make_tripo_stub(
+    polls_until_done: int = 2,
+    latency: Union[float, str] = 0.0,
+    poll_jitter: int = 0,
+    throttle_rate: float = 0.0,
+    error_rate: float = 0.0,
+    fail_rate: float = 0.0,
+    seed: int = 1,
+) -> Tuple[FastAPI, StubStats]:
+    app = FastAPI()
+    stats = StubStats()
+    rng = random.Random(seed)
+    latency = Latency(latency)
+    polls: Dict[str, int] = {}
+    # Per task: polls needed, and whether it ends in failure.
+    plans: Dict[str, Tuple[int, bool]] = {}
+    ids = itertools.count(1)
+
+    async def _wait() -> None:
+        delay = latency.sample(rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+    @app.middleware("http")
+    async def _track(request: Request, call_next):
+        if request.client:
+            stats.connections.add((request.client.host, request.client.port))
+        return await call_next(request)
+
+    @app.post("/v2/create")
+    async def create(request: Request):
+        await request.body()
+        stats.creates += 1
+        await _wait()
+        if throttle_rate and rng.random() < throttle_rate:
+            stats.throttled += 1
+            return JSONResponse({"message": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        if error_rate and rng.random() < error_rate:
+            stats.errors += 1
+            return JSONResponse({"message": "internal error"}, status_code=500)
+        task_id = f"task-{next(ids)}"
+        polls[task_id] = 0
+        plans[task_id] = (polls_until_done + rng.randint(0, poll_jitter), bool(fail_rate) and rng.random() < fail_rate)
+        return {"task_id": task_id}
+
+    def _advance(task_id: str) -> dict:
+        polls[task_id] = polls.get(task_id, 0) + 1
+        needed, fails = plans.get(task_id, (polls_until_done, False))
+        if polls[task_id] < needed:
+            return {"status": "running"}
+        if fails:
+            if polls[task_id] == needed:
+                stats.failed_jobs += 1
+            return {"status": "failed", "message": "stub: generation failed"}
+        return {"status": "success", "model_url": f"http://stub/{task_id}.glb"}
+
+    @app.get("/v2/status/{task_id}")
+    async def status(task_id: str):
+        stats.status_calls += 1
+        await _wait()
+        return _advance(task_id)
+
+    @app.post("/v2/status/batch")
+    async def status_batch(body: dict):
+        stats.status_calls += 1
+        await _wait()
+        return {"data": {tid: _advance(tid) for tid in body.get("task_ids", [])}}
+
+    return app, stats
+
+
+def serve_in_thread(app: FastAPI, port: int) -> uvicorn.Server:
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,77 @@
+"""Per-request httpx client vs. the app-lifetime pooled client for Tripo jobs.
+
+Run from backend/:  python -m bench.tripo_pool --jobs 64
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.config import settings
+from app.services.http import close_clients, get_client, open_clients
+from app.services.tripo import TripoClient
+
+from .stub_tripo import make_tripo_stub, serve_in_thread
+
+IMAGE = b"\xff\xd8\xff" + b"\0" * 200_000
+
+
+async def _run(mode: str, jobs: int) -> dict:
+    if mode == "pooled":
+        await open_clients()
+    latencies = []
+
+    async def one():
+        started = time.perf_counter()
+        # Without a shared client TripoClient opens (and closes) its own per job.
+        await TripoClient(client=get_client("tripo")).generate_from_images([("a.jpg", IMAGE)])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(jobs)))
+    wall = time.perf_counter() - started
+    await close_clients()
+    latencies.sort()
+    return {
+        "wall_seconds": round(wall, 3),
+        "jobs_per_second": round(jobs / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--polls", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18931)
+    parser.add_argument("--batch", action="store_true", help="poll through the stub's batched status endpoint")
+    args = parser.parse_args()
+
+    settings.mock_tripo = False
+    settings.tripo_api_key = "stub"
+    settings.tripo_api_base = f"http://127.0.0.1:{args.port}"
+    settings.tripo_create_path = "/v2/create"
+    settings.tripo_status_path = "/v2/status/{task_id}"
+    settings.tripo_poll_interval = 0.05
+    settings.tripo_batch_status_path = "/v2/status/batch" if args.batch else ""
+
+    results = {}
+    for mode in ("per_request", "pooled"):
+        app, stats = make_tripo_stub(polls_until_done=args.polls)
+        server = serve_in_thread(app, args.port)
+        try:
+            results[mode] = asyncio.run(_run(mode, args.jobs))
+        finally:
+            server.should_exit = True
+            time.sleep(0.2)
+        results[mode]["tcp_connections"] = len(stats.connections)
+        results[mode]["upstream_requests"] = stats.creates + stats.status_calls
+    print(json.dumps({"jobs": args.jobs, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Peak server RSS while N clients upload ~10 MB photos concurrently with generate_model=true.
+
+Starts uvicorn in a subprocess (mock Gemini/Tripo, so only upload handling and
+preprocessing are measured) and reads VmHWM from /proc after the burst. Run it
+on two revisions to compare.
+
+Run from backend/:  python -m bench.upload_memory --clients 16 --size-mb 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def _photo(size_mb: float, seed: int) -> bytes:
+    """A JPEG of roughly the requested size (random noise compresses poorly)."""
+    from PIL import Image
+
+    side = int((size_mb * 1024 * 1024 / 1.1) ** 0.5)
+    img = Image.frombytes("L", (side, side), os.urandom(side * side)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def _rss_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _burst(url: str, photos: list) -> list:
+    async with httpx.AsyncClient(timeout=300) as client:
+        async def one(photo: bytes):
+            resp = await client.post(
+                url,
+                data={"description": "ペットボトル", "generate_model": "true"},
+                files=[("images", ("photo.jpg", photo, "image/jpeg"))],
+            )
+            return resp.status_code
+
+        return await asyncio.gather(*(one(p) for p in photos))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--size-mb", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=18933)
+    args = parser.parse_args()
+
+    photos = [_photo(args.size_mb, i) for i in range(args.clients)]
+    env = dict(os.environ, MOCK_EXTERNAL="1", RESULT_CACHE_BACKEND="off", UPLOAD_MAX_INFLIGHT_BYTES=str(1 << 40))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        base = f"http://127.0.0.1:{args.port}"
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/health", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        idle = _rss_kb(proc.pid, "VmRSS")
+        started = time.perf_counter()
+        statuses = asyncio.run(_burst(f"{base}/v1/generate", photos))
+        elapsed = time.perf_counter() - started
+        peak = _rss_kb(proc.pid, "VmHWM")
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(json.dumps({
+        "clients": args.clients,
+        "upload_mb_each": round(len(photos[0]) / 1024 / 1024, 2),
+        "statuses": {str(s): statuses.count(s) for s in set(statuses)},
+        "seconds": round(elapsed, 2),
+        "idle_rss_mb": round(idle / 1024, 1),
+        "peak_rss_mb": round(peak / 1024, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
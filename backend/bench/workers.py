@@ -0,0 +1,152 @@
+"""Throughput of /v1/generate as uvicorn workers scale from 1 to N, with shared state in a SQLite store.
+
+For each worker count the app runs as ``uvicorn --workers N`` with
+SHARED_STORE_URL, RESULT_CACHE_BACKEND=shared and JOB_STORE_BACKEND=shared
+(the production mode). The Gemini stub runs in its own process with a short
+latency, so the app's own CPU work becomes the limit: multipart parsing,
+response parsing and validation, JSON encoding. ``--clients`` load-generator
+processes keep ``--concurrency`` requests each in flight for ``--duration``
+seconds, all with unique descriptions (every request reaches the stub).
+
+The gain is bounded by the cores available to the app, stub and load
+generator together; ``cpu_count`` is in the report.
+
+Run from backend/:  python -m bench.workers --workers 1 2 4 --duration 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+
+def _client(base_url: str, concurrency: int, duration: float, tag: str, out) -> None:
+    async def run() -> List[float]:
+        latencies: List[float] = []
+        deadline = time.perf_counter() + duration
+        counter = iter(range(10**9))
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+
+            async def loop() -> None:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    resp = await client.post("/v1/generate", data={"description": f"古い木箱 {tag} {next(counter)}"})
+                    if resp.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return latencies
+
+    out.put(asyncio.run(run()))
+
+
+def _wait_ready(base_url: str, workers: int, timeout: float = 60) -> None:
+    """Until ``workers`` distinct processes have answered /health and /ready is 200."""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    # A fresh connection per probe, so the kernel spreads them over the workers.
+    headers = {"Connection": "close"}
+    while time.monotonic() < deadline:
+        try:
+            seen.add(httpx.get(f"{base_url}/health", headers=headers).json()["worker"]["id"])
+            if len(seen) >= workers and httpx.get(f"{base_url}/ready", headers=headers).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"only {len(seen)} of {workers} workers answered")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=2, help="load-generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", default="0.05", help="Gemini stub latency (bench/latency.py spec)")
+    parser.add_argument("--port", type=int, default=18950)
+    args = parser.parse_args()
+
+    stub_port = args.port + 1
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stub_gemini", "--port", str(stub_port), "--latency", args.latency],
+        env=dict(os.environ, PYTHONPATH=os.getcwd()),
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    try:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    PYTHONPATH=os.getcwd(),
+                    ENV="benchmark",
+                    MOCK_EXTERNAL="0",
+                    MOCK_GEMINI="0",
+                    GEMINI_API_KEY="stub",
+                    GEMINI_API_ENDPOINT=f"http://127.0.0.1:{stub_port}",
+                    GEMINI_MAX_CONCURRENCY="256",
+                    GEMINI_LIMIT_INITIAL="256",
+                    GEMINI_QUEUE_SIZE="1024",
+                    WORKERS=str(workers),
+                    SHARED_STORE_URL=f"sqlite:///{tmp}/shared.sqlite3",
+                    RESULT_CACHE_BACKEND="shared",
+                    JOB_STORE_BACKEND="shared",
+                    IDEA_LIBRARY="0",
+                    ASSET_STORE="0",
+                    SIMILAR_LOOKUP="0",
+                )
+                app = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+                     "--workers", str(workers), "--log-level", "warning"],
+                    env=env,
+                )
+                try:
+                    _wait_ready(base_url, workers)
+                    out = multiprocessing.Queue()
+                    procs = [
+                        multiprocessing.Process(
+                            target=_client, args=(base_url, args.concurrency, args.duration, f"{workers}-{i}", out)
+                        )
+                        for i in range(args.clients)
+                    ]
+                    started = time.perf_counter()
+                    for p in procs:
+                        p.start()
+                    latencies = sorted(x for _ in procs for x in out.get())
+                    for p in procs:
+                        p.join()
+                    wall = time.perf_counter() - started
+                finally:
+                    app.terminate()
+                    app.wait(timeout=30)
+            pct = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+            results[str(workers)] = {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / wall, 1),
+                "p50_ms": pct(0.5),
+                "p99_ms": pct(0.99),
+            }
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    base = results[str(args.workers[0])]["throughput_rps"]
+    print(json.dumps({
+        "cpu_count": os.cpu_count(),
+        "results": results,
+        "speedup": {k: round(v["throughput_rps"] / base, 2) for k, v in results.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
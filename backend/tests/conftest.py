@@ -0,0 +1,51 @@
+import os
+import socket
+
+# Before the app modules read their settings: nothing persistent, nothing shared between tests.
+os.environ.update(SHARED_STORE_URL="", ASSET_STORE="0", IDEA_LIBRARY="0", RESULT_CACHE_BACKEND="memory")
+
+import pytest  # noqa: E402
+
+from bench.stub_tripo import serve_in_thread  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def serve():
+    """Start a stub app on a free local port; returns its base URL. Stopped after the test."""
+    servers = []
+
+    def start(app) -> str:
+        port = _free_port()
+        servers.append(serve_in_thread(app, port))
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+@pytest.fixture
+def gemini_stub(serve, monkeypatch):
+    """Point the Gemini client (REST calls and the SDK's model listing) at a stub app for this test."""
+    from app.config import settings
+    from app.services.gemini_registry import registry
+
+    def use(app) -> str:
+        url = serve(app)
+        monkeypatch.setattr(settings, "mock_gemini", False)
+        monkeypatch.setattr(settings, "gemini_api_key", "stub")
+        monkeypatch.setattr(settings, "gemini_api_endpoint", url)
+        # The SDK is configured once per process, with the endpoint of that moment.
+        registry._configured = False
+        registry.invalidate()
+        return url
+
+    yield use
+    registry._configured = False
+    registry.invalidate()
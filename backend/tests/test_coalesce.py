@@ -0,0 +1,78 @@
+import asyncio
+
+from app.services.coalesce import SingleFlight
+from app.services.shared import SQLiteStore
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "ideas"
+
+        results = await asyncio.gather(*(flight.do("key", fn) for _ in range(5)))
+        assert results == ["ideas"] * 5
+        assert len(calls) == 1
+        assert (flight.leaders, flight.followers) == (1, 4)
+        assert flight.inflight() == 0
+
+    asyncio.run(run())
+
+
+def test_shared_call_is_cancelled_only_when_every_caller_left():
+    async def run():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fn():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(flight.do("key", fn))
+        second = asyncio.create_task(flight.do("key", fn))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set()
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert cancelled.is_set()
+        assert flight.inflight() == 0
+
+    asyncio.run(run())
+
+
+def test_workers_sharing_a_store_make_one_call(tmp_path):
+    async def run():
+        store = SQLiteStore(str(tmp_path / "shared.db"))
+        results = {}
+        workers = [SingleFlight("test", store), SingleFlight("test", store)]
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            results["key"] = "ideas"
+            return "ideas"
+
+        async def lookup():
+            return results.get("key")
+
+        try:
+            got = await asyncio.gather(*(w.do("key", fn, lookup=lookup) for w in workers))
+            assert got == ["ideas", "ideas"]
+            assert len(calls) == 1
+            assert sum(w.remote_followers for w in workers) == 1
+        finally:
+            await store.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import time
+
+from app.services.gemini_registry import ModelRegistry, ResolvedModel
+
+
+def _registry(outcomes, ttl=3600.0, error_ttl=0.05) -> ModelRegistry:
+    """A registry whose resolutions come from ``outcomes``: a model name, or None for a failed listing."""
+    registry = ModelRegistry(ttl=ttl, error_ttl=error_ttl)
+
+    def resolve():
+        name = outcomes.pop(0)
+        if name is None:
+            return ResolvedModel("models/fallback", {}, listing_error="listing failed")
+        return ResolvedModel(f"models/{name}", {})
+
+    registry._resolve = resolve
+    return registry
+
+
+def _settle(registry: ModelRegistry) -> None:
+    deadline = time.monotonic() + 5
+    while registry._refreshing and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_fallback_after_a_failed_listing_is_retried_soon():
+    registry = _registry([None, "gemini-2.0-flash"])
+    assert registry.get().full_name == "models/fallback"
+    time.sleep(0.06)
+    # Still served while the listing is retried in the background.
+    assert registry.get().full_name == "models/fallback"
+    _settle(registry)
+    assert registry.get().full_name == "models/gemini-2.0-flash"
+
+
+def test_listed_model_is_kept_when_a_refresh_fails():
+    registry = _registry(["gemini-2.0-flash", None, "gemini-2.5-flash"], ttl=0.05, error_ttl=0.05)
+    assert registry.get().full_name == "models/gemini-2.0-flash"
+    time.sleep(0.06)
+    registry.get()
+    _settle(registry)
+    assert registry.get().full_name == "models/gemini-2.0-flash"
+    time.sleep(0.06)
+    registry.get()
+    _settle(registry)
+    assert registry.get().full_name == "models/gemini-2.5-flash"
+
+
+def test_listed_model_lasts_the_full_ttl():
+    registry = _registry(["gemini-2.0-flash"])
+    registry.get()
+    time.sleep(0.06)
+    registry.get()
+    assert not registry._refreshing
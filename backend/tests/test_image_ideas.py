@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from app.config import settings
+from bench.load import _image
+from bench.stub_gemini import make_gemini_stub
+from bench.stub_tripo import make_tripo_stub
+
+
+@pytest.fixture
+def stubs(serve, gemini_stub, monkeypatch):
+    """Gemini and Tripo stubs behind the app, with photos sent inline; returns the Gemini stub's stats."""
+    app, stats = make_gemini_stub(latency=0.0)
+    gemini_stub(app)
+    tripo_stub, _ = make_tripo_stub(polls_until_done=1)
+    for name, value in {
+        "mock_tripo": False,
+        "gemini_image_transport": "inline",
+        "tripo_api_key": "stub",
+        "tripo_api_base": serve(tripo_stub),
+        "tripo_create_path": "/v2/create",
+        "tripo_status_path": "/v2/status/{task_id}",
+        "tripo_batch_status_path": "",
+        "tripo_poll_interval": 0.01,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return stats
+
+
+def _generate(description: str, photo: bytes, **form) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=30) as client:
+            return await client.post(
+                "/v1/generate",
+                data={"description": description, "image_ideas": "true", **form},
+                files=[("images", ("shot.jpg", photo, "image/jpeg"))],
+            )
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("setting, value", [("image_decode_cache", 0), ("image_preprocess", False)])
+def test_photos_reach_gemini_when_the_model_flight_starts_first(stubs, monkeypatch, setting, value):
+    # Without a shared decode to fall back on, the ideas branch reads the uploads themselves.
+    monkeypatch.setattr(settings, setting, value)
+    get = main.result_cache.get
+
+    async def slow_idea_lookups(key):
+        # The idea lookups (cache, library, near-duplicates) finish well after the Tripo cache miss,
+        # so the model flight has taken over the uploads by the time the ideas branch would read them.
+        if key.startswith("ideas:"):
+            await asyncio.sleep(0.2)
+        return await get(key)
+
+    monkeypatch.setattr(main.result_cache, "get", slow_idea_lookups)
+    resp = _generate(f"古い木箱 {setting}", _image(len(setting)), generate_model="true")
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["model"]["model_url"]
+    assert stubs.image_parts == 1
+
+
+@pytest.mark.parametrize("status", [404, 403])
+def test_expired_file_uri_is_uploaded_again(gemini_stub, monkeypatch, status):
+    app, stats = make_gemini_stub(latency=0.0, missing_file_status=status)
+    gemini_stub(app)
+    monkeypatch.setattr(settings, "gemini_image_transport", "files")
+    photo = _image(200 + status)
+    assert _generate(f"古いジーンズ {status}", photo).status_code == 200
+    listed = stats.list_calls
+    # Gemini dropped the file; the app still has its URI cached.
+    stats.files.clear()
+    resp = _generate(f"古いジーンズ {status} 2", photo)
+    assert resp.status_code == 200, resp.text
+    assert stats.file_uploads == 2
+    # A missing file is not mistaken for a missing model.
+    assert stats.list_calls == listed
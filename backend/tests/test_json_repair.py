@@ -0,0 +1,89 @@
+import asyncio
+import copy
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import gemini
+from app.services.gemini import _parse_ideas, _parse_ideas_locally
+from app.services.json_repair import recover_json, repair_json, validate_ideas
+from bench.stub_gemini import IDEAS
+
+DOC = json.dumps(IDEAS, ensure_ascii=False)
+
+
+def test_clean_and_fenced_json_parse_directly():
+    for text in (DOC, f"Here you go:\n```json\n{DOC}\n```"):
+        tier, ideas = _parse_ideas_locally(text)
+        assert tier == "direct"
+        assert ideas == IDEAS
+
+
+def test_trailing_comma_goes_through_the_sanitizer():
+    tier, ideas = _parse_ideas_locally(DOC.replace("}]}", "},]}"))
+    assert tier == "sanitized"
+    assert "degraded" not in ideas
+
+
+def test_truncated_output_is_recovered_and_marked_degraded():
+    tier, ideas = _parse_ideas_locally(DOC[: int(len(DOC) * 0.8)])
+    assert tier == "recovered"
+    assert ideas["degraded"] == "recovered"
+    assert 0 < len(ideas["ideas"]) < len(IDEAS["ideas"])
+
+
+def test_invalid_ideas_are_dropped_and_the_rest_marked_partial():
+    doc = copy.deepcopy(IDEAS)
+    del doc["ideas"][0]["title"]
+    tier, ideas = _parse_ideas_locally(json.dumps(doc, ensure_ascii=False))
+    assert tier == "direct"
+    assert ideas["degraded"] == "partial"
+    assert len(ideas["ideas"]) == len(IDEAS["ideas"]) - 1
+
+
+def test_unrecoverable_text_parses_to_nothing():
+    assert _parse_ideas_locally("I can't help with that.") == (None, None)
+    assert validate_ideas({"ideas": []}) == (None, 0)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": [1, 2,]}', {"a": [1, 2]}),
+        ('{"a": "say "hi" now"}', {"a": 'say "hi" now'}),
+        ("{“a”: “b”}", {"a": "b"}),
+        ('{"a": [1, {"b": "c', {"a": [1, {}]}),
+        ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),
+    ],
+)
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_recover_json_raises_value_error_when_nothing_is_left():
+    with pytest.raises(ValueError):
+        recover_json("no json here")
+
+
+def test_falls_back_to_gemini_repair(monkeypatch):
+    calls = []
+
+    async def repair(raw_text, http, resolved):
+        calls.append(raw_text)
+        return IDEAS
+
+    monkeypatch.setattr(gemini, "_repair_json_with_gemini", repair)
+    ideas = asyncio.run(_parse_ideas("Sorry, here are ideas: one, two", None, None))
+    assert ideas == IDEAS
+    assert len(calls) == 1
+
+
+def test_failed_repair_is_a_502(monkeypatch):
+    async def repair(raw_text, http, resolved):
+        return {"not": "ideas"}
+
+    monkeypatch.setattr(gemini, "_repair_json_with_gemini", repair)
+    with pytest.raises(HTTPException) as failed:
+        asyncio.run(_parse_ideas("garbage", None, None))
+    assert failed.value.status_code == 502
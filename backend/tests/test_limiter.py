@@ -0,0 +1,226 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services import gemini
+from app.services.gemini_registry import registry
+from app.services.http import close_clients, open_clients
+from app.services.limiter import AdaptiveLimiter, Saturated, upstream_priority
+from bench.stub_gemini import make_gemini_stub
+
+
+def _limiter(initial=1, max_limit=None, max_queue=8, queue_timeout=5.0, **kwargs) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        "test",
+        initial=initial,
+        min_limit=1,
+        max_limit=max_limit or initial,
+        max_queue=max_queue,
+        queue_timeout=queue_timeout,
+        latency_tolerance=None,
+        **kwargs,
+    )
+
+
+async def _hold(limiter: AdaptiveLimiter, release: asyncio.Event, deadline=None) -> None:
+    async with limiter.slot(deadline):
+        await release.wait()
+
+
+async def _queued(limiter: AdaptiveLimiter, n: int) -> None:
+    while len(limiter._waiters) < n:
+        await asyncio.sleep(0.001)
+
+
+def _assert_shed(e: HTTPException) -> None:
+    assert isinstance(e, Saturated)
+    assert e.status_code == 503
+    assert int(e.headers["Retry-After"]) >= 1
+
+
+def test_sheds_with_retry_after_when_queue_is_full():
+    async def run():
+        limiter = _limiter(max_queue=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(limiter, release))
+        await _queued(limiter, 1)
+        with pytest.raises(Saturated) as shed:
+            async with limiter.slot():
+                pass
+        _assert_shed(shed.value)
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.shed == 1
+        assert limiter.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_sheds_when_deadline_leaves_no_time_for_a_call():
+    async def run():
+        limiter = _limiter()
+        limiter.latency = 1.0
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(Saturated) as shed:
+            async with limiter.slot(deadline=time.monotonic() + 0.5):
+                pass
+        # Shed up front, not after waiting out the queue timeout.
+        assert time.monotonic() - started < 0.1
+        _assert_shed(shed.value)
+        release.set()
+        await holder
+
+    asyncio.run(run())
+
+
+def test_sheds_after_queue_timeout_and_keeps_no_slot():
+    async def run():
+        limiter = _limiter(queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0)
+        with pytest.raises(Saturated):
+            async with limiter.slot():
+                pass
+        assert len(limiter._waiters) == 0
+        release.set()
+        await holder
+        assert limiter.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_halves_limit_on_429_once_per_latency_window():
+    async def run():
+        limiter = _limiter(initial=8, max_limit=16)
+        limiter.latency = 1.0  # one decrease per second at most
+
+        async def throttled():
+            async with limiter.slot() as slot:
+                slot.observe_status(429)
+
+        await asyncio.gather(throttled(), throttled(), throttled())
+        assert limiter.limit == 4.0
+
+    asyncio.run(run())
+
+
+def test_client_errors_are_not_learned_from():
+    async def run():
+        limiter = _limiter(initial=8, max_limit=16)
+        async with limiter.slot() as slot:
+            slot.observe_status(404)
+        assert limiter.limit == 8.0
+        assert limiter.latency is None
+
+    asyncio.run(run())
+
+
+def test_grows_additively_while_the_limit_is_in_use():
+    async def run():
+        limiter = _limiter(initial=2, max_limit=4)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(_hold(limiter, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*holders)
+        assert 2.0 < limiter.limit <= 3.0
+
+    asyncio.run(run())
+
+
+def test_waiters_are_granted_by_priority_with_a_share_for_the_lower_one():
+    async def run():
+        limiter = _limiter(max_queue=16)
+        order = []
+
+        async def call(label: str, priority: int):
+            upstream_priority.set(priority)
+            async with limiter.slot():
+                order.append(label)
+
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0)
+        tasks = []
+        for label, priority in [(f"model{i}", 1) for i in range(4)] + [(f"ideas{i}", 0) for i in range(5)]:
+            tasks.append(asyncio.create_task(call(label, priority)))
+            await _queued(limiter, len(tasks))
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        # Idea-only calls first, but every SHARE-th grant goes to the waiting 3D call.
+        assert order == ["ideas0", "ideas1", "ideas2", "model0", "ideas3", "ideas4", "model1", "model2", "model3"]
+
+    asyncio.run(run())
+
+
+def test_slot_freed_on_one_loop_is_granted_to_a_waiter_on_another():
+    limiter = _limiter()
+    granted = threading.Event()
+
+    def other_loop():
+        async def wait():
+            async with limiter.slot():
+                granted.set()
+
+        asyncio.run(wait())
+
+    async def run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0)
+        thread = threading.Thread(target=other_loop)
+        thread.start()
+        await _queued(limiter, 1)
+        assert not granted.is_set()
+        release.set()
+        await holder
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(run())
+    assert granted.is_set()
+    assert limiter.inflight == 0
+
+
+def test_adapts_to_a_throttling_provider(gemini_stub, monkeypatch):
+    stub, stats = make_gemini_stub(latency=0.05, capacity=3)
+    gemini_stub(stub)
+    monkeypatch.setattr(settings, "gemini_retry_base_delay", 0.01)
+    monkeypatch.setattr(settings, "gemini_retry_max_delay", 0.05)
+    limiter = AdaptiveLimiter("gemini", 12, 1, 12, 64, 2.0, latency_tolerance=None)
+    monkeypatch.setattr(gemini, "gemini_limiter", limiter)
+    registry.get()
+
+    outcomes = {"ok": 0, "503": 0}
+
+    async def client():
+        for n in range(4):
+            try:
+                await gemini.generate_diy_ideas_async(f"ペットボトル {n}")
+                outcomes["ok"] += 1
+            except HTTPException as e:
+                assert e.status_code == 503, e.detail
+                outcomes["503"] += 1
+                await asyncio.sleep(0.02)
+
+    async def run():
+        await open_clients()
+        try:
+            await asyncio.gather(*(client() for _ in range(12)))
+        finally:
+            await close_clients()
+
+    asyncio.run(run())
+    assert stats.throttled > 0
+    assert limiter.limit < 12
+    assert outcomes["ok"] > 0
+    assert limiter.inflight == 0
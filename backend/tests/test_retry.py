@@ -0,0 +1,19 @@
+import pytest
+
+from app.services.retry import HedgeBudget, RetryPolicy
+
+
+def test_retry_delay_is_jittered_under_the_backoff_ceiling():
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for retry, ceiling in ((1, 0.5), (2, 1.0), (3, 2.0), (6, 2.0)):
+        assert all(0 <= policy.delay(retry) <= ceiling for _ in range(50))
+    # A server's Retry-After is respected even above the ceiling.
+    assert policy.delay(1, hint=5.0) == 5.0
+
+
+@pytest.mark.parametrize("ratio, primaries, allowed", [(0.0, 100, 1), (0.1, 100, 11), (0.5, 10, 6)])
+def test_hedge_budget_caps_hedges_at_a_fraction_of_primaries(ratio, primaries, allowed):
+    budget = HedgeBudget(ratio)
+    for _ in range(primaries):
+        budget.primary()
+    assert sum(budget.try_spend() for _ in range(primaries)) == allowed
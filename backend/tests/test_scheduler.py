@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app.services.limiter import Saturated
+from app.services.scheduler import RequestQueue
+
+
+def _queue(**kwargs) -> RequestQueue:
+    options = dict(priority=0, concurrency=1, max_queue=16, queue_timeout=5.0, client_max_queued=8)
+    options.update(kwargs)
+    return RequestQueue("test", **options)
+
+
+async def _waiting(queue: RequestQueue, n: int) -> None:
+    while queue.queued < n:
+        await asyncio.sleep(0.001)
+
+
+def test_free_slots_go_round_robin_over_waiting_clients():
+    async def run():
+        queue = _queue()
+        order = []
+        holder = await queue.acquire("greedy")
+
+        async def request(client: str, n: int):
+            async with queue.admit(client):
+                order.append(f"{client}{n}")
+
+        tasks = []
+        for client, n in [("greedy", 1), ("greedy", 2), ("greedy", 3), ("polite", 1), ("polite", 2)]:
+            tasks.append(asyncio.create_task(request(client, n)))
+            await _waiting(queue, len(tasks))
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["greedy1", "polite1", "greedy2", "polite2", "greedy3"]
+        assert queue.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_sheds_a_client_over_its_share_of_the_queue():
+    async def run():
+        queue = _queue(client_max_queued=1)
+        holder = await queue.acquire("greedy")
+        waiter = asyncio.create_task(queue.acquire("greedy"))
+        await _waiting(queue, 1)
+        with pytest.raises(Saturated) as shed:
+            await queue.acquire("greedy")
+        assert shed.value.status_code == 503
+        assert int(shed.value.headers["Retry-After"]) >= 1
+        # Another client still gets in line.
+        other = asyncio.create_task(queue.acquire("polite"))
+        await _waiting(queue, 2)
+        holder.release()
+        (await waiter).release()
+        (await other).release()
+        assert queue.inflight == 0
+
+    asyncio.run(run())
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.tripo import TripoClient, TripoPoller
+from bench.stub_tripo import make_tripo_stub
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "tripo_poll_interval", 0.01)
+    monkeypatch.setattr(settings, "tripo_poll_max_interval", 0.02)
+    monkeypatch.setattr(settings, "tripo_poll_timeout", 3.0)
+    monkeypatch.setattr(settings, "tripo_batch_status_path", "")
+
+
+def _status_server(polls_until_done=3, slow=1.0):
+    """Status endpoint keyed by task id: "bad" replies HTML, "weird" a non-object, "slow" takes ``slow`` seconds."""
+    polls = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        task_id = request.url.path.rsplit("/", 1)[1]
+        polls[task_id] = polls.get(task_id, 0) + 1
+        if task_id == "bad":
+            return httpx.Response(200, text="<html>Bad Gateway</html>")
+        if task_id == "weird":
+            return httpx.Response(200, json={"data": "x"})
+        if task_id == "slow":
+            await asyncio.sleep(slow)
+        if polls[task_id] >= polls_until_done:
+            return httpx.Response(200, json={"status": "success", "model_url": f"http://tripo/{task_id}.glb"})
+        return httpx.Response(200, json={"status": "running"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), polls
+
+
+async def _wait(poller: TripoPoller, client: httpx.AsyncClient, task_id: str):
+    try:
+        return await poller.wait(task_id, f"http://tripo/status/{task_id}", {}, client)
+    except HTTPException as e:
+        return e
+
+
+def test_bad_status_replies_fail_only_their_own_task():
+    async def run():
+        client, polls = _status_server()
+        poller = TripoPoller()
+        try:
+            bad, weird, ok = await asyncio.gather(
+                _wait(poller, client, "bad"), _wait(poller, client, "weird"), _wait(poller, client, "ok")
+            )
+            assert isinstance(bad, HTTPException) and bad.status_code == 502
+            assert isinstance(weird, HTTPException) and weird.status_code == 502
+            assert not isinstance(ok, HTTPException)
+            assert polls["ok"] == 3
+            # The poller survives and keeps serving new tasks.
+            assert not poller._task.done()
+            again = await _wait(poller, client, "again")
+            assert not isinstance(again, HTTPException)
+        finally:
+            await poller.stop()
+            await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_slow_status_reply_does_not_hold_up_other_tasks():
+    async def run():
+        client, _ = _status_server(slow=0.5)
+        poller = TripoPoller()
+        try:
+            slow = asyncio.create_task(_wait(poller, client, "slow"))
+            started = time.monotonic()
+            ok = await _wait(poller, client, "ok")
+            assert not isinstance(ok, HTTPException)
+            assert time.monotonic() - started < 0.3
+            assert not isinstance(await slow, HTTPException)
+        finally:
+            await poller.stop()
+            await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_times_out_with_504(monkeypatch):
+    monkeypatch.setattr(settings, "tripo_poll_timeout", 0.1)
+
+    async def run():
+        client, _ = _status_server(polls_until_done=1000)
+        poller = TripoPoller()
+        try:
+            result = await _wait(poller, client, "stuck")
+            assert isinstance(result, HTTPException) and result.status_code == 504
+            assert not poller._pending
+        finally:
+            await poller.stop()
+            await client.aclose()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_jobs_complete_against_the_tripo_stub(serve, monkeypatch, batch):
+    stub, stats = make_tripo_stub(polls_until_done=3)
+    monkeypatch.setattr(settings, "mock_tripo", False)
+    monkeypatch.setattr(settings, "tripo_api_key", "stub")
+    monkeypatch.setattr(settings, "tripo_api_base", serve(stub))
+    monkeypatch.setattr(settings, "tripo_create_path", "/v2/create")
+    monkeypatch.setattr(settings, "tripo_status_path", "/v2/status/{task_id}")
+    monkeypatch.setattr(settings, "tripo_batch_status_path", "/v2/status/batch" if batch else "")
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            jobs = [TripoClient(client=client).generate_from_images([("a.jpg", b"\xff\xd8\xff")]) for _ in range(8)]
+            results = await asyncio.gather(*jobs)
+        assert all(r["model_url"] for r in results)
+
+    asyncio.run(run())
+    if batch:
+        # One status request per tick for all jobs, not one per job.
+        assert stats.status_calls < 8 * 3
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.uploads import UploadLimitMiddleware, upload_budget
+
+
+def _post(content_length: bytes) -> tuple[list, bool]:
+    """Send one POST with this Content-Length through the middleware: (messages sent, whether the app ran)."""
+    ran = []
+    sent = []
+
+    async def app(scope, receive, send):
+        ran.append(True)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/v1/generate", "headers": [(b"content-length", content_length)]}
+    asyncio.run(UploadLimitMiddleware(app, ["/v1/generate"])(scope, receive, send))
+    return sent, bool(ran)
+
+
+@pytest.mark.parametrize("value", [b"abc", b"-5", b""])
+def test_malformed_or_negative_content_length_is_a_400(value):
+    sent, ran = _post(value)
+    assert sent[0]["status"] == 400
+    assert not ran
+    assert upload_budget.in_use == 0
+
+
+def test_oversized_content_length_is_a_413(monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_request_bytes", 100)
+    sent, ran = _post(b"101")
+    assert sent[0]["status"] == 413
+    assert not ran
+
+
+def test_declared_length_is_reserved_for_the_request_and_released(monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_request_bytes", 100)
+    sent, ran = _post(b"100")
+    assert sent[0]["status"] == 200
+    assert ran
+    assert upload_budget.in_use == 0